@@ -0,0 +1,549 @@
+"""
+API HTTP local del Financial Monitor (asyncio, sin dependencias nuevas).
+
+    python api.py serve [--port 8000] [--refresh 60]
+    python api.py bench [--port 8000] [--connections 32] [--requests 20000]
+
+Endpoints (GET o HEAD, respuestas JSON):
+
+    /health                      versión de los datos y hora del último refresco
+    /tickers                     tickers y fecha de su última barra
+    /indicators[/{ticker}]       última fila de indicadores (FeatureEngineer)
+    /signals[/{ticker}]          prob_up y señal de la última barra (modelo del registro)
+    /patterns[/{ticker}]         patrones detectados en las últimas `lookback` barras
+    /history/{ticker}?start=&end=&columns=rsi,macd&limit=
+                                 barras + indicadores por columnas
+    /info/{ticker}               última foto de 'info' (fetch_data / SnapshotStore)
+
+Los datos salen de lo que ya dejan en disco las otras herramientas: las
+features de `cli.py features` (data/cli/features.parquet), la última
+versión del registro de modelos (data/models) y el almacén de `fetch_data`
+(data/snapshots). Con eso se arma un `Snapshot` en memoria en el que cada
+respuesta fija ya está serializada con sus encabezados y su ETag, así que
+atender un pedido es buscar bytes en un dict. Sólo /history con filtros
+serializa algo, y lo guarda en un LRU; su ETag sale del contenido del
+ticker y de la consulta, así que un 304 no serializa nada.
+
+Una tarea de fondo revisa cada `refresh` segundos si cambiaron las fuentes
+(fecha de modificación de las features y de las partes del almacén,
+última versión del registro) y, si cambiaron, arma el Snapshot nuevo en
+un hilo y lo reemplaza de una vez desde el loop: los pedidos en curso
+siguen con el anterior.
+
+Todas las respuestas llevan ETag y `Cache-Control: no-cache`; un pedido con
+`If-None-Match` igual al ETag vigente recibe 304 sin cuerpo. El servidor
+habla HTTP/1.1 con keep-alive (y pipelining) en un solo proceso: con
+`python api.py bench` sobre localhost se miden pedidos/seg y latencias.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(ROOT, "..", "data")
+HISTORY_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+_REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+            405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+def _etag(*parts) -> str:
+    h = hashlib.blake2b(digest_size=8)
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+    return f'"{h.hexdigest()}"'
+
+
+def _dumps(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), allow_nan=False,
+                      default=lambda o: o.item() if hasattr(o, "item") else str(o)).encode()
+
+
+def _date_strings(values) -> list:
+    dates = pd.DatetimeIndex(values)
+    fmt = "%Y-%m-%d" if (dates == dates.normalize()).all() else "%Y-%m-%dT%H:%M:%S"
+    return list(dates.strftime(fmt))
+
+
+def _column(values) -> list:
+    """Columna numérica a lista JSON (NaN => null)."""
+    values = np.asarray(values)
+    if values.dtype.kind == "f":
+        out = values.astype(object)
+        out[np.isnan(values)] = None
+        return out.tolist()
+    return values.tolist()
+
+
+def _records(df: pd.DataFrame) -> list:
+    """Filas de `df` como dicts JSON (fechas como texto, NaN => null)."""
+    data = {}
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            data[col] = _date_strings(values)
+        elif values.dtype.kind in "fiub":
+            data[col] = _column(values.to_numpy())
+        else:
+            data[col] = [None if pd.isna(v) else str(v) for v in values]
+    return [dict(zip(data, row)) for row in zip(*data.values())] if data else []
+
+
+class Response:
+    """Respuesta ya serializada: bytes completos del 200 y del 304."""
+    __slots__ = ("status", "etag", "body", "full", "head", "not_modified")
+
+    def __init__(self, body: bytes, status=200, etag=None):
+        self.status = status
+        self.body = body
+        self.etag = etag or _etag(body)
+        headers = (f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+                   f"Content-Type: application/json\r\n"
+                   f"Content-Length: {len(body)}\r\n"
+                   f"ETag: {self.etag}\r\n"
+                   f"Cache-Control: no-cache\r\n\r\n").encode()
+        self.head = headers
+        self.full = headers + body
+        self.not_modified = (f"HTTP/1.1 304 Not Modified\r\nETag: {self.etag}\r\n"
+                             f"Cache-Control: no-cache\r\n\r\n").encode()
+
+
+def _error(status, message) -> Response:
+    return Response(_dumps({"error": message}), status)
+
+
+class Snapshot:
+    """
+    Todo lo que sirve la API, precalculado: respuestas fijas por ruta y la
+    historia de cada ticker por columnas (para /history con filtros).
+
+    Parámetros:
+    - features (pd.DataFrame): Salida de `FeatureEngineer` (Date, Ticker, OHLCV e indicadores).
+    - signals (pd.DataFrame): Salida de `BatchScorer.score` (índice Ticker), opcional.
+    - patterns (pd.DataFrame): Salida de `pattern_events` (Ticker, Date, pattern), opcional.
+    - info (dict): {ticker: dict} con la última foto de 'info', opcional.
+    - meta (dict): Datos de las fuentes (p.ej. versión del modelo) para /health.
+    - lookback (int): Barras hacia atrás en las que se listan patrones.
+    """
+    def __init__(self, features: pd.DataFrame, signals=None, patterns=None, info=None, meta=None,
+                 lookback=20):
+        self.built_at = time.time()
+        self.routes = {}
+        self.history = {}
+        self._digests = {}
+        features = features.assign(Ticker=features["Ticker"].astype(str))
+        features = features.sort_values(["Ticker", "Date"], kind="mergesort").reset_index(drop=True)
+        drop = {"Ticker", "Date", "target", "Ticker_code", "Adj Close"}
+        indicator_cols = [c for c in features.columns if c not in drop and c not in HISTORY_COLUMNS]
+        history_cols = [c for c in HISTORY_COLUMNS if c in features.columns] + indicator_cols
+
+        bounds = np.flatnonzero(np.r_[True, features["Ticker"].to_numpy()[1:]
+                                      != features["Ticker"].to_numpy()[:-1], True])
+        self.tickers = [features["Ticker"].iat[b] for b in bounds[:-1]]
+        dates = features["Date"].to_numpy()
+        for ticker, lo, hi in zip(self.tickers, bounds[:-1], bounds[1:]):
+            cols = {c: features[c].to_numpy()[lo:hi] for c in history_cols}
+            self.history[ticker] = {"Date": dates[lo:hi], **cols}
+            digest = hashlib.blake2b(digest_size=8)
+            for values in self.history[ticker].values():
+                digest.update(np.ascontiguousarray(values).tobytes())
+            self._digests[ticker] = digest.hexdigest()
+        self.columns = history_cols
+
+        latest = features.iloc[bounds[1:] - 1] if len(features) else features
+        latest = latest[["Ticker", "Date"] + [c for c in ["Close"] if c in features] + indicator_cols]
+        self._collection("indicators", _records(latest))
+        self._put("/tickers", [{"ticker": r["Ticker"], "last_date": r["Date"]}
+                               for r in _records(latest[["Ticker", "Date"]])])
+
+        if signals is not None:
+            signals = signals.reset_index().rename(columns={"index": "Ticker"})
+            signals["Ticker"] = signals["Ticker"].astype(str)
+            self._collection("signals", _records(signals))
+
+        if patterns is not None:
+            patterns = patterns.assign(Ticker=patterns["Ticker"].astype(str),
+                                       pattern=patterns["pattern"].astype(str))
+            # Sólo las marcas de las últimas `lookback` barras de cada ticker
+            since = {t: h["Date"][max(len(h["Date"]) - lookback, 0)]
+                     for t, h in self.history.items() if len(h["Date"])}
+            cutoff = patterns["Ticker"].map(since)
+            recent = patterns.loc[patterns["Date"].to_numpy() >= cutoff.to_numpy(dtype="datetime64[ns]")]
+            self._collection("patterns", _records(recent[["Ticker", "Date", "pattern"]]))
+
+        for ticker, record in (info or {}).items():
+            self._put(f"/info/{ticker}", record)
+
+        self.meta = {"built_at": pd.Timestamp(self.built_at, unit="s").isoformat(),
+                     "tickers": len(self.tickers), **(meta or {})}
+        self.version = _etag(*sorted(self._digests.values()),
+                             *(r.etag for r in self.routes.values())).strip('"')
+        self._put("/health", {"status": "ok", "version": self.version, **self.meta})
+
+    def _put(self, path, obj):
+        self.routes[path] = Response(_dumps(obj))
+
+    def _collection(self, name, records):
+        """/{name} con todas las filas y /{name}/{ticker} con las de cada ticker."""
+        self._put(f"/{name}", records)
+        by_ticker = {}
+        for r in records:
+            by_ticker.setdefault(r["Ticker"], []).append(r)
+        for ticker in self.tickers:
+            rows = by_ticker.get(ticker, [])
+            self._put(f"/{name}/{ticker}", rows[0] if name != "patterns" and rows else rows)
+
+    def history_etag(self, ticker, query) -> str:
+        return _etag(self._digests[ticker], query)
+
+    def history_body(self, ticker, params) -> bytes:
+        """Cuerpo de /history/{ticker} con los filtros ya validados."""
+        h = self.history[ticker]
+        lo, hi = 0, len(h["Date"])
+        if params.get("start") is not None:
+            lo = int(np.searchsorted(h["Date"], params["start"], side="left"))
+        if params.get("end") is not None:
+            hi = int(np.searchsorted(h["Date"], params["end"], side="right"))
+        if params.get("limit") is not None:
+            lo = max(lo, hi - params["limit"])
+        hi = max(lo, hi)
+        cols = params.get("columns") or self.columns
+        data = {"Date": _date_strings(h["Date"][lo:hi])}
+        data.update({c: _column(h[c][lo:hi]) for c in cols})
+        return _dumps({"ticker": ticker, "rows": hi - lo, "columns": ["Date"] + list(cols), "data": data})
+
+
+class MonitorSources:
+    """
+    Fuentes en disco del Snapshot: features (Parquet de `cli.py features`),
+    registro de modelos y almacén de `fetch_data`. Las que no existen se
+    omiten (el endpoint correspondiente devuelve 404).
+    """
+    def __init__(self, features_path=None, registry_dir=None, snapshot_root=None, lookback=20):
+        self.features_path = features_path or os.path.join(DATA_DIR, "cli", "features.parquet")
+        self.registry_dir = registry_dir or os.path.join(DATA_DIR, "models")
+        self.snapshot_root = snapshot_root or os.path.join(DATA_DIR, "snapshots")
+        self.lookback = lookback
+
+    def _registry(self):
+        from model_registry import ModelRegistry
+
+        return ModelRegistry(self.registry_dir)
+
+    def _info_parts(self) -> tuple:
+        """
+        (cantidad, mtime más reciente) de los part-*.parquet de info: el
+        SnapshotStore escribe en info/ticker=X/, así que el mtime de info/ no
+        cambia cuando llega una parte nueva.
+        """
+        folder = os.path.join(self.snapshot_root, "info")
+        mtimes = [os.path.getmtime(os.path.join(dirpath, f)) for dirpath, _, names in os.walk(folder)
+                  for f in names if f.endswith(".parquet")]
+        return len(mtimes), max(mtimes, default=None)
+
+    def signature(self) -> tuple:
+        """Cambia cuando cambia alguna fuente (barato: sólo mira metadatos)."""
+        def mtime(path):
+            return os.path.getmtime(path) if os.path.exists(path) else None
+        versions = self._registry().version_names()
+        return (mtime(self.features_path), versions[-1] if versions else None, self._info_parts())
+
+    def _signals(self, features):
+        registry = self._registry()
+        if not registry.version_names():
+            return None, {}
+        version = registry.resolve()
+        scorer = registry.load_scorer(version)
+        # El scorer avanza con las barras de las features posteriores a las que ya vio
+        bars = features[["Date", "Open", "High", "Low", "Close", "Volume"]].assign(
+            Ticker=features["Ticker"].astype(str))
+        seen = bars["Ticker"].map(scorer.latest["Date"])
+        new = bars.loc[bars["Date"] > seen]
+        if len(new):
+            scorer.update(new)
+        return scorer.score(), {"model_version": version}
+
+    def _patterns(self, features):
+        sys.path.insert(0, os.path.join(ROOT, "..", "modules"))
+        from pattern_recognition import pattern_events
+
+        return pattern_events(features[["Date", "Open", "High", "Low", "Close", "Ticker"]])
+
+    def _info(self, tickers):
+        if not os.path.isdir(os.path.join(self.snapshot_root, "info")):
+            return {}
+        sys.path.insert(0, os.path.join(ROOT, "..", "old-script"))
+        from snapshot_store import SnapshotStore
+
+        df = SnapshotStore(self.snapshot_root).read("info", tickers)
+        if df.empty:
+            return {}
+        last = df.groupby("ticker", sort=False).tail(1)
+        last = last.dropna(axis=1, how="all")
+        return {r.pop("ticker"): r for r in _records(last)}
+
+    def load(self) -> Snapshot:
+        if not os.path.exists(self.features_path):
+            raise FileNotFoundError(f"No existe {self.features_path}: correr antes `cli.py features`")
+        features = pd.read_parquet(self.features_path)
+        signals, meta = self._signals(features)
+        patterns = self._patterns(features)
+        info = self._info(sorted(features["Ticker"].astype(str).unique()))
+        return Snapshot(features, signals, patterns, info, meta, self.lookback)
+
+
+def _matches(if_none_match, etag) -> bool:
+    if if_none_match is None:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+class MonitorServer:
+    """
+    Servidor HTTP/1.1 sobre asyncio que atiende desde el Snapshot vigente y
+    lo refresca en segundo plano (ver el docstring del módulo).
+
+    Parámetros:
+    - sources: Objeto con `load()` => Snapshot y `signature()` (p.ej. MonitorSources).
+    - refresh (float): Segundos entre chequeos de las fuentes (0 = nunca).
+    - history_cache (int): Respuestas de /history filtradas que se guardan (LRU).
+    """
+    def __init__(self, sources, refresh=60.0, history_cache=1024):
+        self.sources = sources
+        self.refresh = refresh
+        self.snapshot = None
+        self.signature = None
+        self._cache = OrderedDict()
+        self._cache_size = history_cache
+        self._server = None
+        self._refresher = None
+
+    def _build(self):
+        """(Snapshot, firma) nuevos si cambiaron las fuentes, si no None. No toca el estado."""
+        signature = self.sources.signature()
+        if self.snapshot is not None and signature == self.signature:
+            return None
+        return self.sources.load(), signature
+
+    def _swap(self, built) -> bool:
+        """
+        Pone en uso el Snapshot de `_build`. Se llama desde el loop (no desde
+        el hilo que lo armó), así no se cruza con `_history`; la caché de
+        /history no se limpia: su clave incluye la versión del Snapshot y las
+        entradas viejas salen solas por LRU.
+        """
+        if built is None:
+            return False
+        snapshot, signature = built
+        self.snapshot, self.signature = snapshot, signature
+        print(f"[INFO] Snapshot {snapshot.version}: {len(snapshot.tickers)} tickers, "
+              f"{len(snapshot.routes)} rutas")
+        return True
+
+    def reload(self) -> bool:
+        """Rearma el Snapshot si cambiaron las fuentes; True si lo reemplazó (sin el loop corriendo)."""
+        return self._swap(self._build())
+
+    async def _reload_async(self) -> bool:
+        # El Snapshot se arma en un hilo y se reemplaza en el loop
+        built = await asyncio.get_running_loop().run_in_executor(None, self._build)
+        return self._swap(built)
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh)
+            try:
+                await self._reload_async()
+            except Exception as e:  # noqa: BLE001 - el servidor sigue con el Snapshot anterior
+                print(f"[ERROR] Al refrescar el snapshot: {e}")
+
+    def _history(self, snapshot, ticker, query, headers, head) -> bytes:
+        etag = snapshot.history_etag(ticker, query)
+        if _matches(headers.get("if-none-match"), etag):
+            return Response(b"", etag=etag).not_modified
+        response = self._cache.get((snapshot.version, ticker, query))
+        if response is None:
+            params = parse_qs(query)
+            try:
+                parsed = {
+                    "start": np.datetime64(pd.Timestamp(params["start"][0]), "ns") if "start" in params else None,
+                    "end": np.datetime64(pd.Timestamp(params["end"][0]), "ns") if "end" in params else None,
+                    "limit": int(params["limit"][0]) if "limit" in params else None,
+                    "columns": [c for c in ",".join(params.get("columns", [])).split(",") if c],
+                }
+            except (ValueError, TypeError) as e:
+                return _error(400, f"Parámetros inválidos: {e}").full
+            unknown = [c for c in parsed["columns"] if c not in snapshot.columns]
+            if unknown:
+                return _error(400, f"Columnas desconocidas: {unknown}").full
+            response = Response(snapshot.history_body(ticker, parsed), etag=etag)
+            self._cache[(snapshot.version, ticker, query)] = response
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end((snapshot.version, ticker, query))
+        return response.head if head else response.full
+
+    def handle(self, method, target, headers) -> bytes:
+        """Bytes de la respuesta completa a un pedido (sin tocar la red)."""
+        if method not in ("GET", "HEAD"):
+            return _error(405, f"Método no soportado: {method}").full
+        snapshot = self.snapshot
+        if snapshot is None:
+            return _error(503, "Snapshot todavía no disponible").full
+        parts = urlsplit(target)
+        path = unquote(parts.path).rstrip("/") or "/"
+        head = method == "HEAD"
+        response = snapshot.routes.get(path)
+        if response is not None:
+            if _matches(headers.get("if-none-match"), response.etag):
+                return response.not_modified
+            return response.head if head else response.full
+        if path.startswith("/history/"):
+            ticker = path[len("/history/"):]
+            if ticker in snapshot.history:
+                return self._history(snapshot, ticker, parts.query, headers, head)
+        return _error(404, f"No encontrado: {path}").full
+
+    async def _connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    raw = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = raw.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    writer.write(_error(400, "Pedido inválido").full)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, sep, value = line.partition(":")
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length:
+                    await reader.readexactly(length)
+                writer.write(self.handle(method, target, headers))
+                connection = headers.get("connection", "").lower()
+                if connection == "close" or (version == "HTTP/1.0" and connection != "keep-alive"):
+                    break
+                if writer.transport.get_write_buffer_size() > 1 << 16:
+                    await writer.drain()
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8000):
+        if self.snapshot is None:
+            await self._reload_async()
+        self._server = await asyncio.start_server(self._connection, host, port, backlog=1024)
+        if self.refresh:
+            self._refresher = asyncio.create_task(self._refresh_loop())
+        return self._server
+
+    async def stop(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def serve_forever(self, host="127.0.0.1", port=8000):
+        server = await self.start(host, port)
+        print(f"[INFO] Escuchando en http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+async def bench(host="127.0.0.1", port=8000, paths=("/signals",), connections=32, requests=20000,
+                etag=False) -> dict:
+    """
+    Carga sobre localhost: `connections` clientes keep-alive que reparten
+    `requests` pedidos GET entre `paths`. Con `etag=True` mandan el ETag de
+    la primera respuesta (=> 304). Devuelve pedidos/seg y latencias (ms).
+    """
+    latencies = []
+    per_conn = max(1, requests // connections)
+
+    async def client(k):
+        reader, writer = await asyncio.open_connection(host, port)
+        tags = {}
+        try:
+            for i in range(per_conn):
+                path = paths[(k + i) % len(paths)]
+                extra = f"If-None-Match: {tags[path]}\r\n" if etag and path in tags else ""
+                t0 = time.perf_counter()
+                writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n{extra}\r\n".encode())
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    name, _, value = line.partition(b":")
+                    if name.lower() == b"content-length":
+                        length = int(value)
+                    elif name.lower() == b"etag":
+                        tags[path] = value.strip().decode()
+                if length:
+                    await reader.readexactly(length)
+                latencies.append(time.perf_counter() - t0)
+        finally:
+            writer.close()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client(k) for k in range(connections)))
+    elapsed = time.perf_counter() - t0
+    lat = np.array(latencies) * 1000
+    return {"requests": len(lat), "seconds": elapsed, "rps": len(lat) / elapsed,
+            "p50_ms": float(np.percentile(lat, 50)), "p99_ms": float(np.percentile(lat, 99)),
+            "max_ms": float(lat.max())}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API HTTP local del Financial Monitor")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("serve", help="levantar el servidor")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8000)
+    p.add_argument("--features", help="Parquet de features (por defecto data/cli/features.parquet)")
+    p.add_argument("--registry", help="registro de modelos (por defecto data/models)")
+    p.add_argument("--snapshots", help="almacén de fetch_data (por defecto data/snapshots)")
+    p.add_argument("--lookback", type=int, default=20, help="barras en las que se listan patrones")
+    p.add_argument("--refresh", type=float, default=60.0, help="segundos entre chequeos de las fuentes")
+    p = sub.add_parser("bench", help="medir pedidos/seg y latencias contra un servidor local")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8000)
+    p.add_argument("--paths", nargs="+", default=["/signals", "/indicators", "/health"])
+    p.add_argument("--connections", type=int, default=32)
+    p.add_argument("--requests", type=int, default=20000)
+    p.add_argument("--etag", action="store_true", help="pedidos condicionales (If-None-Match)")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        sources = MonitorSources(args.features, args.registry, args.snapshots, args.lookback)
+        server = MonitorServer(sources, refresh=args.refresh)
+        try:
+            asyncio.run(server.serve_forever(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    else:
+        result = asyncio.run(bench(args.host, args.port, args.paths, args.connections,
+                                   args.requests, args.etag))
+        print(", ".join(f"{k}: {v:.2f}" if isinstance(v, float) else f"{k}: {v}"
+                        for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
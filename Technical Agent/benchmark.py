@@ -0,0 +1,344 @@
+"""
+Benchmark offline de las etapas del Technical Agent sobre datos sintéticos.
+
+    python benchmark.py run --preset quick --out bench.json
+    python benchmark.py run --tickers 10 100 1000 --interval 1d 1m --out bench.json
+    python benchmark.py compare base.json bench.json
+
+Cada escenario (tickers × barras × intervalo) genera un panel OHLCV con
+movimiento browniano geométrico y mide cada etapa (load, features,
+selection, tune, walk_forward): segundos, pico de RSS y filas por segundo.
+Los resultados van a un JSON para comparar corridas.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from low_memory import rss_mb
+
+STAGES = ["load", "features", "selection", "tune", "walk_forward"]
+
+# Minutos por barra de cada intervalo intradía y barras por sesión (09:30-16:00,
+# 390 minutos): con "1h" son 7, la última de 15:30 a 16:00
+_BAR_MINUTES = {"1m": 1, "5m": 5, "15m": 15, "30m": 30, "1h": 60}
+_SESSION_BARS = {k: -(-390 // v) for k, v in _BAR_MINUTES.items()}
+# Barras por año, para escalar la volatilidad anual
+_BARS_PER_YEAR = {"1d": 252, **{k: 252 * v for k, v in _SESSION_BARS.items()}}
+
+PRESETS = {
+    "quick": {"tickers": [10, 100], "bars": {"1d": 1000}},
+    "scaling": {"tickers": [10, 100, 1000, 10000], "bars": {"1d": 2520}},
+    "full": {"tickers": [10, 100, 1000, 10000],
+             "bars": {"1d": 2520, "1h": 7 * 252, "1m": 390 * 20}},
+}
+
+BASE_FEATURES = ["rsi", "macd", "macd_signal", "bb_mavg", "bb_hband", "bb_lband", "atr", "obv",
+                 "adx", "adx_pos", "adx_neg", "stoch_k", "stoch_d", "Ticker_code"]
+
+
+def _timestamps(n_bars, interval, start="2015-01-02"):
+    """Fechas de `n_bars` barras: días hábiles o, intradía, sesiones de 09:30 a 16:00."""
+    if interval == "1d":
+        return pd.bdate_range(start, periods=n_bars)
+    per_day = _SESSION_BARS[interval]
+    step = pd.Timedelta(_BAR_MINUTES[interval], "min")
+    days = pd.bdate_range(start, periods=-(-n_bars // per_day))
+    offsets = np.asarray(pd.Timedelta(hours=9, minutes=30) + step * np.arange(per_day),
+                         dtype="timedelta64[ns]")
+    return (days.values[:, None] + offsets[None, :]).ravel()[:n_bars]
+
+
+def synthetic_ohlcv(n_tickers, n_bars, interval="1d", seed=0):
+    """
+    Panel OHLCV sintético en formato largo [Date, Open, High, Low, Close,
+    Volume, Ticker] (ordenado por Ticker y Date). Cada ticker sigue un
+    browniano geométrico con drift y volatilidad propios; High/Low salen
+    del rango intrabarra y el volumen es lognormal y crece con |retorno|.
+    """
+    rng = np.random.default_rng(seed)
+    dt = 1.0 / _BARS_PER_YEAR[interval]
+    mu = rng.normal(0.07, 0.05, n_tickers)
+    sigma = rng.uniform(0.15, 0.6, n_tickers)
+    shocks = rng.standard_normal((n_bars, n_tickers))
+    log_ret = (mu - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * shocks
+    close = rng.uniform(10, 500, n_tickers) * np.exp(np.cumsum(log_ret, axis=0))
+    open_ = close * np.exp(-log_ret + sigma * np.sqrt(dt) * 0.2 * rng.standard_normal(close.shape))
+    spread = np.abs(rng.standard_normal(close.shape)) * sigma * np.sqrt(dt) * 0.5
+    high = np.maximum(open_, close) * np.exp(spread)
+    low = np.minimum(open_, close) * np.exp(-spread)
+    base_volume = rng.uniform(1e5, 1e7, n_tickers) / _SESSION_BARS.get(interval, 1)
+    volume = np.round(base_volume * np.exp(0.5 * rng.standard_normal(close.shape))
+                      * (1 + 20 * np.abs(log_ret)))
+
+    tickers = [f"SYN{i:05d}" for i in range(n_tickers)]
+    dates = _timestamps(n_bars, interval)
+    # Columna por ticker (orden F): el formato largo queda agrupado por ticker
+    return pd.DataFrame({
+        "Date": np.tile(dates, n_tickers),
+        "Open": open_.ravel(order="F"),
+        "High": high.ravel(order="F"),
+        "Low": low.ravel(order="F"),
+        "Close": close.ravel(order="F"),
+        "Volume": volume.ravel(order="F"),
+        "Ticker": np.repeat(tickers, n_bars),
+    })
+
+
+class _PeakRSS:
+    """Muestrea el RSS en un hilo cada `interval` segundos y guarda el máximo."""
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = rss_mb() or 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_mb() or 0.0)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_mb() or 0.0)
+
+
+def _model_rows(df, max_rows):
+    """Las últimas `max_rows` filas (por fecha): el modelo no escala con el universo entero."""
+    return df.iloc[-max_rows:] if max_rows and len(df) > max_rows else df
+
+
+def _stage_load(ctx):
+    from data_loader import DataLoader
+    from data_sources import LocalFixtureSource
+
+    frames = ctx["frames"]
+    source = LocalFixtureSource(frames)
+    loader = DataLoader(list(frames), "1900-01-01", "2100-01-01", interval=ctx["interval"],
+                        source=source, max_workers=8, low_memory=ctx["low_memory"])
+    ctx["df"] = loader.load_data_multi()
+    return len(ctx["df"])
+
+
+def _stage_features(ctx):
+    from feature_engineering import FeatureEngineer
+
+    fe = FeatureEngineer(ctx.pop("df"), engine=ctx["engine"], n_jobs=ctx["n_jobs"],
+                         low_memory=ctx["low_memory"])
+    df_feat = fe.add_technical_indicators()
+    if ctx["low_memory"]:
+        df_feat.sort_values(["Date", "Ticker"], inplace=True, ignore_index=True)
+    else:
+        df_feat["Ticker"] = df_feat["Ticker"].astype("category")
+        df_feat = df_feat.sort_values(["Date", "Ticker"]).reset_index(drop=True)
+    df_feat["Ticker_code"] = df_feat["Ticker"].cat.codes
+    ctx["df_feat"] = df_feat
+    return len(df_feat)
+
+
+def _stage_selection(ctx):
+    from feature_selection import FeatureSelector
+
+    fs = FeatureSelector(ctx["df_feat"], BASE_FEATURES)
+    ctx["selected"], _ = fs.remove_highly_correlated(threshold=0.9)
+    return len(ctx["df_feat"])
+
+
+def _stage_tune(ctx):
+    from model_tuning import ModelTuner
+
+    data = _model_rows(ctx["df_feat"], ctx["model_rows"])
+    grid = {"n_estimators": [50, 100], "max_depth": [5, 10], "max_features": ["sqrt", "log2"]}
+    tuner = ModelTuner(grid, cv_splits=3, strategy=ctx["strategy"], n_iter=4)
+    ctx["model"], _, _ = tuner.tune(data[ctx["selected"]], data["target"])
+    return len(data)
+
+
+def _stage_walk_forward(ctx):
+    from sklearn.ensemble import RandomForestClassifier
+    from model_execution import ModelExecutor
+
+    data = _model_rows(ctx["df_feat"], ctx["model_rows"])
+    model = ctx.get("model") or RandomForestClassifier(n_estimators=50, max_depth=5, random_state=42)
+    executor = ModelExecutor(model)
+    n = len(data)
+    folds = executor.walk_forward_folds(data[ctx["selected"]], data["target"],
+                                        initial_train_size=n // 2, test_size=max(1, n // 40),
+                                        n_jobs=ctx["n_jobs"])
+    return sum(f["test_end"] - f["train_start"] for f in folds)
+
+
+_STAGE_FUNCS = {"load": _stage_load, "features": _stage_features, "selection": _stage_selection,
+                "tune": _stage_tune, "walk_forward": _stage_walk_forward}
+
+
+def run_scenario(n_tickers, n_bars, interval, stages=STAGES, engine="numpy", n_jobs=1,
+                 strategy="random", model_rows=20000, low_memory=False, seed=0, verbose=False):
+    """
+    Corre las `stages` sobre un panel sintético y devuelve una lista de dicts
+    (una fila por etapa). La salida por consola de las etapas se descarta
+    salvo con `verbose`.
+    """
+    scenario = f"{n_tickers}x{n_bars}@{interval}"
+    df = synthetic_ohlcv(n_tickers, n_bars, interval, seed)
+    ctx = {"interval": interval, "engine": engine, "n_jobs": n_jobs, "strategy": strategy,
+           "model_rows": model_rows, "low_memory": low_memory,
+           "frames": {t: g.drop(columns="Ticker") for t, g in df.groupby("Ticker", sort=False)}}
+    del df
+    # Las etapas siguientes necesitan lo que producen las anteriores
+    needed = STAGES[:max(STAGES.index(s) for s in stages) + 1]
+    results = []
+    for stage in needed:
+        quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        with _PeakRSS() as rss, quiet:
+            t0 = time.perf_counter()
+            rows = _STAGE_FUNCS[stage](ctx)
+            seconds = time.perf_counter() - t0
+        if stage == "load":
+            ctx.pop("frames")
+        if stage not in stages:
+            continue
+        results.append({
+            "scenario": scenario, "n_tickers": n_tickers, "n_bars": n_bars, "interval": interval,
+            "stage": stage, "rows": int(rows), "seconds": seconds,
+            "rows_per_sec": rows / seconds if seconds > 0 else None,
+            "peak_rss_mb": rss.peak,
+        })
+        print(f"{scenario:>22} {stage:>13}: {seconds:8.2f}s  {rss.peak:8.0f} MB  {rows:>10} filas")
+    return results
+
+
+def _metadata():
+    import sklearn
+    meta = {
+        "timestamp": pd.Timestamp.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+    }
+    try:
+        import subprocess
+        meta["git_commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        meta["git_commit"] = None
+    return meta
+
+
+def run_suite(tickers, bars, stages=STAGES, max_rows=20_000_000, out=None, **kwargs) -> dict:
+    """
+    Corre todos los escenarios tickers × {intervalo: barras}. Los que superan
+    `max_rows` filas se registran como salteados (es el límite de la máquina
+    que corre el benchmark, no del código).
+    """
+    report = {"meta": _metadata(), "config": {"tickers": tickers, "bars": bars, "stages": stages,
+                                              "max_rows": max_rows, **kwargs},
+              "results": [], "skipped": []}
+    for interval, n_bars in bars.items():
+        for n_tickers in tickers:
+            if n_tickers * n_bars > max_rows:
+                report["skipped"].append({"scenario": f"{n_tickers}x{n_bars}@{interval}",
+                                          "rows": n_tickers * n_bars, "reason": "max_rows"})
+                print(f"{n_tickers}x{n_bars}@{interval}: salteado ({n_tickers * n_bars} filas > {max_rows})")
+                continue
+            try:
+                report["results"] += run_scenario(n_tickers, n_bars, interval, stages, **kwargs)
+            except MemoryError:
+                report["skipped"].append({"scenario": f"{n_tickers}x{n_bars}@{interval}",
+                                          "rows": n_tickers * n_bars, "reason": "MemoryError"})
+                print(f"{n_tickers}x{n_bars}@{interval}: sin memoria")
+            if out:
+                _write_json(report, out)
+    return report
+
+
+def _write_json(report, path):
+    with open(path + ".tmp", "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def compare(base_path, new_path, threshold=0.10, min_seconds=0.5) -> pd.DataFrame:
+    """
+    Compara dos corridas por (escenario, etapa): cociente de tiempos y de
+    pico de RSS (nuevo / base). Marca como regresión lo que empeora más de
+    `threshold`; en tiempo, sólo si la etapa tarda al menos `min_seconds`
+    (por debajo, el ruido de medición domina).
+    """
+    with open(base_path) as f:
+        base = pd.DataFrame(json.load(f)["results"])
+    with open(new_path) as f:
+        new = pd.DataFrame(json.load(f)["results"])
+    keys = ["scenario", "stage"]
+    df = base[keys + ["seconds", "peak_rss_mb"]].merge(
+        new[keys + ["seconds", "peak_rss_mb"]], on=keys, suffixes=("_base", "_new"))
+    df["time_ratio"] = df["seconds_new"] / df["seconds_base"]
+    df["rss_ratio"] = df["peak_rss_mb_new"] / df["peak_rss_mb_base"]
+    slower = (df["time_ratio"] > 1 + threshold) & (df["seconds_new"] >= min_seconds)
+    df["regression"] = slower | (df["rss_ratio"] > 1 + threshold)
+    print(df.round(3).to_string(index=False))
+    return df
+
+
+def main(argv=None):
+    from model_tuning import STRATEGIES
+
+    parser = argparse.ArgumentParser(description="Benchmark sintético del Technical Agent")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="correr escenarios")
+    run.add_argument("--preset", choices=sorted(PRESETS))
+    run.add_argument("--tickers", type=int, nargs="+")
+    run.add_argument("--interval", nargs="+", default=["1d"], choices=sorted(_BARS_PER_YEAR))
+    run.add_argument("--bars", type=int, default=None,
+                     help="barras por ticker (por defecto: 2520 diarias o 20 sesiones intradía)")
+    run.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES)
+    run.add_argument("--engine", default="numpy", choices=["numpy", "ta"])
+    run.add_argument("--n-jobs", type=int, default=1)
+    run.add_argument("--strategy", default="random", choices=STRATEGIES)
+    run.add_argument("--model-rows", type=int, default=20000)
+    run.add_argument("--max-rows", type=int, default=20_000_000)
+    run.add_argument("--low-memory", action="store_true")
+    run.add_argument("--out", default="benchmark.json")
+
+    cmp_ = sub.add_parser("compare", help="comparar dos corridas")
+    cmp_.add_argument("base")
+    cmp_.add_argument("new")
+    cmp_.add_argument("--threshold", type=float, default=0.10)
+    cmp_.add_argument("--min-seconds", type=float, default=0.5)
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        df = compare(args.base, args.new, args.threshold, args.min_seconds)
+        return 1 if df["regression"].any() else 0
+
+    if args.preset:
+        tickers, bars = PRESETS[args.preset]["tickers"], PRESETS[args.preset]["bars"]
+    else:
+        tickers = args.tickers or [10, 100]
+        bars = {i: args.bars or (2520 if i == "1d" else 20 * _SESSION_BARS[i]) for i in args.interval}
+    run_suite(tickers, bars, args.stages, max_rows=args.max_rows, out=args.out, engine=args.engine,
+              n_jobs=args.n_jobs, strategy=args.strategy, model_rows=args.model_rows,
+              low_memory=args.low_memory)
+    print(f"Resultados en {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
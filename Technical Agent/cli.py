@@ -0,0 +1,176 @@
+"""
+CLI sin interfaz gráfica del Technical Agent, para cron y workers:
+
+    python cli.py fetch    [--tickers AAPL MSFT] [--start 2020-01-01] [--end 2025-01-01]
+    python cli.py features [--tickers ...] [--start ...] [--end ...]
+    python cli.py tune     [--strategy racing] [--cutoff 2022-12-31] [--threshold 0.9]
+    python cli.py score    [--version v0003] [--bars nuevas.csv] [--out señales.csv]
+    python cli.py report   [--version v0003] [--plots DIR]
+
+- fetch: baja al store local (data/ohlcv) las barras que falten.
+- features: indicadores + target de las barras del store => data/cli/features.parquet.
+- tune: selección de features, ajuste y evaluación sobre ese archivo; el
+  modelo, las features elegidas y el scorer quedan como una versión nueva
+  del registro (data/models, ver model_registry.py).
+- score: puntúa la última barra de cada ticker con una versión del registro
+  (por defecto la última).
+- report: tabla de versiones y detalle de una; con --plots guarda la
+  correlación y la importancia de features como PNG.
+
+Cada subcomando importa sólo lo que usa. `score` carga el scorer con el
+modelo compilado a numpy, sin importar scikit-learn, `ta` ni matplotlib,
+y arranca en menos de un segundo. Los gráficos nunca abren una ventana.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from main import DATA_DIR, END_DATE, START_DATE, TICKERS
+
+FEATURES_PATH = os.path.join(DATA_DIR, "cli", "features.parquet")
+REGISTRY_DIR = os.path.join(DATA_DIR, "models")
+
+
+def cmd_fetch(args):
+    from data_loader import DataLoader
+    from ohlcv_store import OHLCVStore
+
+    store = OHLCVStore(os.path.join(DATA_DIR, "ohlcv"))
+    loader = DataLoader(tickers=args.tickers, start_date=args.start, end_date=args.end, store=store,
+                        max_workers=8, requests_per_second=5)
+    downloaded = loader.ingest()
+    for ticker, rows in downloaded.items():
+        print(f"[INFO] {ticker}: {rows} barras nuevas")
+
+
+def cmd_features(args):
+    from main import features_stage, load_stage
+
+    load = load_stage(args.tickers, args.start, args.end, low_memory=True)
+    df_feat = features_stage(load, low_memory=True)
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    df_feat.to_parquet(args.out + ".tmp", index=False)
+    os.replace(args.out + ".tmp", args.out)
+    print(f"[INFO] {len(df_feat)} filas de features guardadas en {args.out}")
+
+
+def cmd_tune(args):
+    import pandas as pd
+    from main import (BASE_FEATURES, PARAM_GRID, evaluate_stage, load_stage, scorer_stage,
+                      selection_stage, split_stage, tune_stage)
+
+    if not os.path.exists(args.features):
+        sys.exit(f"[ERROR] No existe {args.features}: correr antes `cli.py features`")
+    features = pd.read_parquet(args.features)
+    selection = selection_stage(features, BASE_FEATURES, args.threshold)
+    split = split_stage(features, selection, args.cutoff, low_memory=True)
+    tune = tune_stage(split, PARAM_GRID, args.cv_splits, args.strategy)
+    evaluate = evaluate_stage(tune, split)
+    # El scorer necesita la historia de barras para el estado de los indicadores
+    tickers = list(features["Ticker"].cat.categories)
+    load = load_stage(tickers, str(features["Date"].min().date()), args.end, low_memory=True)
+    scorer_stage(load, features, selection, tune, evaluate)
+
+
+def cmd_score(args):
+    from model_registry import ModelRegistry
+
+    t0 = time.perf_counter()
+    registry = ModelRegistry(args.registry)
+    version = registry.resolve(args.version)
+    scorer = registry.load_scorer(version)
+    t1 = time.perf_counter()
+    if args.bars:
+        import pandas as pd
+
+        scorer.update(pd.read_csv(args.bars, parse_dates=["Date"]))
+    signals = scorer.score(threshold=args.threshold)
+    t2 = time.perf_counter()
+    print(signals.sort_values("prob_up", ascending=False).head(args.top).to_string())
+    print(f"[INFO] {version}: {len(signals)} tickers, carga {t1 - t0:.3f}s, scoring {t2 - t1:.3f}s")
+    if args.out:
+        signals.to_csv(args.out)
+
+
+def cmd_report(args):
+    from model_registry import ModelRegistry
+
+    registry = ModelRegistry(args.registry)
+    versions = registry.versions()
+    if versions.empty:
+        print(f"[WARNING] No hay modelos registrados en {args.registry}")
+        return
+    print(versions.to_string(index=False))
+    meta = registry.meta(args.version)
+    print(json.dumps(meta, indent=2, ensure_ascii=False))
+    if not args.plots:
+        return
+
+    from main import plot_correlation, plot_importances
+
+    version = meta["version"]
+    model = registry.load_model(version)
+    if hasattr(model, "feature_importances_"):
+        plot_importances(meta["features"], model.feature_importances_,
+                         os.path.join(args.plots, f"{version}-importances.png"))
+    if os.path.exists(args.features):
+        import pandas as pd
+
+        features = pd.read_parquet(args.features, columns=meta["features"])
+        plot_correlation(features.corr(), os.path.join(args.plots, f"{version}-correlation.png"))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="CLI sin gráficos del Technical Agent")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def with_range(p):
+        p.add_argument("--tickers", nargs="+", default=TICKERS)
+        p.add_argument("--start", default=START_DATE)
+        p.add_argument("--end", default=END_DATE)
+        return p
+
+    with_range(sub.add_parser("fetch", help="bajar barras al store local")).set_defaults(func=cmd_fetch)
+
+    p = with_range(sub.add_parser("features", help="indicadores + target a Parquet"))
+    p.add_argument("--out", default=FEATURES_PATH)
+    p.set_defaults(func=cmd_features)
+
+    p = sub.add_parser("tune", help="ajustar y registrar una versión nueva del modelo")
+    p.add_argument("--features", default=FEATURES_PATH)
+    p.add_argument("--cutoff", default="2022-12-31", help="última fecha de entrenamiento")
+    p.add_argument("--end", default=END_DATE, help="fin de la historia para el scorer")
+    p.add_argument("--threshold", type=float, default=0.9, help="correlación máxima entre features")
+    p.add_argument("--cv-splits", type=int, default=3)
+    # Se valida en ModelTuner (importar model_tuning acá cargaría sklearn también en score)
+    p.add_argument("--strategy", default="grid",
+                   help="grid (por defecto), random, halving, halving_random o racing")
+    p.set_defaults(func=cmd_tune)
+
+    p = sub.add_parser("score", help="señales de la última barra con un modelo registrado")
+    p.add_argument("--registry", default=REGISTRY_DIR)
+    p.add_argument("--version", default=None, help="p.ej. v0003 o 3 (por defecto la última)")
+    p.add_argument("--bars", help="CSV con barras nuevas [Date, Open, High, Low, Close, Volume, Ticker]")
+    p.add_argument("--threshold", type=float, default=0.5)
+    p.add_argument("--top", type=int, default=20)
+    p.add_argument("--out", help="guardar las señales en este CSV")
+    p.set_defaults(func=cmd_score)
+
+    p = sub.add_parser("report", help="versiones registradas y gráficos a PNG")
+    p.add_argument("--registry", default=REGISTRY_DIR)
+    p.add_argument("--version", default=None)
+    p.add_argument("--features", default=FEATURES_PATH)
+    p.add_argument("--plots", metavar="DIR", help="guardar los gráficos en DIR")
+    p.set_defaults(func=cmd_report)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+class ColumnarStore:
+    """
+    Tablas ordenadas por fecha guardadas por columnas, un archivo binario
+    por columna y partición:
+
+        {root}/{partición}/Date.bin      (int64, ns)
+        {root}/{partición}/{columna}.bin
+        {root}/{partición}/schema.json   ({columna: dtype})
+
+    Se leen con `np.memmap`: `read` y `iter_chunks` sólo traen a memoria las
+    filas pedidas (la posición de una fecha se busca con searchsorted sobre
+    Date), así que el tamaño de la historia no cuenta. `append` agrega al
+    final; si las filas nuevas caen antes de las últimas guardadas (un
+    relleno hacia atrás), reescribe sólo la cola desde la primera fecha
+    nueva (las nuevas pisan a las viejas), leyéndola y mezclándola de a
+    `merge_rows` filas, así que la memoria no depende del largo de la cola.
+
+    El esquema lo fija la primera escritura: columnas nuevas se ignoran y
+    las que falten se guardan como NaN (0 si son enteras). Si un corte deja
+    columnas de largos distintos, vale el más corto (la próxima escritura
+    lo empareja).
+    """
+    def __init__(self, root, merge_rows=1_000_000):
+        self.root = root
+        self.merge_rows = merge_rows
+
+    def _dir(self, partition):
+        return os.path.join(self.root, partition)
+
+    def _path(self, partition, column):
+        return os.path.join(self._dir(partition), f"{column}.bin")
+
+    def schema(self, partition) -> dict:
+        path = os.path.join(self._dir(partition), "schema.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def partitions(self) -> list:
+        """Particiones con datos (rutas relativas a `root`)."""
+        found = []
+        for dirpath, _, files in os.walk(self.root):
+            if "schema.json" in files:
+                found.append(os.path.relpath(dirpath, self.root))
+        return sorted(found)
+
+    def rows(self, partition) -> int:
+        schema = self.schema(partition)
+        sizes = [os.path.getsize(self._path(partition, col)) // np.dtype(dtype).itemsize
+                 for col, dtype in schema.items() if os.path.exists(self._path(partition, col))]
+        return min(sizes) if len(sizes) == len(schema) and sizes else 0
+
+    def _memmap(self, partition, column, dtype, n):
+        if n == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._path(partition, column), dtype=dtype, mode="r", shape=(n,))
+
+    def dates(self, partition) -> np.ndarray:
+        """Columna Date (int64 ns) en memmap, sin leerla."""
+        return self._memmap(partition, "Date", np.int64, self.rows(partition))
+
+    def _bounds(self, partition, start, end):
+        dates = self.dates(partition)
+        lo = 0 if start is None else int(np.searchsorted(dates, pd.Timestamp(start).value, "left"))
+        hi = len(dates) if end is None else int(np.searchsorted(dates, pd.Timestamp(end).value, "left"))
+        return lo, max(lo, hi)
+
+    def _read_rows(self, partition, lo, hi, columns=None) -> pd.DataFrame:
+        schema = self.schema(partition)
+        n = self.rows(partition)
+        columns = list(schema) if columns is None else ["Date"] + [c for c in columns if c != "Date"]
+        data = {col: np.array(self._memmap(partition, col, schema[col], n)[lo:hi]) for col in columns}
+        data["Date"] = data["Date"].view("datetime64[ns]")
+        return pd.DataFrame(data)
+
+    def read(self, partition, start=None, end=None, columns=None) -> pd.DataFrame:
+        """Filas con Date en [start, end) (None = sin límite)."""
+        if not self.schema(partition):
+            return pd.DataFrame(columns=["Date"] + list(columns or []))
+        lo, hi = self._bounds(partition, start, end)
+        return self._read_rows(partition, lo, hi, columns)
+
+    def iter_chunks(self, partition, chunk_rows, start=None, end=None, columns=None):
+        """Recorre [start, end) de a `chunk_rows` filas."""
+        if not self.schema(partition):
+            return
+        lo, hi = self._bounds(partition, start, end)
+        for pos in range(lo, hi, chunk_rows):
+            yield self._read_rows(partition, pos, min(pos + chunk_rows, hi), columns)
+
+    def append(self, partition, df: pd.DataFrame):
+        """Agrega filas (con columna Date); las de fechas ya guardadas las reemplazan."""
+        if df is None or df.empty:
+            return
+        df = df.sort_values("Date", kind="mergesort").drop_duplicates("Date", keep="last")
+        os.makedirs(self._dir(partition), exist_ok=True)
+        schema = self.schema(partition)
+        if not schema:
+            schema = {"Date": "int64", **{col: str(df[col].dtype) for col in df.columns
+                                          if col != "Date" and df[col].dtype.kind in "biuf"}}
+            path = os.path.join(self._dir(partition), "schema.json")
+            with open(path + ".tmp", "w") as f:
+                json.dump(schema, f)
+            os.replace(path + ".tmp", path)
+
+        n = self.rows(partition)
+        new = self._arrays(df, schema)
+        pos = int(np.searchsorted(self.dates(partition), new["Date"][0], "left")) if n else 0
+        if pos >= n:
+            self._write(partition, schema, pos, [new])
+            return
+        # Solapa con lo guardado: la cola desde `pos` se mezcla con las filas
+        # nuevas de a bloques en archivos temporales y después reemplaza a la vieja
+        self._write(partition, schema, 0, self._merge_tail(partition, schema, pos, n, new), ".tmp")
+        for col, dtype in schema.items():
+            path = self._path(partition, col)
+            with open(path, "r+b") as f, open(path + ".tmp", "rb") as tmp:
+                f.truncate(pos * np.dtype(dtype).itemsize)
+                f.seek(0, os.SEEK_END)
+                shutil.copyfileobj(tmp, f)
+            os.remove(path + ".tmp")
+
+    @staticmethod
+    def _arrays(df, schema) -> dict:
+        """Columnas del esquema como arrays (Date en int64 ns; las que falten, NaN o 0)."""
+        data = {}
+        for col, dtype in schema.items():
+            if col == "Date":
+                data[col] = df["Date"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+            elif col in df:
+                data[col] = df[col].to_numpy(dtype=dtype)
+            else:
+                data[col] = np.full(len(df), np.nan if np.dtype(dtype).kind == "f" else 0, dtype=dtype)
+        return data
+
+    def _merge_tail(self, partition, schema, pos, n, new):
+        """
+        Filas guardadas de [pos, n) mezcladas en orden con `new` (que pisa a
+        las de la misma fecha), de a bloques de `merge_rows` filas guardadas.
+        """
+        taken = 0
+        for lo in range(pos, n, self.merge_rows):
+            hi = min(lo + self.merge_rows, n)
+            block = self._arrays(self._read_rows(partition, lo, hi), schema)
+            # Filas nuevas hasta la última fecha del bloque (la última cola se lleva el resto)
+            upto = len(new["Date"]) if hi == n else int(np.searchsorted(new["Date"], block["Date"][-1], "right"))
+            keep = ~np.isin(block["Date"], new["Date"][taken:upto])
+            merged = {col: np.concatenate([block[col][keep], new[col][taken:upto]]) for col in schema}
+            order = np.argsort(merged["Date"], kind="stable")
+            yield {col: values[order] for col, values in merged.items()}
+            taken = upto
+
+    def _write(self, partition, schema, pos, pieces, suffix=""):
+        """Trunca cada columna en la fila `pos` y le agrega los bloques de `pieces`."""
+        files = {col: open(self._path(partition, col) + suffix, "ab") for col in schema}
+        try:
+            for col, dtype in schema.items():
+                files[col].truncate(pos * np.dtype(dtype).itemsize)
+            for piece in pieces:
+                for col, f in files.items():
+                    f.write(np.ascontiguousarray(piece[col]).tobytes())
+        finally:
+            for f in files.values():
+                f.close()
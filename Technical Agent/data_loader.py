@@ -1,33 +1,167 @@
-import yfinance as yf
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 
+import profiling
+from data_sources import RateLimitedSource, YFinanceSource, is_transient
+
 class DataLoader:
-    def __init__(self, tickers, start_date, end_date):
+    """
+    Carga barras OHLCV de varios tickers en un único DataFrame largo.
+
+    - `source`: de dónde se descargan las barras (por defecto yfinance).
+    - `store`: `OHLCVStore` opcional; si se pasa, las barras se leen del
+      disco y sólo se descargan los rangos que todavía no estén guardados.
+    - `max_workers`: descargas simultáneas (1 = secuencial, como antes).
+    - `requests_per_second`: límite de llamadas por segundo al host de la
+      fuente, compartido entre hilos y loaders (None = sin límite).
+    - `max_retries` / `backoff`: reintentos por ticker con espera
+      exponencial (backoff, 2*backoff, 4*backoff, ...), sólo ante errores
+      pasajeros (red, timeouts, HTTP 429/5xx; ver `is_transient`).
+
+    - `low_memory`: columnas de precio/volumen en float32 y 'Ticker'
+      categórica (categorías = `tickers`, en ese orden) desde la carga.
+
+    Fuera de memoria (barras intradía de muchos tickers): `ingest()` baja
+    al `store` (idealmente un `MmapOHLCVStore`) lo que falta sin leer ni
+    concatenar nada, e `iter_chunks(window)` recorre después la historia
+    guardada de a ventanas de tiempo, con todos los tickers de la ventana.
+
+    Los tickers que fallan tras agotar los reintentos no abortan la carga:
+    quedan en `self.failures` ({ticker: error}) y se omiten del resultado.
+    """
+    def __init__(self, tickers, start_date, end_date, interval="1d", source=None, store=None,
+                 max_workers=1, requests_per_second=None, max_retries=3, backoff=0.5,
+                 low_memory=False):
         self.tickers = tickers
         self.start_date = start_date
         self.end_date = end_date
+        self.interval = interval
+        self.source = source if source is not None else YFinanceSource()
+        if requests_per_second is not None:
+            self.source = RateLimitedSource(self.source, requests_per_second)
+        self.store = store
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.low_memory = low_memory
+        self._ticker_codes = {t: i for i, t in enumerate(tickers)}
+        self.failures = {}
+
+    def _load_ticker(self, ticker) -> pd.DataFrame:
+        with profiling.span("download", "load", ticker=ticker, interval=self.interval) as sp:
+            if self.store is not None:
+                df_t = self.store.load(ticker, self.start_date, self.end_date, self.interval,
+                                       source=self.source)
+            else:
+                print(f"Descargando {ticker} de {self.start_date} a {self.end_date}")
+                df_t = self.source.fetch(ticker, self.start_date, self.end_date, self.interval)
+            sp.set(rows=len(df_t))
+        return df_t
+
+    def _sync_ticker(self, ticker) -> int:
+        with profiling.span("download", "load", ticker=ticker, interval=self.interval) as sp:
+            fetched = self.store.sync(ticker, self.start_date, self.end_date, self.interval,
+                                      source=self.source)
+            sp.set(rows=fetched)
+        return fetched
+
+    def _load_ticker_with_retries(self, ticker, load=None):
+        load = load if load is not None else self._load_ticker
+        for attempt in range(self.max_retries + 1):
+            try:
+                return load(ticker)
+            except Exception as e:
+                if attempt == self.max_retries or not is_transient(e):
+                    raise
+                wait = self.backoff * 2 ** attempt
+                print(f"[WARNING] Falló {ticker} ({e}); reintento {attempt + 1} en {wait:.1f}s")
+                time.sleep(wait)
+
+    def _for_each_ticker(self, load=None) -> dict:
+        """{ticker: resultado de `load`} para todos los tickers, con reintentos."""
+        self.failures = {}
+        results = {}
+
+        def _task(t):
+            try:
+                results[t] = self._load_ticker_with_retries(t, load)
+            except Exception as e:
+                self.failures[t] = e
+
+        if self.max_workers > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                list(pool.map(_task, self.tickers))
+        else:
+            for t in self.tickers:
+                _task(t)
+
+        if self.failures:
+            print(f"[WARNING] No se pudieron cargar {len(self.failures)} de {len(self.tickers)} "
+                  f"tickers: {sorted(self.failures)}")
+        return results
+
+    def _with_ticker(self, df_t, ticker) -> pd.DataFrame:
+        # Añadimos la columna Ticker
+        if self.low_memory:
+            df_t["Ticker"] = pd.Categorical.from_codes(
+                np.full(len(df_t), self._ticker_codes[ticker], dtype=np.int32),
+                categories=self.tickers
+            )
+            for col in df_t.columns.drop(["Date", "Ticker"]):
+                df_t[col] = df_t[col].astype(np.float32)
+        else:
+            df_t["Ticker"] = ticker
+        return df_t
 
     def load_data_multi(self) -> pd.DataFrame:
         """
         Descarga datos de cada ticker en su propio DataFrame,
         añade la columna 'Ticker', y concatena en formato largo.
+        Con `max_workers > 1` las descargas corren en un pool de hilos; el
+        orden del resultado sigue siendo el de `self.tickers`.
         """
-        all_data = []
-        for t in self.tickers:
-            print(f"Descargando {t} de {self.start_date} a {self.end_date}")
-            # DESCARGA SOLO UN TICKER A LA VEZ
-            df_t = yf.download(t, start=self.start_date, end=self.end_date, progress=False)
-            # Añadimos la columna Ticker
-            print(df_t.columns)
-            df_t["Ticker"] = t
-            print(df_t.columns)
-            df_t.reset_index(inplace=True)
-            all_data.append(df_t)
-            print(all_data.columns)
-
-        # Concatenamos en 'formato largo': un solo DataFrame
-        df_all = pd.concat(all_data)
-        print(df_all.columns)
-        # Reseteamos índice para que 'Date' sea columna normal
-        df_all.reset_index(inplace=True)  # Devuelve 'Date' como columna
+        frames = self._for_each_ticker()
+        if not frames:
+            raise RuntimeError("No se pudo cargar ningún ticker.")
+
+        all_data = [self._with_ticker(frames[t], t) for t in self.tickers if t in frames]
+
+        # Concatenamos en 'formato largo': un solo DataFrame, con 'Date' como columna normal
+        with profiling.span("concat", "load", rows=sum(len(df_t) for df_t in all_data)):
+            df_all = pd.concat(all_data, ignore_index=True)
         return df_all
+
+    def ingest(self) -> dict:
+        """
+        Baja al `store` los rangos que faltan de cada ticker sin leerlos
+        (memoria acotada por el tramo más grande que devuelve la fuente; ver
+        `OHLCVStore.max_span`). Devuelve {ticker: barras descargadas}.
+        """
+        if self.store is None:
+            raise ValueError("ingest() necesita un store")
+        return self._for_each_ticker(self._sync_ticker)
+
+    def iter_chunks(self, window="30D"):
+        """
+        Recorre las barras guardadas de [start_date, end_date) en ventanas
+        de tiempo de largo `window`: un DataFrame largo por ventana (todos
+        los tickers, cada uno en orden de fecha, con columna 'Ticker'). No
+        descarga nada; llamar antes a `ingest()`.
+        """
+        if self.store is None:
+            raise ValueError("iter_chunks() necesita un store")
+        bounds = pd.date_range(self.start_date, self.end_date, freq=window)
+        bounds = bounds.append(pd.DatetimeIndex([self.end_date])).unique()
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            frames = []
+            for t in self.tickers:
+                df_t = self.store.read(t, start, end, self.interval)
+                if len(df_t):
+                    frames.append(self._with_ticker(df_t, t))
+            if frames:
+                with profiling.span("chunk", "load", start=str(start), rows=sum(map(len, frames))):
+                    chunk = pd.concat(frames, ignore_index=True)
+                yield chunk
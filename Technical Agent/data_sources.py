@@ -0,0 +1,197 @@
+import os
+import threading
+import time
+import pandas as pd
+
+OHLCV_COLUMNS = ["Date", "Open", "High", "Low", "Close", "Volume"]
+
+
+def normalize_bars(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Lleva un DataFrame de barras al formato común de las fuentes:
+    columna 'Date' (datetime sin zona horaria, UTC si venía con zona),
+    columnas planas (sin MultiIndex) y filas ordenadas por fecha.
+    """
+    if df is None or df.empty:
+        return pd.DataFrame(columns=OHLCV_COLUMNS)
+
+    df = df.copy()
+    # yfinance >= 0.2.48 devuelve columnas (Price, Ticker) aun para un solo ticker
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    df.columns.name = None
+
+    if "Date" not in df.columns:
+        df = df.reset_index()
+        # Los intervalos intradía vienen indexados por 'Datetime'
+        df = df.rename(columns={"Datetime": "Date", "index": "Date"})
+
+    dates = pd.to_datetime(df["Date"])
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_convert("UTC").dt.tz_localize(None)
+    df["Date"] = dates
+    return df.sort_values("Date").reset_index(drop=True)
+
+
+class DataSource:
+    """
+    Interfaz mínima de una fuente de barras OHLCV.
+
+    Una fuente sólo sabe traer el rango [start, end) de un ticker; el cacheo
+    y el relleno de huecos quedan a cargo de `OHLCVStore`.
+    """
+    # Host al que pega la fuente (lo usan los límites de tasa por host)
+    host = "local"
+
+    def fetch(self, ticker, start, end, interval="1d") -> pd.DataFrame:
+        raise NotImplementedError
+
+
+class YFinanceSource(DataSource):
+    """
+    Fuente respaldada por `yf.download`, un ticker por llamada.
+    """
+    host = "query1.finance.yahoo.com"
+
+    def fetch(self, ticker, start, end, interval="1d") -> pd.DataFrame:
+        import yfinance as yf
+
+        df_t = yf.download(ticker, start=start, end=end, interval=interval, progress=False)
+        return normalize_bars(df_t)
+
+
+class RateLimiter:
+    """
+    Token bucket thread-safe: como máximo `rate` adquisiciones por segundo,
+    con ráfagas de hasta `burst`.
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def limit(self, rate, burst=1):
+        """Baja la tasa (y la ráfaga) si las nuevas son más estrictas; nunca las sube."""
+        with self._lock:
+            self.rate = min(self.rate, float(rate))
+            self.burst = min(self.burst, burst)
+            self._tokens = min(self._tokens, float(self.burst))
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Un limitador por host, compartido por todas las fuentes que le pegan
+_HOST_LIMITERS = {}
+_HOST_LIMITERS_LOCK = threading.Lock()
+
+
+def host_rate_limiter(host, rate, burst=1) -> RateLimiter:
+    """
+    El limitador compartido de `host`. Hay uno solo por host: si otra
+    fuente lo pide con otra tasa, queda la más baja de las dos (dos buckets
+    independientes juntos superarían el límite).
+    """
+    with _HOST_LIMITERS_LOCK:
+        limiter = _HOST_LIMITERS.get(host)
+        if limiter is None:
+            limiter = _HOST_LIMITERS[host] = RateLimiter(rate, burst)
+        else:
+            limiter.limit(rate, burst)
+        return limiter
+
+
+# Errores que vale la pena reintentar: red caída, timeouts y HTTP 429/5xx
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+_TRANSIENT_ERRORS = {
+    "ConnectionError", "Timeout", "ConnectTimeout", "ReadTimeout", "ChunkedEncodingError",
+    "RemoteDisconnected", "IncompleteRead", "YFRateLimitError",
+}
+
+
+def is_transient(error) -> bool:
+    """
+    True si `error` es pasajero: errores de red o timeouts (de la librería
+    estándar, requests o yfinance) y respuestas HTTP 429 o 5xx. Un ticker
+    inválido o un error de datos no se reintenta.
+    """
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) or getattr(error, "code", None)
+    if isinstance(status, int):
+        return status in TRANSIENT_STATUS
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return any(cls.__name__ in _TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+class RateLimitedSource(DataSource):
+    """
+    Envuelve una fuente y limita sus `fetch` según el limitador de su host.
+    """
+    def __init__(self, source, rate, burst=1):
+        self.source = source
+        self.host = source.host
+        self.limiter = host_rate_limiter(source.host, rate, burst)
+
+    def fetch(self, ticker, start, end, interval="1d") -> pd.DataFrame:
+        self.limiter.acquire()
+        return self.source.fetch(ticker, start, end, interval)
+
+
+class LocalFixtureSource(DataSource):
+    """
+    Fuente local que reemplaza a yfinance en pruebas y corridas offline.
+
+    Recibe un dict {ticker: DataFrame} o una carpeta con archivos
+    `{ticker}.csv` / `{ticker}.parquet`. Registra cada llamada en `self.calls`
+    para poder verificar cuántas descargas hizo realmente el loader.
+
+    - `latency`: segundos de espera por llamada, para simular la red.
+    - `failures`: dict {ticker: n} que hace fallar las primeras n llamadas
+      de ese ticker (n=None falla siempre).
+    """
+    def __init__(self, frames=None, folder=None, latency=0.0, failures=None):
+        self.frames = {t: normalize_bars(df) for t, df in (frames or {}).items()}
+        self.folder = folder
+        self.latency = latency
+        self.failures = dict(failures or {})
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _frame_for(self, ticker):
+        if ticker in self.frames:
+            return self.frames[ticker]
+        if self.folder is not None:
+            for ext, reader in ((".parquet", pd.read_parquet), (".csv", pd.read_csv)):
+                path = os.path.join(self.folder, f"{ticker}{ext}")
+                if os.path.exists(path):
+                    self.frames[ticker] = normalize_bars(reader(path))
+                    return self.frames[ticker]
+        return pd.DataFrame(columns=OHLCV_COLUMNS)
+
+    def fetch(self, ticker, start, end, interval="1d") -> pd.DataFrame:
+        with self._lock:
+            self.calls.append((ticker, start, end, interval))
+            fail = ticker in self.failures and self.failures[ticker] != 0
+            if fail and self.failures[ticker] is not None:
+                self.failures[ticker] -= 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise ConnectionError(f"Falla simulada al descargar {ticker}")
+        df = self._frame_for(ticker)
+        if df.empty:
+            return df.copy()
+        mask = (df["Date"] >= pd.Timestamp(start)) & (df["Date"] < pd.Timestamp(end))
+        return df.loc[mask].reset_index(drop=True)
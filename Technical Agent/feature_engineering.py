@@ -1,9 +1,121 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
 import pandas as pd
-import ta
-from ta.volatility import BollingerBands, AverageTrueRange
-from ta.volume import OnBalanceVolumeIndicator
-from ta.trend import ADXIndicator
-from ta.momentum import StochasticOscillator
+
+import panel_indicators
+import profiling
+from indicator_registry import REGISTRY
+from panel_indicators import IndicatorState
+
+
+def _last_dates(df, rows, cols, shape):
+    """Fecha (ns) de la última barra de cada columna del panel."""
+    dates = panel_indicators.to_panel(
+        df["Date"].to_numpy(dtype="datetime64[ns]").astype("int64").astype(float), rows, cols, shape
+    )
+    return np.nanmax(dates, axis=0) if len(dates) else np.full(shape[1], np.nan)
+
+
+def _ta_indicators(high_, low_, close_, vol_, params=None, ticker=None, columns=None) -> dict:
+    """
+    Indicadores de un solo ticker con las fórmulas de `ta`, a partir de sus
+    Series ya ordenadas por fecha. `params` es el dict de
+    `panel_indicators.resolve_params`; `columns` elige qué columnas de
+    INDICATOR_COLUMNS calcular (None = todas). Los pedidos pasan por
+    `indicator_registry`, así que las EMA del MACD y el rango verdadero de
+    ATR y ADX se calculan una sola vez. Devuelve {columna: Series}.
+    """
+    p = panel_indicators.resolve_params(params)
+    requests = {}
+    for name, out_cols in panel_indicators.OUTPUT_COLUMNS.items():
+        for col in out_cols:
+            if columns is None or col in columns:
+                # Cada columna toma los parámetros de su indicador que le corresponden
+                defaults = REGISTRY.nodes[col][2]
+                requests[col] = (col, {k: v for k, v in p[name].items() if k in defaults})
+    data = {"High": high_, "Low": low_, "Close": close_, "Volume": vol_}
+    return REGISTRY.compute(data, requests, ticker=ticker)
+
+
+# Columnas de entrada / salida de los bloques de memoria compartida
+_SHM_INPUTS = ["High", "Low", "Close", "Volume"]
+
+# Tickers por panel en modo low_memory: acota el tamaño de los paneles (barras × tickers)
+LOW_MEMORY_BLOCK = 512
+
+
+def _block_indicators(inputs, outputs, params, offsets):
+    """
+    Motor numpy sobre las filas offsets[0]..offsets[-1] (tickers contiguos,
+    cada uno ordenado por fecha): arma un panel sólo con esos tickers a
+    partir de las columnas `inputs` (High, Low, Close, Volume), escribe los
+    indicadores en `outputs[lo:hi]` (filas × INDICATOR_COLUMNS) y devuelve
+    el estado de esos tickers.
+    """
+    lo, hi = offsets[0], offsets[-1]
+    sizes = np.diff(offsets)
+    cols = np.repeat(np.arange(len(sizes)), sizes)
+    rows = np.arange(hi - lo) - np.repeat(offsets[:-1] - lo, sizes)
+    shape = (int(sizes.max()), len(sizes))
+    panels = [panel_indicators.to_panel(x[lo:hi], rows, cols, shape) for x in inputs]
+    indicators, state = panel_indicators.compute_indicators(*panels, params=params)
+    for i, name in enumerate(panel_indicators.INDICATOR_COLUMNS):
+        outputs[lo:hi, i] = indicators[name][rows, cols]
+    return state
+
+
+def _shard_indicators(engine, params, in_name, out_name, n_rows, offsets):
+    """
+    Worker del modo paralelo. Calcula los indicadores de los tickers cuyas
+    filas van de offsets[0] a offsets[-1] (cada ticker entre dos offsets
+    consecutivos, ya ordenado por fecha) leyendo las barras del bloque
+    compartido `in_name` y escribiendo el resultado en su tramo de
+    `out_name`. Sólo devuelve (pickleado) el estado compacto del motor numpy.
+    """
+    in_shm = shared_memory.SharedMemory(name=in_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    inputs = np.ndarray((n_rows, len(_SHM_INPUTS)), dtype=float, buffer=in_shm.buf)
+    outputs = np.ndarray((n_rows, len(panel_indicators.INDICATOR_COLUMNS)), dtype=float,
+                         buffer=out_shm.buf)
+    try:
+        if engine == "numpy":
+            return _block_indicators(inputs.T, outputs, params, offsets)
+
+        for a, b in zip(offsets[:-1], offsets[1:]):
+            values = _ta_indicators(*(pd.Series(inputs[a:b, j]) for j in range(len(_SHM_INPUTS))),
+                                    params=params)
+            for i, name in enumerate(panel_indicators.INDICATOR_COLUMNS):
+                outputs[a:b, i] = values[name].to_numpy(dtype=float)
+        return None
+    finally:
+        # Hay que soltar las vistas antes de cerrar los bloques
+        del inputs, outputs
+        in_shm.close()
+        out_shm.close()
+
+
+def _target_from_offsets(close_, offsets):
+    """'target' = 1 si el Close siguiente del mismo ticker es mayor (filas ordenadas por ticker)."""
+    next_close = np.empty_like(close_)
+    next_close[:-1] = close_[1:]
+    next_close[offsets[1:] - 1] = np.nan
+    with np.errstate(invalid="ignore"):
+        return (next_close > close_).astype(int)
+
+
+def _shard_offsets(offsets, n_shards):
+    """
+    Parte los tickers (delimitados por `offsets`) en a lo sumo `n_shards`
+    tramos contiguos con una cantidad de filas parecida.
+    """
+    targets = np.linspace(0, offsets[-1], n_shards + 1)
+    cuts = np.unique(np.searchsorted(offsets, targets))
+    cuts = np.unique(np.concatenate([[0], cuts, [len(offsets) - 1]]))
+    return [offsets[a:b + 1] for a, b in zip(cuts[:-1], cuts[1:]) if b > a]
+
 
 class FeatureEngineer:
     """
@@ -19,21 +131,285 @@ class FeatureEngineer:
        - Genera la columna 'target' = 1 si Close(t+1) > Close(t), sino 0.
     3. Retorna un DataFrame concatenado con todos los tickers, 
        pero cada uno procesado en su secuencia temporal individual.
+
+    El parámetro `engine` elige cómo se calculan los indicadores:
+    - "ta": ticker por ticker (groupby.apply) con las fórmulas de `ta`, vía
+      `indicator_registry` (los bloques compartidos se calculan una vez).
+    - "numpy": `panel_indicators`, todos los tickers a la vez sobre un
+      panel (barras × tickers). Mismo resultado, sin costo por ticker.
+
+    Con `feature_store` (sólo engine="numpy" y n_jobs=1) cada indicador de cada ticker
+    se busca primero en la caché; sólo se recalcula lo que cambió (barras o
+    parámetros), y si sólo se agregaron barras, sólo la cola nueva.
+
+    Con `n_jobs` > 1 (o -1 = todos los núcleos) los tickers se reparten en
+    tramos entre un pool de procesos. Las barras y los indicadores viajan por
+    memoria compartida: cada worker escribe sus filas en un bloque de salida
+    preasignado, así que el resultado no se pickea ni se concatena. El orden
+    de filas es el mismo que en modo serie.
+
+    Con `low_memory=True` no se copian los valores de `data`: se trabaja
+    sobre una copia superficial (comparte los arreglos de cada columna), que
+    se ordena y recibe las columnas nuevas in situ sin modificar el
+    DataFrame recibido (si ya viene ordenado por (Ticker, Date) no se toca),
+    los indicadores se guardan en float32 y 'target' en int8, y el motor
+    numpy arma los paneles de a `LOW_MEMORY_BLOCK` tickers en vez de uno
+    solo con todo el universo.
     """
 
-    def __init__(self, data: pd.DataFrame):
-        # Guardamos una copia para evitar modificar el original
-        self.data = data.copy()
+    def __init__(self, data: pd.DataFrame, engine: str = "ta", n_jobs: int = 1,
+                 indicator_params: dict = None, feature_store=None, low_memory: bool = False):
+        if engine not in ("ta", "numpy"):
+            raise ValueError(f"engine desconocido: {engine!r} (usar 'ta' o 'numpy')")
+        if feature_store is not None and engine != "numpy":
+            raise ValueError("feature_store requiere engine='numpy'")
+        if feature_store is not None and n_jobs not in (1, None):
+            raise ValueError("feature_store no se combina con n_jobs: las consultas a la caché son en serie")
+        # Guardamos una copia para evitar modificar el original; en low_memory,
+        # superficial: ordenar y agregar columnas no toca `data` ni copia sus valores
+        self.data = data.copy(deep=not low_memory)
+        self.low_memory = low_memory
+        self.engine = engine
+        # Parámetros por indicador, p.ej. {"rsi": {"window": 10}}; el resto toma los valores por defecto
+        self.indicator_params = panel_indicators.resolve_params(indicator_params)
+        self.n_jobs = os.cpu_count() if n_jobs == -1 else (n_jobs or 1)
+        # Con engine="numpy", estado de los indicadores tras la última barra de cada ticker
+        self.indicator_state = None
+        # `FeatureStore` opcional: cachea cada indicador por ticker entre corridas
+        self.feature_store = feature_store
 
     def add_technical_indicators(self) -> pd.DataFrame:
         """
         Aplica los indicadores técnicos a cada Ticker de manera independiente.
         Retorna un DataFrame con las columnas de indicadores y 'target'.
         """
-        # Usamos groupby("Ticker") para que cada subset se procese sin mezclar datos de otros tickers
-        df_processed = self.data.groupby("Ticker", group_keys=False)\
-                                .apply(self._calc_indicators_for_group)
-        return df_processed
+        with profiling.span("add_technical_indicators", "features", engine=self.engine,
+                            rows=len(self.data)):
+            if self.feature_store is not None:
+                return self._calc_indicators_cached()
+            if self.n_jobs > 1 and not self.data.empty:
+                return self._calc_indicators_parallel()
+            if self.engine == "numpy":
+                if self.low_memory and not self.data.empty:
+                    return self._calc_indicators_blocks()
+                return self._calc_indicators_panel()
+
+            # Usamos groupby("Ticker") para que cada subset se procese sin mezclar datos de otros tickers
+            df_processed = self.data.groupby("Ticker", group_keys=False, observed=True)\
+                                    .apply(self._calc_indicators_for_group)
+            return df_processed
+
+    def _sorted_data(self) -> pd.DataFrame:
+        """
+        `self.data` ordenado por (Ticker, Date). En low_memory se ordena in
+        situ, y sólo si hace falta.
+        """
+        if not self.low_memory:
+            return self.data.sort_values(["Ticker", "Date"], kind="mergesort")
+        codes = pd.factorize(self.data["Ticker"], sort=True)[0]
+        dates = self.data["Date"].to_numpy(dtype="datetime64[ns]")
+        step = np.diff(codes)
+        if not np.all((step > 0) | ((step == 0) & (dates[1:] >= dates[:-1]))):
+            self.data.sort_values(["Ticker", "Date"], kind="mergesort", inplace=True)
+        return self.data
+
+    def _set_column(self, df, name, values):
+        """Asigna una columna de salida; en low_memory, float32 ('target' en int8)."""
+        if self.low_memory:
+            values = np.asarray(values, dtype=np.int8 if name == "target" else np.float32)
+        df[name] = values
+
+    def _calc_indicators_blocks(self) -> pd.DataFrame:
+        """
+        Motor numpy de a bloques de `LOW_MEMORY_BLOCK` tickers (modo
+        low_memory): el pico de memoria depende del tamaño del bloque y no
+        del universo. Los valores son los de `_calc_indicators_panel`.
+        """
+        df = self._sorted_data()
+        codes, tickers = pd.factorize(df["Ticker"], sort=True)
+        offsets = np.searchsorted(codes, np.arange(len(tickers) + 1))
+        inputs = [df[c].to_numpy() for c in _SHM_INPUTS]
+        columns = panel_indicators.INDICATOR_COLUMNS
+        outputs = np.empty((len(df), len(columns)), dtype=np.float32)
+        n_blocks = -(-len(tickers) // LOW_MEMORY_BLOCK)
+        states = [_block_indicators(inputs, outputs, self.indicator_params, block)
+                  for block in _shard_offsets(offsets, n_blocks)]
+
+        state = IndicatorState.concat(states)
+        state.tickers = list(tickers)
+        last_rows = df["Date"].to_numpy(dtype="datetime64[ns]")[offsets[1:] - 1]
+        state.arrays["last_date"] = last_rows.astype("int64").astype(float)
+        self.indicator_state = state
+        for i, name in enumerate(columns):
+            df[name] = outputs[:, i]
+        del outputs
+
+        # --- GENERACIÓN DE 'target' ---
+        self._set_column(df, "target", _target_from_offsets(inputs[2].astype(float), offsets))
+
+        # Eliminamos filas que tengan NaN por cálculos de indicadores
+        df.dropna(inplace=True)
+        return df
+
+    def _calc_indicators_panel(self) -> pd.DataFrame:
+        """
+        Versión vectorizada de `_calc_indicators_for_group` para todos los
+        tickers juntos: arma paneles (barras × tickers), calcula los
+        indicadores en una sola pasada y los devuelve en formato largo con
+        el mismo orden de filas (Ticker, Date) y el mismo índice.
+        """
+        df = self._sorted_data()
+        rows, cols, shape, tickers = panel_indicators.panel_layout(df)
+
+        def panel(column):
+            return panel_indicators.to_panel(df[column].to_numpy(dtype=float), rows, cols, shape)
+
+        close_ = panel("Close")
+        indicators, state = panel_indicators.compute_indicators(
+            panel("High"), panel("Low"), close_, panel("Volume"), params=self.indicator_params
+        )
+        # Estado final por ticker, para seguir en modo incremental (IncrementalFeatureEngineer)
+        state.tickers = list(tickers)
+        state.arrays["last_date"] = _last_dates(df, rows, cols, shape)
+        self.indicator_state = state
+        for name in panel_indicators.INDICATOR_COLUMNS:
+            self._set_column(df, name, indicators[name][rows, cols])
+
+        # --- GENERACIÓN DE 'target' ---
+        with np.errstate(invalid="ignore"):
+            target = np.roll(close_, -1, axis=0) > close_
+        target[-1] = False
+        self._set_column(df, "target", target[rows, cols].astype(int))
+
+        # Eliminamos filas que tengan NaN por cálculos de indicadores
+        df.dropna(inplace=True)
+        return df
+
+    def _calc_indicators_parallel(self) -> pd.DataFrame:
+        """
+        Modo multiproceso: ordena por (Ticker, Date), copia High/Low/Close/
+        Volume a memoria compartida y reparte tramos de tickers entre
+        `self.n_jobs` procesos, que escriben los indicadores en otro bloque
+        compartido del tamaño final.
+        """
+        df = self._sorted_data()
+        codes, tickers = pd.factorize(df["Ticker"], sort=True)
+        offsets = np.searchsorted(codes, np.arange(len(tickers) + 1))
+        n_rows = len(df)
+        columns = panel_indicators.INDICATOR_COLUMNS
+        # Con `ta` conviene partir más fino para equilibrar la carga; el motor
+        # numpy paga un costo fijo por barra en cada tramo, así que va uno por worker
+        shards = _shard_offsets(offsets, self.n_jobs * (4 if self.engine == "ta" else 1))
+
+        in_shm = shared_memory.SharedMemory(create=True, size=n_rows * len(_SHM_INPUTS) * 8)
+        out_shm = shared_memory.SharedMemory(create=True, size=n_rows * len(columns) * 8)
+        try:
+            inputs = np.ndarray((n_rows, len(_SHM_INPUTS)), dtype=float, buffer=in_shm.buf)
+            inputs[:] = df[_SHM_INPUTS].to_numpy(dtype=float)
+            outputs = np.ndarray((n_rows, len(columns)), dtype=float, buffer=out_shm.buf)
+
+            with ProcessPoolExecutor(max_workers=self.n_jobs) as pool:
+                futures = [
+                    pool.submit(_shard_indicators, self.engine, self.indicator_params,
+                                in_shm.name, out_shm.name, n_rows, shard)
+                    for shard in shards
+                ]
+                states = [f.result() for f in futures]
+
+            for i, name in enumerate(columns):
+                self._set_column(df, name, outputs[:, i])
+            del inputs, outputs
+        finally:
+            in_shm.close()
+            in_shm.unlink()
+            out_shm.close()
+            out_shm.unlink()
+
+        if self.engine == "numpy":
+            state = IndicatorState.concat(states)
+            state.tickers = list(tickers)
+            last_rows = df["Date"].to_numpy(dtype="datetime64[ns]")[offsets[1:] - 1]
+            state.arrays["last_date"] = last_rows.astype("int64").astype(float)
+            self.indicator_state = state
+
+        # --- GENERACIÓN DE 'target' ---
+        self._set_column(df, "target", _target_from_offsets(df["Close"].to_numpy(dtype=float), offsets))
+
+        # Eliminamos filas que tengan NaN por cálculos de indicadores
+        df.dropna(inplace=True)
+        return df
+
+    def _calc_indicators_cached(self) -> pd.DataFrame:
+        """
+        Como `_calc_indicators_panel`, pero indicador por indicador contra
+        `self.feature_store`: los aciertos se leen de la caché, y los
+        tickers nuevos o con barras agregadas se calculan juntos en un panel
+        (los segundos sólo en su cola, partiendo del estado guardado).
+        """
+        store = self.feature_store
+        df = self._sorted_data()
+        codes, tickers = pd.factorize(df["Ticker"], sort=True)
+        offsets = np.searchsorted(codes, np.arange(len(tickers) + 1))
+        inputs = [df["Date"].to_numpy(dtype="datetime64[ns]").astype("int64")]
+        inputs += [df[c].to_numpy(dtype=float) for c in _SHM_INPUTS]
+        per_ticker = [[x[a:b] for x in inputs] for a, b in zip(offsets[:-1], offsets[1:])]
+        digests = [{} for _ in tickers]
+
+        columns = {name: np.empty(len(df)) for name in panel_indicators.INDICATOR_COLUMNS}
+        states = []
+        for name, out_cols in panel_indicators.OUTPUT_COLUMNS.items():
+            params = self.indicator_params[name]
+            fresh = IndicatorState.empty([None], self.indicator_params, [name])
+            pending, ticker_states = [], []
+            for j, ticker in enumerate(tickers):
+                found = store.lookup(ticker, name, params, per_ticker[j], digests[j])
+                if found is None:
+                    pending.append((j, 0))
+                    ticker_states.append(fresh)
+                    continue
+                outputs, state, n_cached = found
+                for col in out_cols:
+                    columns[col][offsets[j]:offsets[j] + n_cached] = outputs[col]
+                ticker_states.append(IndicatorState([ticker], state, {name: params}))
+                if n_cached < len(per_ticker[j][0]):
+                    pending.append((j, n_cached))
+
+            if pending:
+                # Un solo panel con las colas a calcular de todos los tickers pendientes
+                sizes = np.array([offsets[j + 1] - offsets[j] - start for j, start in pending])
+                rows = np.concatenate([np.arange(n) for n in sizes])
+                cols = np.repeat(np.arange(len(pending)), sizes)
+                src = np.concatenate([np.arange(offsets[j] + start, offsets[j + 1])
+                                      for j, start in pending])
+                shape = (int(sizes.max()), len(pending))
+                panels = [panel_indicators.to_panel(x[src], rows, cols, shape) for x in inputs[1:]]
+                state = IndicatorState.concat([ticker_states[j] for j, _ in pending])
+                indicators, state = panel_indicators.compute_indicators(
+                    *panels, state=state, names=[name])
+                for col in out_cols:
+                    columns[col][src] = indicators[col][rows, cols]
+                for i, (j, _) in enumerate(pending):
+                    col_state = {k: v[..., i:i + 1] for k, v in state.arrays.items()}
+                    ticker_states[j] = IndicatorState([tickers[j]], col_state, {name: params})
+                    outputs = {col: columns[col][offsets[j]:offsets[j + 1]] for col in out_cols}
+                    store.put(tickers[j], name, params, per_ticker[j], outputs, col_state, digests[j])
+            store.commit()
+            state = IndicatorState.concat(ticker_states)
+            state.tickers = list(tickers)
+            states.append(state)
+
+        state = IndicatorState.combine(states)
+        state.arrays["last_date"] = inputs[0][offsets[1:] - 1].astype(float)
+        self.indicator_state = state
+        for name, values in columns.items():
+            self._set_column(df, name, values)
+
+        # --- GENERACIÓN DE 'target' ---
+        self._set_column(df, "target", _target_from_offsets(inputs[3], offsets))
+
+        # Eliminamos filas que tengan NaN por cálculos de indicadores
+        df.dropna(inplace=True)
+        return df
 
     def _calc_indicators_for_group(self, df_subset: pd.DataFrame) -> pd.DataFrame:
         """
@@ -46,48 +422,159 @@ class FeatureEngineer:
         df_subset = df_subset.sort_values("Date")
 
         close_ = df_subset["Close"]
-        high_  = df_subset["High"]
-        low_   = df_subset["Low"]
-        vol_   = df_subset["Volume"]
+        for name, values in _ta_indicators(df_subset["High"], df_subset["Low"], close_,
+                                           df_subset["Volume"], self.indicator_params,
+                                           ticker=df_subset["Ticker"].iloc[0] if len(df_subset) else None).items():
+            self._set_column(df_subset, name, values)
+
+        # --- GENERACIÓN DE 'target' ---
+        self._set_column(df_subset, "target", (close_.shift(-1) > close_).astype(int))
 
-        # --- EJEMPLOS DE INDICADORES ---
+        # Eliminamos filas que tengan NaN por cálculos de indicadores
+        df_subset.dropna(inplace=True)
 
-        # 1. RSI
-        df_subset["rsi"] = ta.momentum.rsi(close_, window=14)
+        return df_subset
 
-        # 2. MACD y MACD signal
-        df_subset["macd"] = ta.trend.macd(close_, window_slow=26, window_fast=12)
-        df_subset["macd_signal"] = ta.trend.macd_signal(close_, window_slow=26, window_fast=12, window_sign=9)
 
-        # 3. Bollinger Bands
-        bb = BollingerBands(close=close_, window=20, window_dev=2)
-        df_subset["bb_mavg"] = bb.bollinger_mavg()
-        df_subset["bb_hband"] = bb.bollinger_hband()
-        df_subset["bb_lband"] = bb.bollinger_lband()
+class IncrementalFeatureEngineer:
+    """
+    Modo incremental de `FeatureEngineer`: guarda un `IndicatorState` por
+    ticker y, al llegar barras nuevas, calcula los indicadores sólo para
+    esas barras (costo O(1) por barra y ticker, sin releer la historia).
 
-        # 4. ATR (Average True Range)
-        atr = AverageTrueRange(high_, low_, close_, window=14)
-        df_subset["atr"] = atr.average_true_range()
+    Para la misma historia los valores coinciden exactamente con los de
+    `FeatureEngineer(engine="numpy").add_technical_indicators()`. Las filas
+    nuevas no traen 'target' (depende del Close siguiente) ni se descartan
+    por NaN: durante el calentamiento los indicadores quedan en NaN.
+    """
 
-        # 5. OBV (On-Balance Volume)
-        obv = OnBalanceVolumeIndicator(close=close_, volume=vol_)
-        df_subset["obv"] = obv.on_balance_volume()
+    def __init__(self, state: IndicatorState = None):
+        self.state = state if state is not None else IndicatorState.empty([])
 
-        # 6. ADX (fuerza de la tendencia)
-        adx = ADXIndicator(high_, low_, close_, window=14)
-        df_subset["adx"] = adx.adx()
-        df_subset["adx_pos"] = adx.adx_pos()
-        df_subset["adx_neg"] = adx.adx_neg()
+    @classmethod
+    def from_history(cls, data: pd.DataFrame):
+        """Procesa la historia completa una vez y deja el estado listo."""
+        fe = FeatureEngineer(data, engine="numpy")
+        fe.add_technical_indicators()
+        return cls(fe.indicator_state)
 
-        # 7. Estocástico
-        stoch = StochasticOscillator(high_, low_, close_, window=14, smooth_window=3)
-        df_subset["stoch_k"] = stoch.stoch()
-        df_subset["stoch_d"] = stoch.stoch_signal()
+    @classmethod
+    def load(cls, path):
+        return cls(IndicatorState.load(path))
 
-        # --- GENERACIÓN DE 'target' ---
-        df_subset["target"] = (close_.shift(-1) > close_).astype(int)
+    def save(self, path):
+        self.state.save(path)
 
+    def update(self, new_bars: pd.DataFrame) -> pd.DataFrame:
+        """
+        Recibe barras nuevas en formato largo [Date, Open, High, Low, Close,
+        Volume, Ticker] (una o varias por ticker, posteriores a las ya
+        procesadas) y devuelve esas filas con las columnas de indicadores.
+        """
+        df = new_bars.sort_values(["Ticker", "Date"], kind="mergesort").copy()
+        if df.empty:
+            return df.assign(**{name: np.nan for name in panel_indicators.INDICATOR_COLUMNS})
+        rows, cols, shape, tickers = panel_indicators.panel_layout(df)
+        state = self.state.select(list(tickers))
+
+        first_dates = df.groupby(cols)["Date"].min().to_numpy(dtype="datetime64[ns]")
+        stale = first_dates.astype("int64").astype(float) <= state.arrays["last_date"]
+        if stale.any():
+            raise ValueError(
+                f"Barras repetidas o fuera de orden para: {list(tickers[stale])}"
+            )
+
+        def panel(column):
+            return panel_indicators.to_panel(df[column].to_numpy(dtype=float), rows, cols, shape)
+
+        indicators, state = panel_indicators.compute_indicators(
+            panel("High"), panel("Low"), panel("Close"), panel("Volume"), state
+        )
+        state.arrays["last_date"] = _last_dates(df, rows, cols, shape)
+        self.state.update(state)
+        for name in panel_indicators.INDICATOR_COLUMNS:
+            df[name] = indicators[name][rows, cols]
+        return df
+
+
+class ChunkedFeatureEngineer:
+    """
+    Modo fuera de memoria de `FeatureEngineer` (motor numpy): procesa la
+    historia de a bloques (p.ej. los de `DataLoader.iter_chunks`, cada
+    ticker en orden de fecha entre bloques) sin armar nunca el frame largo
+    completo.
+
+    Entre bloques se arrastra lo que el cálculo necesita mirar hacia atrás:
+    el `IndicatorState` de cada ticker (EMAs, suavizados de Wilder y las
+    últimas filas de las ventanas de Bollinger y del Estocástico) y la
+    última fila de cada ticker, cuyo 'target' depende del Close de la barra
+    siguiente: esa fila sale con el bloque siguiente (o con `flush`). La
+    memoria depende del tamaño del bloque y del universo, no de la historia.
+
+    Concatenando las salidas se obtiene lo mismo que
+    `FeatureEngineer(engine="numpy").add_technical_indicators()`; dentro de
+    cada bloque las filas van ordenadas por (Ticker, Date).
+    """
+
+    def __init__(self, indicator_params: dict = None, low_memory: bool = False):
+        self.engineer = IncrementalFeatureEngineer(IndicatorState.empty([], indicator_params))
+        self.low_memory = low_memory
+        # Última fila de cada ticker, a la espera del Close siguiente para su 'target'
+        self.pending = None
+
+    def _finish(self, df, target) -> pd.DataFrame:
+        if self.low_memory:
+            for name in panel_indicators.INDICATOR_COLUMNS:
+                df[name] = df[name].astype(np.float32)
+        df["target"] = target.astype(np.int8 if self.low_memory else int)
         # Eliminamos filas que tengan NaN por cálculos de indicadores
-        df_subset.dropna(inplace=True)
+        df.dropna(inplace=True)
+        return df
 
-        return df_subset
\ No newline at end of file
+    def process(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Indicadores y 'target' de un bloque; devuelve las filas ya completas."""
+        with profiling.span("chunk", "features", rows=len(chunk)):
+            rows = self.engineer.update(chunk)
+            if self.pending is not None and len(self.pending):
+                rows = pd.concat([self.pending, rows]).sort_values(["Ticker", "Date"],
+                                                                   kind="mergesort")
+            codes = pd.factorize(rows["Ticker"])[0]
+            close_ = rows["Close"].to_numpy(dtype=float)
+            has_next = np.zeros(len(rows), dtype=bool)
+            has_next[:-1] = codes[1:] == codes[:-1]
+            target = np.zeros(len(rows), dtype=bool)
+            with np.errstate(invalid="ignore"):
+                target[:-1] = close_[1:] > close_[:-1]
+
+            self.pending = rows.loc[~has_next]
+            return self._finish(rows.loc[has_next].copy(), target[has_next])
+
+    def flush(self) -> pd.DataFrame:
+        """Última fila de cada ticker (sin barra siguiente: 'target' = 0)."""
+        pending, self.pending = self.pending, None
+        if pending is None:
+            return pd.DataFrame()
+        return self._finish(pending.copy(), np.zeros(len(pending), dtype=bool))
+
+    def transform(self, chunks):
+        """Genera los bloques de salida de `chunks` (y al final, `flush`)."""
+        for chunk in chunks:
+            out = self.process(chunk)
+            if len(out):
+                yield out
+        out = self.flush()
+        if len(out):
+            yield out
+
+    def transform_to_store(self, chunks, store) -> int:
+        """
+        Como `transform`, pero escribe cada ticker en `store` (un
+        `ColumnarStore`, partición "ticker={ticker}") en vez de devolver
+        los bloques. Devuelve la cantidad de filas escritas.
+        """
+        written = 0
+        for out in self.transform(chunks):
+            for ticker, group in out.groupby("Ticker", observed=True, sort=False):
+                store.append(f"ticker={ticker}", group)
+            written += len(out)
+        return written
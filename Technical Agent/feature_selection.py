@@ -1,22 +1,194 @@
+import warnings
+
 import numpy as np
 import pandas as pd
 
+import profiling
+
+
+class CorrelationAccumulator:
+    """
+    Correlación de Pearson acumulada por bloques de filas:
+
+        acc = CorrelationAccumulator(features)
+        for chunk in pd.read_csv(path, chunksize=100_000):
+            acc.update(chunk)
+        acc.corr()
+
+    Guarda, por par de features, la cantidad de filas con ambos valores y
+    las sumas, sumas de cuadrados y productos (desplazados por la media del
+    primer bloque, para no perder precisión con OBV o precios). Da lo mismo
+    que `DataFrame.corr()` (NaN por pares, como pandas) sin tener el frame
+    entero en memoria. Dos acumuladores de las mismas features se combinan
+    con `merge` (p.ej. uno por ticker o por archivo). Ocupa 4 matrices de
+    features x features en float64.
+    """
+    def __init__(self, features):
+        self.features = list(features)
+        p = len(self.features)
+        self.shift = None
+        self.n = np.zeros((p, p))
+        # s[i, j] = suma de x_i en las filas donde x_i y x_j no son NaN
+        self.s = np.zeros((p, p))
+        self.s2 = np.zeros((p, p))
+        self.prod = np.zeros((p, p))
+
+    def update(self, chunk):
+        """Suma un bloque (DataFrame con las features, o array filas x features)."""
+        if isinstance(chunk, pd.DataFrame):
+            chunk = chunk[self.features].to_numpy(dtype=np.float64)
+        x = np.asarray(chunk, dtype=np.float64)
+        if not len(x):
+            return self
+        if self.shift is None:
+            with np.errstate(invalid="ignore"):
+                self.shift = np.nan_to_num(np.nanmean(x, axis=0)) if np.isnan(x).any() else x.mean(axis=0)
+        x = x - self.shift
+        valid = ~np.isnan(x)
+        if valid.all():
+            # Sin NaN todas las filas cuentan para todos los pares
+            self.n += len(x)
+            self.s += x.sum(axis=0)[:, None]
+            self.s2 += np.einsum("ij,ij->j", x, x)[:, None]
+        else:
+            x[~valid] = 0.0
+            m = valid.astype(np.float64)
+            self.n += m.T @ m
+            self.s += x.T @ m
+            self.s2 += (x * x).T @ m
+        self.prod += x.T @ x
+        return self
+
+    def merge(self, other):
+        """Suma los estadísticos de `other` (mismas features) a este acumulador."""
+        if other.features != self.features:
+            raise ValueError("Sólo se pueden combinar acumuladores de las mismas features")
+        if other.shift is None:
+            return self
+        if self.shift is None:
+            self.shift = other.shift.copy()
+            self.n, self.s, self.s2, self.prod = (other.n.copy(), other.s.copy(),
+                                                  other.s2.copy(), other.prod.copy())
+            return self
+        # Se pasan los estadísticos de `other` al desplazamiento de éste
+        d = (other.shift - self.shift)[:, None]
+        n, s = other.n, other.s
+        self.prod += other.prod + d * s.T + d.T * s + d * d.T * n
+        self.s2 += other.s2 + 2 * d * s + d * d * n
+        self.s += s + d * n
+        self.n += n
+        return self
+
+    def corr(self) -> pd.DataFrame:
+        """Matriz de correlación (NaN para pares con menos de 2 filas o varianza nula)."""
+        n, s = self.n, self.s
+        var = n * self.s2 - s * s
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = (n * self.prod - s * s.T) / np.sqrt(var * var.T)
+        corr[(n < 2) | ~(var > 0) | ~(var.T > 0)] = np.nan
+        np.clip(corr, -1.0, 1.0, out=corr)
+        return pd.DataFrame(corr, index=self.features, columns=self.features)
+
+
+def correlated_to_drop(corr, threshold=0.9, greedy=False):
+    """
+    Máscara de features a eliminar según la matriz `corr` (en el orden de
+    las features, que es el de prioridad).
+    - greedy=False: se elimina toda feature con |corr| > threshold con
+      alguna anterior (el criterio original de `remove_highly_correlated`).
+    - greedy=True: sólo cuentan las anteriores que se quedan, así que una
+      feature parecida a otra ya eliminada puede quedarse.
+    """
+    high = np.triu(np.abs(np.asarray(corr, dtype=np.float64)) > threshold, k=1)
+    if not greedy:
+        return high.any(axis=0)
+    drop = np.zeros(len(high), dtype=bool)
+    for i in range(len(high)):
+        if not drop[i]:
+            drop |= high[i]
+    return drop
+
+
 class FeatureSelector:
     """
     Elimina features con alta correlación para reducir sobreajuste y ruido.
+    `data` puede ser un DataFrame o un iterable de DataFrames (bloques de
+    filas, p.ej. uno por ticker o por archivo); en ese caso se recorre una
+    sola vez, acumulando por bloques.
     """
-    def __init__(self, data: pd.DataFrame, features: list):
+    def __init__(self, data, features: list):
         self.data = data
         self.features = features
 
-    def remove_highly_correlated(self, threshold=0.9):
+    def _chunks(self, chunksize):
+        if not isinstance(self.data, pd.DataFrame):
+            yield from self.data
+        elif chunksize is None:
+            yield self.data
+        else:
+            for start in range(0, len(self.data), chunksize):
+                yield self.data.iloc[start:start + chunksize]
+
+    def correlation(self, chunksize=None, by=None, window=None):
+        """
+        Matriz de correlación de las features, acumulada de a `chunksize`
+        filas. Con `by` (p.ej. "Ticker") y/o `window` (período de pandas
+        sobre la columna Date: "Y", "Q", "M", ...) devuelve un dict
+        {grupo: matriz} con una matriz por ticker y/o ventana.
+        """
+        if by is None and window is None:
+            acc = CorrelationAccumulator(self.features)
+            for chunk in self._chunks(chunksize):
+                acc.update(chunk)
+            return acc.corr()
+
+        accs = {}
+        for chunk in self._chunks(chunksize):
+            keys = []
+            if by is not None:
+                keys.append(chunk[by])
+            if window is not None:
+                keys.append(pd.to_datetime(chunk["Date"]).dt.to_period(window).rename("window"))
+            for key, group in chunk.groupby(keys, observed=True, sort=False):
+                key = key[0] if len(keys) == 1 else key
+                if key not in accs:
+                    accs[key] = CorrelationAccumulator(self.features)
+                accs[key].update(group)
+        return {key: accs[key].corr() for key in sorted(accs)}
+
+    def remove_highly_correlated(self, threshold=0.9, chunksize=None, by=None, window=None,
+                                 agg="max", greedy=False):
         """
         Retorna (selected_features, dropped_features).
         - selected_features: las que se mantienen
         - dropped_features: las que se eliminan por correlación alta
+
+        Con `chunksize` (o `data` en bloques) la correlación se acumula por
+        bloques en vez de con `.corr()` sobre todo el frame. Con `by`/`window`
+        se calcula por grupo y se resume con `agg` ("max": alta en algún
+        grupo, "mean" o "median" de |corr| entre grupos). `greedy`: ver
+        `correlated_to_drop`.
         """
-        corr_matrix = self.data[self.features].corr().abs()
-        upper = corr_matrix.where(np.triu(np.ones(corr_matrix.shape), k=1).astype(bool))
-        to_drop = [col for col in upper.columns if any(upper[col] > threshold)]
-        selected = [f for f in self.features if f not in to_drop]
+        rows = len(self.data) if isinstance(self.data, pd.DataFrame) else None
+        with profiling.span("correlation", "selection", rows=rows,
+                            features=len(self.features)):
+            if chunksize is None and by is None and window is None \
+                    and isinstance(self.data, pd.DataFrame):
+                corr_matrix = self.data[self.features].corr()
+            else:
+                corr_matrix = self.correlation(chunksize, by, window)
+        if isinstance(corr_matrix, dict):
+            reducers = {"max": np.nanmax, "mean": np.nanmean, "median": np.nanmedian}
+            if agg not in reducers:
+                raise ValueError(f"agg desconocido: {agg!r} (usar 'max', 'mean' o 'median')")
+            if not corr_matrix:
+                return list(self.features), []
+            stacked = np.abs(np.stack([c.to_numpy() for c in corr_matrix.values()]))
+            with warnings.catch_warnings():
+                # Pares sin datos en ningún grupo: quedan en NaN (no se eliminan)
+                warnings.simplefilter("ignore", RuntimeWarning)
+                corr_matrix = reducers[agg](stacked, axis=0)
+        drop = correlated_to_drop(corr_matrix, threshold, greedy)
+        to_drop = [f for f, d in zip(self.features, drop) if d]
+        selected = [f for f, d in zip(self.features, drop) if not d]
         return selected, to_drop
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+
+def data_digest(arrays, n_rows) -> str:
+    """
+    Hash de las primeras `n_rows` filas de las series de entrada
+    (Date en ns, High, Low, Close, Volume).
+    """
+    h = hashlib.sha256()
+    for values in arrays:
+        h.update(np.ascontiguousarray(values[:n_rows]).tobytes())
+    return h.hexdigest()
+
+
+def content_key(name, params, digest) -> str:
+    """Clave de una entrada: indicador + parámetros + contenido de la entrada."""
+    payload = json.dumps([name, params, digest], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def lineage_key(ticker, name, params) -> str:
+    """Identifica la "serie" de entradas de un ticker/indicador/parámetros."""
+    payload = json.dumps([ticker, name, params], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class FeatureStore:
+    """
+    Caché en disco de las columnas de cada indicador por ticker, direccionada
+    por contenido: la clave es el hash de las barras de entrada junto con el
+    nombre del indicador y sus parámetros, así que sólo hay acierto si nada
+    de eso cambió.
+
+    Cada entrada guarda también el estado del indicador tras la última barra
+    (ver `panel_indicators.IndicatorState`). Si las barras nuevas extienden
+    una entrada ya guardada (mismo prefijo), `lookup` la devuelve como
+    prefijo y quien llama sólo calcula la cola partiendo de ese estado.
+
+    Estructura:
+        {root}/objects/{key[:2]}/{key}.npz
+        {root}/index.sqlite   (clave, linaje, filas, bytes, último acceso)
+
+    Cuando el total supera `max_bytes` se descartan las entradas usadas hace
+    más tiempo (LRU).
+    """
+    def __init__(self, root, max_bytes=1 << 30):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite"))
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, lineage TEXT, n_rows INTEGER,"
+            " size INTEGER, last_access REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS by_lineage ON entries (lineage, n_rows)")
+        self._db.commit()
+        self.hits = self.partial_hits = self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.root, "objects", key[:2], f"{key}.npz")
+
+    def _load(self, key):
+        try:
+            with np.load(self._path(key)) as data:
+                outputs = {k[2:]: data[k] for k in data.files if k.startswith("o_")}
+                state = {k[2:]: data[k] for k in data.files if k.startswith("s_")}
+        except FileNotFoundError:
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._db.commit()
+            return None
+        self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        return outputs, state
+
+    def lookup(self, ticker, name, params, arrays, digests=None):
+        """
+        Busca las columnas del indicador para estas barras. Devuelve
+        (outputs, state, n_rows) donde n_rows es cuántas de las primeras
+        filas cubre la entrada (todas = acierto completo), o None.
+        `digests` es un dict opcional {n_rows: data_digest} para no
+        rehashear la misma entrada con cada indicador.
+        """
+        digests = {} if digests is None else digests
+        n = len(arrays[0])
+
+        def digest(rows):
+            if rows not in digests:
+                digests[rows] = data_digest(arrays, rows)
+            return digests[rows]
+
+        key = content_key(name, params, digest(n))
+        if self._db.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone():
+            found = self._load(key)
+            if found is not None:
+                self.hits += 1
+                return (*found, n)
+
+        # ¿Hay una entrada más corta cuyo contenido sea un prefijo de estas barras?
+        candidates = self._db.execute(
+            "SELECT key, n_rows FROM entries WHERE lineage = ? AND n_rows < ?"
+            " ORDER BY n_rows DESC LIMIT 3",
+            (lineage_key(ticker, name, params), n),
+        ).fetchall()
+        for cand_key, rows in candidates:
+            if rows > 0 and content_key(name, params, digest(rows)) == cand_key:
+                found = self._load(cand_key)
+                if found is not None:
+                    self.partial_hits += 1
+                    return (*found, rows)
+        self.misses += 1
+        return None
+
+    def put(self, ticker, name, params, arrays, outputs, state, digests=None):
+        """Guarda las columnas del indicador (y su estado final) para estas barras."""
+        n = len(arrays[0])
+        digest = (digests or {}).get(n) or data_digest(arrays, n)
+        key = content_key(name, params, digest)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path,
+                 **{f"o_{k}": v for k, v in outputs.items()},
+                 **{f"s_{k}": v for k, v in state.items()})
+        os.replace(tmp_path, path)
+        self._db.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+            (key, lineage_key(ticker, name, params), n, os.path.getsize(path), time.time()),
+        )
+        return key
+
+    def commit(self):
+        """Persiste el índice y aplica el límite de tamaño."""
+        self._evict()
+        self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute(
+            "SELECT key, size FROM entries ORDER BY last_access"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+
+    def close(self):
+        self.commit()
+        self._db.close()
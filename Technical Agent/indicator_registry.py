@@ -0,0 +1,361 @@
+"""
+Registro de indicadores técnicos pedidos por nombre y parámetros.
+
+    from indicator_registry import REGISTRY
+    values = REGISTRY.compute(df, ["rsi", ("macd", {"window_fast": 8}), "atr"])
+    df = REGISTRY.compute_frame(df, ["rsi", "adx", "adx_pos"], by="Ticker")
+
+Cada indicador (y cada bloque intermedio: EMA, rango verdadero, mínimos y
+máximos móviles, suavizado de Wilder del ADX, ...) es un nodo con sus
+parámetros y sus dependencias. `plan` arma el grafo de lo pedido, así que
+lo que nadie pide no se calcula, y cada nodo se calcula una sola vez por
+ticker para cada juego de parámetros: `macd` y `macd_signal` comparten las
+EMA rápida y lenta, y `atr` y los tres del ADX comparten el rango verdadero.
+
+Las fórmulas replican las de `ta` (con `fillna=False`), incluidas sus
+particularidades (ATR y ADX valen 0 durante el calentamiento), así que el
+resultado es intercambiable con el de `ta`. El ADX de `ta` usa
+max(High, Close previo) - min(Low, Close previo), que es el rango
+verdadero siempre que High >= Low.
+"""
+import numpy as np
+import pandas as pd
+
+import profiling
+
+# Nodos de entrada: columnas del DataFrame de barras
+INPUTS = {"high": "High", "low": "Low", "close": "Close", "volume": "Volume"}
+
+
+class IndicatorRegistry:
+    """
+    Nodos registrados con `register`: {nombre: (función, dependencias,
+    parámetros por defecto)}. Las dependencias son una lista de nombres o
+    (nombre, parámetros), o una función de los parámetros del nodo que la
+    devuelve; la función del nodo recibe los valores de sus dependencias
+    (en ese orden) y sus parámetros como keywords.
+    """
+    def __init__(self):
+        self.nodes = {}
+
+    def register(self, name, deps=(), **defaults):
+        def decorator(func):
+            self.nodes[name] = (func, deps, defaults)
+            return func
+        return decorator
+
+    def names(self):
+        return sorted(self.nodes)
+
+    def resolve(self, name, params=None):
+        """Clave (nombre, parámetros completos) del nodo `name`."""
+        if name in INPUTS:
+            return name, ()
+        if name not in self.nodes:
+            raise ValueError(f"Indicador desconocido: {name!r}")
+        defaults = self.nodes[name][2]
+        params = params or {}
+        unknown = set(params) - set(defaults)
+        if unknown:
+            raise ValueError(f"Parámetros desconocidos para {name!r}: {sorted(unknown)}")
+        return name, tuple((k, params.get(k, v)) for k, v in defaults.items())
+
+    def _deps(self, key):
+        name, params = key
+        if name in INPUTS:
+            return []
+        deps = self.nodes[name][1]
+        if callable(deps):
+            deps = deps(dict(params))
+        return [self.resolve(*((d,) if isinstance(d, str) else d)) for d in deps]
+
+    @staticmethod
+    def _requests(requests):
+        """{etiqueta: (nombre, parámetros)} a partir de la lista o dict de pedidos."""
+        if isinstance(requests, dict):
+            items = requests.items()
+        else:
+            items = []
+            for req in requests:
+                name, params = (req, {}) if isinstance(req, str) else req
+                label = name if not params else "_".join([name, *map(str, params.values())])
+                items.append((label, req))
+        return {label: ((req, {}) if isinstance(req, str) else req) for label, req in items}
+
+    def plan(self, requests):
+        """
+        Resuelve el grafo de `requests` (nombres, (nombre, parámetros) o un
+        dict {etiqueta: pedido}). Devuelve ({etiqueta: clave}, claves en
+        orden de cálculo, cada una una sola vez y sus dependencias antes).
+        """
+        labels = {label: self.resolve(name, params)
+                  for label, (name, params) in self._requests(requests).items()}
+        order, seen, visiting = [], set(), set()
+
+        def visit(key):
+            if key in seen:
+                return
+            if key in visiting:
+                raise ValueError(f"Dependencia circular en {key[0]!r}")
+            visiting.add(key)
+            for dep in self._deps(key):
+                visit(dep)
+            visiting.discard(key)
+            seen.add(key)
+            order.append(key)
+
+        for key in labels.values():
+            visit(key)
+        return labels, order
+
+    def compute(self, data, requests, ticker=None) -> dict:
+        """
+        Calcula `requests` sobre las barras de un ticker (`data` con High,
+        Low, Close y Volume como Series ordenadas por fecha; DataFrame o
+        dict). Devuelve {etiqueta: Series}.
+        """
+        labels, order = self.plan(requests)
+        values = {}
+        for key in order:
+            name, params = key
+            if name in INPUTS:
+                values[key] = data[INPUTS[name]]
+                continue
+            func = self.nodes[name][0]
+            args = [values[dep] for dep in self._deps(key)]
+            with profiling.span(name, "indicator", ticker=ticker, rows=len(data[INPUTS["close"]])):
+                values[key] = func(*args, **dict(params))
+        return {label: values[key] for label, key in labels.items()}
+
+    def compute_frame(self, df: pd.DataFrame, requests, by="Ticker") -> pd.DataFrame:
+        """
+        Agrega a `df` las columnas pedidas, calculadas por separado para
+        cada valor de `by` (None = un solo ticker) en orden de fecha.
+        """
+        df = df.sort_values([by, "Date"] if by else "Date", kind="mergesort") \
+            if "Date" in df.columns else df.copy()
+        groups = df.groupby(by, sort=False, observed=True) if by else [(None, df)]
+        columns = {}
+        for ticker, group in groups:
+            for label, values in self.compute(group, requests, ticker=ticker).items():
+                columns.setdefault(label, []).append(pd.Series(values, index=group.index))
+        return df.assign(**{label: pd.concat(parts) for label, parts in columns.items()})
+
+
+REGISTRY = IndicatorRegistry()
+register = REGISTRY.register
+
+
+def _wilder(first, x, window, start):
+    """
+    Suavizado de Wilder como lo hace `ta`: arranca en `first` y sigue con
+    s[i] = s[i-1] - s[i-1] / window + x[start + i], dejando el último en 0.
+    """
+    out = [0.0] * (len(x) - (window - 1))
+    if not out:
+        return np.zeros(0)
+    out[0] = first
+    x = x.tolist()
+    w = float(window)
+    for i in range(1, len(out) - 1):
+        out[i] = out[i - 1] - (out[i - 1] / w) + x[start + i]
+    return np.array(out)
+
+
+# ---------------------------------------------------------------------------
+# Intermedios
+# ---------------------------------------------------------------------------
+
+@register("prev_close", deps=["close"])
+def _prev_close(close):
+    return close.shift(1)
+
+
+@register("ema", deps=["close"], window=12)
+def _ema(close, window):
+    return close.ewm(span=window, min_periods=window, adjust=False).mean()
+
+
+@register("sma", deps=["close"], window=20)
+def _sma(close, window):
+    return close.rolling(window, min_periods=window).mean()
+
+
+@register("rolling_std", deps=["close"], window=20)
+def _rolling_std(close, window):
+    return close.rolling(window, min_periods=window).std(ddof=0)
+
+
+@register("rolling_min_low", deps=["low"], window=14)
+def _rolling_min_low(low, window):
+    return low.rolling(window, min_periods=window).min()
+
+
+@register("rolling_max_high", deps=["high"], window=14)
+def _rolling_max_high(high, window):
+    return high.rolling(window, min_periods=window).max()
+
+
+@register("true_range", deps=["high", "low", "prev_close"])
+def _true_range(high, low, prev_close):
+    # Como `ta`: en la primera barra (sin Close previo) vale High - Low
+    tr = pd.DataFrame({"tr1": high - low, "tr2": (high - prev_close).abs(),
+                       "tr3": (low - prev_close).abs()})
+    return tr.max(axis=1)
+
+
+@register("directional_movement", deps=["high", "low"])
+def _directional_movement(high, low):
+    """(+DM, -DM) de cada barra (en la primera, NaN)."""
+    diff_up = high - high.shift(1)
+    diff_down = low.shift(1) - low
+    pos = abs(((diff_up > diff_down) & (diff_up > 0)) * diff_up)
+    neg = abs(((diff_down > diff_up) & (diff_down > 0)) * diff_down)
+    return pos, neg
+
+
+@register("adx_smooth", deps=["true_range", "directional_movement"], window=14)
+def _adx_smooth(true_range, directional_movement, window):
+    """Rango verdadero, +DM y -DM suavizados (barras 1..n, como `ta`)."""
+    tr = true_range.to_numpy(dtype=float)
+    tr[:1] = np.nan
+    smoothed = []
+    for x in (tr, *(s.to_numpy(dtype=float) for s in directional_movement)):
+        first = x[1:][~np.isnan(x[1:])][:window].sum()
+        smoothed.append(_wilder(first, x, window, window))
+    return tuple(smoothed)
+
+
+# ---------------------------------------------------------------------------
+# Indicadores
+# ---------------------------------------------------------------------------
+
+@register("rsi", deps=["close"], window=14)
+def _rsi(close, window):
+    diff = close.diff(1)
+    up = diff.where(diff > 0, 0.0)
+    down = -diff.where(diff < 0, 0.0)
+    emaup = up.ewm(alpha=1 / window, min_periods=window, adjust=False).mean()
+    emadn = down.ewm(alpha=1 / window, min_periods=window, adjust=False).mean()
+    return pd.Series(np.where(emadn == 0, 100, 100 - (100 / (1 + emaup / emadn))),
+                     index=close.index)
+
+
+@register("macd", deps=lambda p: [("ema", {"window": p["window_fast"]}),
+                                  ("ema", {"window": p["window_slow"]})],
+          window_slow=26, window_fast=12)
+def _macd(fast, slow, window_slow, window_fast):
+    return fast - slow
+
+
+@register("macd_signal", deps=lambda p: [("macd", {"window_slow": p["window_slow"],
+                                                   "window_fast": p["window_fast"]})],
+          window_slow=26, window_fast=12, window_sign=9)
+def _macd_signal(macd, window_slow, window_fast, window_sign):
+    return macd.ewm(span=window_sign, min_periods=window_sign, adjust=False).mean()
+
+
+@register("macd_diff", deps=lambda p: [("macd", {"window_slow": p["window_slow"],
+                                                 "window_fast": p["window_fast"]}),
+                                       ("macd_signal", p)],
+          window_slow=26, window_fast=12, window_sign=9)
+def _macd_diff(macd, signal, window_slow, window_fast, window_sign):
+    return macd - signal
+
+
+@register("bb_mavg", deps=lambda p: [("sma", {"window": p["window"]})], window=20, window_dev=2)
+def _bb_mavg(mavg, window, window_dev):
+    return mavg
+
+
+@register("bb_hband", deps=lambda p: [("sma", {"window": p["window"]}),
+                                      ("rolling_std", {"window": p["window"]})],
+          window=20, window_dev=2)
+def _bb_hband(mavg, mstd, window, window_dev):
+    return mavg + window_dev * mstd
+
+
+@register("bb_lband", deps=lambda p: [("sma", {"window": p["window"]}),
+                                      ("rolling_std", {"window": p["window"]})],
+          window=20, window_dev=2)
+def _bb_lband(mavg, mstd, window, window_dev):
+    return mavg - window_dev * mstd
+
+
+@register("atr", deps=["true_range"], window=14)
+def _atr(true_range, window):
+    tr = true_range.to_numpy(dtype=float)
+    atr = [0.0] * len(tr)
+    if len(tr) >= window:
+        atr[window - 1] = true_range.iloc[0:window].mean()
+        x = tr.tolist()
+        for i in range(window, len(atr)):
+            atr[i] = (atr[i - 1] * (window - 1) + x[i]) / float(window)
+    return pd.Series(atr, index=true_range.index)
+
+
+@register("obv", deps=["close", "prev_close", "volume"])
+def _obv(close, prev_close, volume):
+    return pd.Series(np.where(close < prev_close, -volume, volume), index=close.index).cumsum()
+
+
+def _directional_indicators(smooth):
+    trs, dip, din = smooth
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pos = np.where(trs != 0, 100 * (dip / trs), 0.0)
+        neg = np.where(trs != 0, 100 * (din / trs), 0.0)
+    return pos, neg
+
+
+def _di_series(smooth, index, window, which):
+    """+DI o -DI con la indexación de `ta` (desde la barra window+1)."""
+    out = np.zeros(len(index))
+    di = _directional_indicators(smooth)[which]
+    if len(di) > 2:
+        out[window + 1:window + len(di) - 1] = di[1:-1]
+    return pd.Series(out, index=index)
+
+
+@register("adx", deps=lambda p: ["close", ("adx_smooth", p)], window=14)
+def _adx(close, smooth, window):
+    pos, neg = _directional_indicators(smooth)
+    total = pos + neg
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dx = np.where(total != 0, 100 * np.abs((pos - neg) / total), 0.0)
+    adx = [0.0] * len(dx)
+    if len(adx) > window:
+        adx[window] = dx[0:window].mean()
+        x = dx.tolist()
+        for i in range(window + 1, len(adx)):
+            adx[i] = ((adx[i - 1] * (window - 1)) + x[i - 1]) / float(window)
+    return pd.Series(np.concatenate([np.zeros(min(window - 1, len(close))), adx]),
+                     index=close.index)
+
+
+@register("adx_pos", deps=lambda p: ["close", ("adx_smooth", p)], window=14)
+def _adx_pos(close, smooth, window):
+    return _di_series(smooth, close.index, window, 0)
+
+
+@register("adx_neg", deps=lambda p: ["close", ("adx_smooth", p)], window=14)
+def _adx_neg(close, smooth, window):
+    return _di_series(smooth, close.index, window, 1)
+
+
+@register("stoch_k", deps=lambda p: ["close", ("rolling_min_low", {"window": p["window"]}),
+                                     ("rolling_max_high", {"window": p["window"]})],
+          window=14)
+def _stoch_k(close, smin, smax, window):
+    return 100 * (close - smin) / (smax - smin)
+
+
+@register("stoch_d", deps=lambda p: [("stoch_k", {"window": p["window"]})],
+          window=14, smooth_window=3)
+def _stoch_d(stoch_k, window, smooth_window):
+    return stoch_k.rolling(smooth_window, min_periods=smooth_window).mean()
+
+
+@register("williams_r", deps=lambda p: ["close", ("rolling_min_low", p), ("rolling_max_high", p)],
+          window=14)
+def _williams_r(close, lowest, highest, window):
+    return -100 * (highest - close) / (highest - lowest)
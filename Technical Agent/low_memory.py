@@ -0,0 +1,90 @@
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+import profiling
+
+
+def rss_mb():
+    """RSS actual del proceso en MB (None si no hay /proc)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+class MemoryTracker:
+    """
+    Mide la memoria de cada etapa del pipeline:
+
+        tracker = MemoryTracker()
+        with tracker.stage("features"):
+            ...
+        tracker.report()
+
+    o, para que el `Pipeline` mida cada etapa, `Pipeline(..., tracker=tracker)`.
+
+    Por etapa registra el pico de memoria reservada durante la etapa (por
+    encima de lo que ya había al empezar), lo que quedó retenido al
+    terminar, el RSS del proceso al final y la duración. Usa `tracemalloc`,
+    que ve las reservas de Python y de numpy/pandas pero hace más lentas las
+    etapas medidas: es para diagnóstico, no para dejar siempre encendido
+    (con `enabled=False`, `stage` no mide nada).
+
+    Cada etapa es también un span "stage" de `profiling`. El pico de
+    tracemalloc es global: si la instrumentación ya mide memoria
+    (`profiling.enable(memory=True)`), el span reinicia el pico y suma el de
+    sus hijos, así que se usa su pico en vez de reiniciarlo dos veces.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            with profiling.span(name, "stage"):
+                yield
+            return
+        started_here = not tracemalloc.is_tracing()
+        if started_here:
+            tracemalloc.start()
+        shared = profiling.measures_memory()
+        before, _ = tracemalloc.get_traced_memory()
+        if not shared:
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        try:
+            with profiling.span(name, "stage") as span:
+                yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            self.stages.append({
+                "stage": name,
+                "peak_mb": span.peak_mb if shared else (peak - before) / 2 ** 20,
+                "retained_mb": (current - before) / 2 ** 20,
+                "rss_mb": rss_mb(),
+                "seconds": time.perf_counter() - t0,
+            })
+            if started_here:
+                tracemalloc.stop()
+
+    def report(self) -> pd.DataFrame:
+        df = pd.DataFrame(self.stages, columns=["stage", "peak_mb", "retained_mb", "rss_mb", "seconds"])
+        print(df.round(1).to_string(index=False))
+        return df
+
+
+def split_by_date(df: pd.DataFrame, dates: pd.Series, cutoff):
+    """
+    Parte `df` (ordenado por `dates`) en (filas con fecha <= cutoff, resto)
+    con `iloc` por posición: las dos partes son vistas, no copias.
+    """
+    split = int(np.searchsorted(dates.to_numpy(), np.datetime64(pd.Timestamp(cutoff)), side="right"))
+    return df.iloc[:split], df.iloc[split:]
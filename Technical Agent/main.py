@@ -1,103 +1,363 @@
+import argparse
+import os
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 
-def main():
-    # Import de las clases
-    from data_loader import DataLoader
-    from feature_engineering import FeatureEngineer
-    from feature_selection import FeatureSelector
-    from model_tuning import ModelTuner
-    from model_execution import ModelExecutor
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
 
-    # 1. Definir tickers y rango de fechas
-    TICKERS = ["AAPL", "MSFT", "GOOG"]
-    loader = DataLoader(tickers=TICKERS, start_date="2020-01-01", end_date="2025-01-01")
+# 1. Definir tickers y rango de fechas
+TICKERS = ["AAPL", "MSFT", "GOOG"]
+START_DATE, END_DATE = "2020-01-01", "2025-01-01"
 
-    # 2. Cargar datos en un solo DataFrame con columna 'Ticker'
-    df_all = loader.load_data_multi()
+# 5. Definir lista inicial de features
+BASE_FEATURES = [
+    "rsi","macd","macd_signal",
+    "bb_mavg","bb_hband","bb_lband",
+    "atr","obv","adx","adx_pos","adx_neg",
+    "stoch_k","stoch_d",
+    # Incluir Ticker_code
+    "Ticker_code"
+]
+
+# 9. Definir grilla de hiperparámetros
+PARAM_GRID = {
+    'n_estimators': [100, 200],
+    'max_depth': [None, 5, 10],
+    'min_samples_split': [2, 5],
+    'min_samples_leaf': [1, 2],
+    'max_features': ['sqrt', 'log2']
+}
+
+
+# ---------------------------------------------------------------------------
+# Etapas del pipeline. Cada una recibe las salidas de sus dependencias (por
+# nombre de etapa) y su config; ver `pipeline.Pipeline`.
+# ---------------------------------------------------------------------------
+
+def load_stage(tickers, start_date, end_date, low_memory):
+    from data_loader import DataLoader
+    from ohlcv_store import OHLCVStore
+
+    # Cache local de barras: sólo se descargan los rangos que aún no están en disco
+    store = OHLCVStore(os.path.join(DATA_DIR, "ohlcv"))
+    loader = DataLoader(tickers=tickers, start_date=start_date, end_date=end_date, store=store,
+                        max_workers=8, requests_per_second=5, low_memory=low_memory)
     # df_all => columnas: [Date, Open, High, Low, Close, Adj Close, Volume, Ticker]
+    return loader.load_data_multi()
 
-    # 3. Ingeniería de características (indicadores + target)
-    fe = FeatureEngineer(df_all)
+
+def features_stage(load, low_memory):
+    from feature_engineering import FeatureEngineer
+    from feature_store import FeatureStore
+
+    # Indicadores + target; los ya calculados para las mismas barras se leen de la caché
+    feature_store = FeatureStore(os.path.join(DATA_DIR, "features"))
+    fe = FeatureEngineer(load, engine="numpy", feature_store=feature_store, low_memory=low_memory)
     df_feat = fe.add_technical_indicators()
+    feature_store.close()
+
+    # Convertir Ticker en categoría => luego a código numérico
+    if low_memory:
+        # Ticker ya es categórica; se reordena sin crear otro DataFrame
+        df_feat.sort_values(["Date", "Ticker"], inplace=True, ignore_index=True)
+    else:
+        df_feat["Ticker"] = df_feat["Ticker"].astype("category")
+        df_feat = df_feat.sort_values(["Date", "Ticker"]).reset_index(drop=True)
 
-    # 4. Convertir Ticker en categoría => luego a código numérico
-    df_feat["Ticker"] = df_feat["Ticker"].astype("category")
-    df_feat = df_feat.sort_values(["Date", "Ticker"]).reset_index(drop=True)
-    
     # (Opcional) Creas un Ticker_code para que el modelo sepa de cuál activo se trata
     df_feat["Ticker_code"] = df_feat["Ticker"].cat.codes
+    return df_feat
 
-    # 5. Definir lista inicial de features
-    base_features = [
-        "rsi","macd","macd_signal",
-        "bb_mavg","bb_hband","bb_lband",
-        "atr","obv","adx","adx_pos","adx_neg",
-        "stoch_k","stoch_d", 
-        # Incluir Ticker_code
-        "Ticker_code"
-    ]
 
-    # 6. Visualizar correlación (opcional)
-    corr_matrix = df_feat[base_features].corr()
-    plt.figure(figsize=(10,8))
-    sns.heatmap(corr_matrix, cmap='coolwarm', annot=False)
-    plt.title("Matriz de Correlación de Features (Multiticker)")
-    plt.show()
+def correlation_stage(features, base_features):
+    # Sólo la matriz: el gráfico se hace al final, en el hilo principal
+    return features[base_features].corr()
+
 
-    # 7. Selección de features (colinealidad)
-    fs = FeatureSelector(df_feat, base_features)
-    selected_feats, dropped_feats = fs.remove_highly_correlated(threshold=0.9)
+def selection_stage(features, base_features, threshold):
+    from feature_selection import FeatureSelector
+
+    fs = FeatureSelector(features, base_features)
+    selected_feats, dropped_feats = fs.remove_highly_correlated(threshold=threshold)
     print("Features eliminadas por correlación alta:", dropped_feats)
     print("Features finales:", selected_feats)
+    return {"selected": selected_feats, "dropped": dropped_feats}
+
 
-    # 8. Dividir en Train y Test por fecha (respetando la cronología)
-    train_data = df_feat.loc[df_feat["Date"] <= "2022-12-31"]
-    test_data  = df_feat.loc[df_feat["Date"] >  "2022-12-31"]
+def split_stage(features, selection, cutoff, low_memory):
+    from low_memory import split_by_date
 
-    X_train = train_data[selected_feats]
-    y_train = train_data["target"]
-    X_test  = test_data[selected_feats]
-    y_test  = test_data["target"]
+    selected_feats = selection["selected"]
+    if low_memory:
+        # df_feat está ordenado por fecha: una sola copia de las features y dos vistas
+        X_train, X_test = split_by_date(features[selected_feats], features["Date"], cutoff)
+        y_train, y_test = split_by_date(features["target"], features["Date"], cutoff)
+    else:
+        train_data = features.loc[features["Date"] <= cutoff]
+        test_data  = features.loc[features["Date"] >  cutoff]
 
-    # 9. Definir grilla de hiperparámetros
-    param_grid = {
-        'n_estimators': [100, 200],
-        'max_depth': [None, 5, 10],
-        'min_samples_split': [2, 5],
-        'min_samples_leaf': [1, 2],
-        'max_features': ['sqrt', 'log2']
-    }
+        X_train = train_data[selected_feats]
+        y_train = train_data["target"]
+        X_test  = test_data[selected_feats]
+        y_test  = test_data["target"]
+    return {"X_train": X_train, "y_train": y_train, "X_test": X_test, "y_test": y_test}
 
-    # 10. Ajuste de hiperparámetros con GridSearchCV y TimeSeriesSplit
-    tuner = ModelTuner(param_grid=param_grid, cv_splits=3)
-    best_model, best_params, best_score = tuner.tune(X_train, y_train)
 
+def tune_stage(split, param_grid, cv_splits, strategy):
+    from model_tuning import ModelTuner
+
+    # TimeSeriesSplit; por defecto recorre toda la grilla ("grid"). Con
+    # --strategy racing descarta fold a fold las combinaciones claramente peores
+    tuner = ModelTuner(param_grid=param_grid, cv_splits=cv_splits, strategy=strategy)
+    best_model, best_params, best_score = tuner.tune(split["X_train"], split["y_train"])
     print("Mejores parámetros:", best_params)
     print("Mejor score (cv):", best_score)
+    return {"model": best_model, "params": best_params, "score": best_score}
+
+
+def evaluate_stage(tune, split):
+    from model_execution import ModelExecutor
 
-    # 11. Evaluar modelo final
-    executor = ModelExecutor(best_model)
-    acc_train = executor.evaluate(X_train, y_train)
-    acc_test  = executor.evaluate(X_test, y_test)
+    executor = ModelExecutor(tune["model"])
+    acc_train = executor.evaluate(split["X_train"], split["y_train"])
+    acc_test  = executor.evaluate(split["X_test"], split["y_test"])
     print(f"Accuracy en entrenamiento: {acc_train:.2f}")
     print(f"Accuracy en test: {acc_test:.2f}")
+    return {"train": acc_train, "test": acc_test}
+
 
-    # 12. Validación Walk-Forward (Opcional)
-    wf_scores = executor.walk_forward_validation(X_test, y_test, initial_train_size=100, test_size=30)
+def walk_forward_stage(tune, split, initial_train_size, test_size):
+    from model_execution import ModelExecutor
+
+    # Cada bloque entrena un clon en paralelo: el modelo ajustado queda intacto
+    executor = ModelExecutor(tune["model"])
+    wf_scores = executor.walk_forward_validation(split["X_test"], split["y_test"],
+                                                 initial_train_size=initial_train_size,
+                                                 test_size=test_size, n_jobs=-1)
     if wf_scores:
         print("Walk-Forward scores:", wf_scores)
         print("Media WF accuracy:", sum(wf_scores)/len(wf_scores))
+    return wf_scores
+
+
+def backtest_stage(tune, split, features, thresholds, holds, costs_bps):
+    from backtest import Backtester
+
+    # Probabilidades del modelo en test (fuera de muestra) => barrido de
+    # thresholds, holds y costos en una pasada vectorizada
+    model = tune["model"]
+    up = list(model.classes_).index(1)
+    X_test = split["X_test"]
+    preds = features.loc[X_test.index, ["Date", "Ticker", "Close"]]
+    preds = preds.assign(prob_up=model.predict_proba(X_test)[:, up])
+    results = Backtester(preds).sweep(thresholds, holds, costs_bps)
+    print("Backtest (mejores Sharpe):")
+    print(results.sort_values("sharpe", ascending=False).head(10).to_string(index=False))
+    return results
+
+
+def binned_features_stage(tickers, start_date, end_date, features, window):
+    from data_loader import DataLoader
+    from feature_engineering import ChunkedFeatureEngineer
+    from ohlcv_store import MmapOHLCVStore
+    from out_of_core import BinnedFeatureStore
+
+    # Modo fuera de memoria: barras al store por columnas (memmap; escribir un
+    # tramo no reescribe la historia) y features de a ventanas de tiempo,
+    # discretizadas a uint8 en disco (nunca se arma df_feat completo). Va en
+    # otro directorio: su coverage.json no vale para el Parquet de data/ohlcv
+    store = MmapOHLCVStore(os.path.join(DATA_DIR, "ohlcv_mmap"))
+    loader = DataLoader(tickers=tickers, start_date=start_date, end_date=end_date, store=store,
+                        max_workers=8, requests_per_second=5)
+    loader.ingest()
+    categories = sorted(tickers)
+
+    def chunks():
+        engineer = ChunkedFeatureEngineer(low_memory=True)
+        for chunk in engineer.transform(loader.iter_chunks(window)):
+            codes = pd.Categorical(chunk["Ticker"], categories=categories).codes
+            yield chunk.assign(Ticker_code=codes)
+
+    binned = BinnedFeatureStore(os.path.join(DATA_DIR, "binned"))
+    rows = binned.build(chunks, features)
+    print(f"[INFO] {rows} filas discretizadas en {binned.root}")
+    return binned.root
+
+
+def tune_out_of_core_stage(binned_features, param_grid, cv_splits, cutoff):
+    from out_of_core import BinnedFeatureStore, IncrementalTuner, streaming_accuracy
+
+    # partial_fit de a bloques del disco, con la misma validación temporal
+    binned = BinnedFeatureStore(binned_features)
+    split = binned.position(cutoff)
+    tuner = IncrementalTuner(param_grid=param_grid, cv_splits=cv_splits)
+    best_model, best_params, best_score = tuner.tune(binned, stop=split)
+    acc_test = streaming_accuracy(best_model, binned, start=split)
+    print("Mejores parámetros:", best_params)
+    print("Mejor score (cv):", best_score)
+    print(f"Accuracy en test: {acc_test:.2f}")
+    return {"model": best_model, "params": best_params, "score": best_score, "test": acc_test}
+
+
+def scorer_stage(load, features, selection, tune, evaluate):
+    from model_registry import ModelRegistry
+    from scoring import BatchScorer
+
+    # Modelo + estado de indicadores de cada ticker para puntuar la última barra
+    # sin correr todo el pipeline (ver scoring.py), como una versión nueva del registro
+    scorer = BatchScorer.from_history(tune["model"], selection["selected"], load,
+                                      ticker_categories=features["Ticker"].cat.categories)
+    registry = ModelRegistry(os.path.join(DATA_DIR, "models"))
+    version = registry.register(tune["model"], selection["selected"], scorer=scorer,
+                                params=tune["params"], score=tune["score"], metrics=evaluate,
+                                tickers=sorted(load["Ticker"].astype(str).unique()),
+                                last_date=str(load["Date"].max()))
+    print(f"Modelo registrado como {version} en {registry.root}")
+    return version
+
+
+def plot_correlation(corr, path=None):
+    """Mapa de calor de la correlación; con `path` se guarda como PNG sin abrir ventana."""
+    import matplotlib
+    if path:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    plt.figure(figsize=(10,8))
+    sns.heatmap(corr, cmap='coolwarm', annot=False)
+    plt.title("Matriz de Correlación de Features (Multiticker)")
+    _show_or_save(plt, path)
+
+
+def plot_importances(features, importances, path=None):
+    """Importancia de cada feature; con `path` se guarda como PNG sin abrir ventana."""
+    import matplotlib
+    if path:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
 
-    # 13. (Opcional) Graficar importancia de features
-    importances = best_model.feature_importances_
     plt.figure(figsize=(10,4))
-    plt.bar(selected_feats, importances, color='skyblue')
+    plt.bar(features, importances, color='skyblue')
     plt.title("Importancia de Features (RandomForest)")
     plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.show()
+    _show_or_save(plt, path)
+
+
+def _show_or_save(plt, path):
+    if path:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        plt.savefig(path)
+        plt.close()
+        print(f"Gráfico guardado en {path}")
+    else:
+        plt.show()
+
+
+def main(profile=None, profile_memory=False, plots=True, strategy="grid", low_memory=False,
+         memory_report=False):
+    # Import de las clases
+    import profiling
+    from pipeline import Pipeline
+    from low_memory import MemoryTracker
+
+    # Instrumentación (--profile): tiempos por descarga, indicador, etapa y fold
+    if profile:
+        profiling.enable(memory=profile_memory)
+
+    # Modo de memoria reducida (--low-memory): float32, Ticker categórica desde la
+    # carga, sin copias intermedias y train/test como vistas
+    LOW_MEMORY = low_memory
+    # Universos que no entran en memoria: features discretizadas en disco y
+    # entrenamiento incremental (ver out_of_core.py) en lugar de RandomForest
+    OUT_OF_CORE = False
+    # Pico de memoria por etapa (--memory-report): usa tracemalloc, que hace más
+    # lentas las etapas, y las corre de a una; sólo se mide cuando se pide
+    tracker = MemoryTracker() if memory_report else None
+
+    # Grafo de etapas: cada salida se guarda en disco con una clave que depende de
+    # la config y de las etapas previas, así una nueva corrida retoma desde la
+    # primera etapa que cambió. Las etapas independientes corren a la vez.
+    pipe = Pipeline(os.path.join(DATA_DIR, "pipeline"), tracker=tracker)
+    # 2. Cargar datos en un solo DataFrame con columna 'Ticker'
+    pipe.add("load", load_stage, config={"tickers": TICKERS, "start_date": START_DATE,
+                                         "end_date": END_DATE, "low_memory": LOW_MEMORY})
+    # 3-4. Ingeniería de características (indicadores + target) y Ticker_code
+    pipe.add("features", features_stage, deps=["load"], config={"low_memory": LOW_MEMORY})
+    # 6. Correlación (para el gráfico) || 7. Selección de features (colinealidad)
+    pipe.add("correlation", correlation_stage, deps=["features"],
+             config={"base_features": BASE_FEATURES})
+    pipe.add("selection", selection_stage, deps=["features"],
+             config={"base_features": BASE_FEATURES, "threshold": 0.9})
+    # 8. Dividir en Train y Test por fecha (respetando la cronología); es barato, no se guarda
+    pipe.add("split", split_stage, deps=["features", "selection"],
+             config={"cutoff": "2022-12-31", "low_memory": LOW_MEMORY}, cache=False)
+    # 10. Ajuste de hiperparámetros
+    pipe.add("tune", tune_stage, deps=["split"],
+             config={"param_grid": PARAM_GRID, "cv_splits": 3, "strategy": strategy})
+    # 11. Evaluar modelo final || 12. Validación Walk-Forward (Opcional)
+    pipe.add("evaluate", evaluate_stage, deps=["tune", "split"])
+    # (abre un pool de procesos: corre sola, sin otras etapas en paralelo)
+    pipe.add("walk_forward", walk_forward_stage, deps=["tune", "split"],
+             config={"initial_train_size": 100, "test_size": 30}, exclusive=True)
+    # 13b. Backtest de las señales en test: thresholds × holds × costos (bps)
+    pipe.add("backtest", backtest_stage, deps=["tune", "split", "features"],
+             config={"thresholds": [0.5, 0.525, 0.55, 0.575, 0.6, 0.625, 0.65],
+                     "holds": [1, 2, 3, 5, 10, 20], "costs_bps": [0, 5, 10, 20]})
+    # 14. Versión nueva en el registro de modelos, con el scorer para las señales
+    # diarias (python cli.py score)
+    pipe.add("scorer", scorer_stage, deps=["load", "features", "selection", "tune", "evaluate"])
+
+    # Fuera de memoria: sólo las etapas de disco + entrenamiento incremental
+    pipe.add("binned_features", binned_features_stage,
+             config={"tickers": TICKERS, "start_date": START_DATE, "end_date": END_DATE,
+                     "features": BASE_FEATURES, "window": "90D"})
+    pipe.add("tune_out_of_core", tune_out_of_core_stage, deps=["binned_features"],
+             config={"param_grid": {"alpha": [1e-5, 1e-4, 1e-3], "penalty": ["l2", "l1"]},
+                     "cv_splits": 3, "cutoff": "2022-12-31"})
+    if OUT_OF_CORE:
+        pipe.run(["tune_out_of_core"])
+        return
+
+    results = pipe.run(["correlation", "selection", "tune", "evaluate", "walk_forward",
+                        "backtest", "scorer"])
+    if tracker is not None:
+        tracker.report()
+    if profile:
+        os.makedirs(profile, exist_ok=True)
+        profiling.export_json(os.path.join(profile, "profile.json"))
+        profiling.export_chrome_trace(os.path.join(profile, "trace.json"))
+        print(profiling.summary().head(15))
+        by_ticker = profiling.summary(by=("name", "ticker"))
+        if not by_ticker.empty:
+            print(by_ticker.head(15))
+        print(f"Perfil guardado en {profile} (trace.json: chrome://tracing o Perfetto)")
+
+    if not plots:
+        return
+    # 6. Visualizar correlación (opcional)
+    plot_correlation(results["correlation"])
+
+    # 13. (Opcional) Graficar importancia de features
+    plot_importances(results["selection"]["selected"], results["tune"]["model"].feature_importances_)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Pipeline del Technical Agent")
+    parser.add_argument("--profile", nargs="?", const=os.path.join(DATA_DIR, "outputs"),
+                        metavar="DIR", help="instrumentar la corrida y guardar "
+                        "profile.json y trace.json en DIR (por defecto data/outputs)")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="con --profile, medir también el pico de memoria (más lento)")
+    parser.add_argument("--no-plots", action="store_true",
+                        help="no mostrar los gráficos (corridas sin pantalla; ver también cli.py)")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="float32, Ticker categórica y train/test como vistas (menos memoria)")
+    parser.add_argument("--memory-report", action="store_true",
+                        help="medir con tracemalloc el pico de memoria e imprimir el reporte (más lento)")
+    from model_tuning import STRATEGIES
+    parser.add_argument("--strategy", default="grid", choices=STRATEGIES,
+                        help="búsqueda de hiperparámetros (por defecto grid; racing descarta "
+                        "combinaciones fold a fold)")
+    args = parser.parse_args()
+    main(profile=args.profile, profile_memory=args.profile_memory, plots=not args.no_plots,
+         strategy=args.strategy, low_memory=args.low_memory, memory_report=args.memory_report)
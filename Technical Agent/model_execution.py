@@ -1,8 +1,88 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sklearn.base import clone
 from sklearn.metrics import accuracy_score
 
+import profiling
+
+
+def walk_forward_splits(n_samples, initial_train_size, test_size, window="rolling"):
+    """
+    Ventanas walk-forward como tuplas (train_start, train_end, test_end).
+    - "rolling": la ventana de entrenamiento tiene siempre `initial_train_size`
+      filas y avanza `test_size` filas por bloque.
+    - "expanding": el entrenamiento arranca siempre en 0 y crece.
+    """
+    if window not in ("rolling", "expanding"):
+        raise ValueError(f"window desconocida: {window!r} (usar 'rolling' o 'expanding')")
+    splits = []
+    start = 0
+    while (start + initial_train_size + test_size) <= n_samples:
+        train_end = start + initial_train_size
+        splits.append((start if window == "rolling" else 0, train_end, train_end + test_size))
+        start += test_size
+    return splits
+
+
+# Datos del walk-forward en cada proceso del pool: se copian una sola vez
+# por proceso (en el initializer) y cada tarea sólo recibe sus índices.
+_WF_DATA = {}
+
+
+def _init_walk_forward(model, X, y):
+    _WF_DATA.update(model=model, X=X, y=y)
+
+
+def _run_fold(fold, split, model=None, X=None, y=None):
+    """
+    Entrena un clon del modelo en la ventana `split` y evalúa el bloque
+    siguiente. Sin model/X/y usa los del proceso (ver `_init_walk_forward`).
+    """
+    if model is None:
+        model, X, y = _WF_DATA["model"], _WF_DATA["X"], _WF_DATA["y"]
+    train_start, train_end, test_end = split
+    X_test, y_test = X.iloc[train_end:test_end], y.iloc[train_end:test_end]
+
+    fold_model = clone(model)
+    start, cpu0 = time.time(), time.thread_time()
+    t0 = time.perf_counter()
+    fold_model.fit(X.iloc[train_start:train_end], y.iloc[train_start:train_end])
+    t1 = time.perf_counter()
+    y_pred = fold_model.predict(X_test)
+    t2 = time.perf_counter()
+    return {
+        "fold": fold,
+        "train_start": train_start,
+        "train_end": train_end,
+        "test_end": test_end,
+        "index": X_test.index,
+        "predictions": y_pred,
+        "score": accuracy_score(y_test, y_pred),
+        "fit_time": t1 - t0,
+        "predict_time": t2 - t1,
+        "cpu_time": time.thread_time() - cpu0,
+        "start": start,
+        "pid": os.getpid(),
+    }
+
+
+def _record_folds(folds, window):
+    """Pasa al profiler los tiempos de cada fold (medidos quizás en otro proceso)."""
+    if not profiling.is_enabled():
+        return
+    for f in folds:
+        fields = dict(pid=f["pid"], tid=f["pid"], fold=f["fold"], window=window)
+        profiling.record("fold", "model", f["start"], f["fit_time"] + f["predict_time"],
+                         cpu=f["cpu_time"], rows=f["test_end"] - f["train_start"], **fields)
+        profiling.record("fit", "model", f["start"], f["fit_time"],
+                         rows=f["train_end"] - f["train_start"], **fields)
+
+
 class ModelExecutor:
     """
-    Clase para entrenar y evaluar el modelo, 
+    Clase para entrenar y evaluar el modelo,
     incluyendo un método de validación walk-forward.
     """
     def __init__(self, model):
@@ -14,28 +94,40 @@ class ModelExecutor:
     def evaluate(self, X, y):
         return self.model.score(X, y)
 
-    def walk_forward_validation(self, X, y, initial_train_size, test_size):
+    def walk_forward_folds(self, X, y, initial_train_size, test_size, window="rolling", n_jobs=1):
+        """
+        Walk-forward con un clon del modelo por bloque (`self.model` no se
+        toca). Los bloques son independientes: con `n_jobs` > 1 (o -1 =
+        todos los núcleos) se reparten en un pool de procesos.
+        Devuelve una lista de dicts por bloque, en orden: límites de la
+        ventana, índice y predicciones del bloque de test, accuracy y
+        tiempos de entrenamiento y predicción (segundos) y de CPU.
+        """
+        splits = walk_forward_splits(len(X), initial_train_size, test_size, window)
+        n_jobs = os.cpu_count() if n_jobs == -1 else (n_jobs or 1)
+        n_jobs = min(n_jobs, len(splits))
+        if n_jobs <= 1:
+            folds = [_run_fold(i, s, self.model, X, y) for i, s in enumerate(splits)]
+            _record_folds(folds, window)
+            return folds
+
+        # Un proceso por núcleo: cada clon entrena en un solo hilo
+        model = clone(self.model)
+        if "n_jobs" in model.get_params():
+            model.set_params(n_jobs=1)
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_walk_forward,
+                                 initargs=(model, X, y)) as pool:
+            chunksize = max(1, len(splits) // (n_jobs * 4))
+            folds = list(pool.map(_run_fold, range(len(splits)), splits, chunksize=chunksize))
+        _record_folds(folds, window)
+        return folds
+
+    def walk_forward_validation(self, X, y, initial_train_size, test_size, window="rolling", n_jobs=1):
         """
         Divide X e y en ventanas que avanzan ('walk-forward').
         En cada bloque, entrena y evalúa.
         Devuelve los accuracies en cada iteración.
+        (Ver `walk_forward_folds` para el detalle por bloque.)
         """
-        n_samples = len(X)
-        scores = []
-        start = 0
-        while (start + initial_train_size + test_size) <= n_samples:
-            train_end = start + initial_train_size
-            test_end  = train_end + test_size
-
-            X_train_wf = X.iloc[start:train_end]
-            y_train_wf = y.iloc[start:train_end]
-            X_test_wf  = X.iloc[train_end:test_end]
-            y_test_wf  = y.iloc[train_end:test_end]
-
-            self.model.fit(X_train_wf, y_train_wf)
-            y_pred = self.model.predict(X_test_wf)
-            score = accuracy_score(y_test_wf, y_pred)
-            scores.append(score)
-
-            start += test_size
-        return scores
+        folds = self.walk_forward_folds(X, y, initial_train_size, test_size, window, n_jobs)
+        return [f["score"] for f in folds]
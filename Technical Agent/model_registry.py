@@ -0,0 +1,264 @@
+"""
+Registro versionado de modelos ajustados.
+
+    registry = ModelRegistry("data/models")
+    version = registry.register(model, selected_features, scorer=scorer,
+                                params=best_params, score=best_score,
+                                metrics={"test": acc_test})
+    registry.versions()                  # tabla de versiones
+    scorer = registry.load_scorer()      # la última (o version="v0003")
+
+Cada versión es una carpeta que no se modifica después de escrita:
+
+    {root}/v0001/meta.json     (parámetros, scores, features seleccionadas, ...)
+    {root}/v0001/model.pkl     (el estimador de scikit-learn tal cual)
+    {root}/v0001/scorer.pkl    (BatchScorer listo para puntuar)
+
+El scorer se guarda con el modelo "compilado" a arreglos de numpy cuando
+se puede (bosques y árboles de decisión, clasificadores lineales
+binarios y los `BinnedModel` de out_of_core): cargarlo no importa
+scikit-learn, que sólo en importarse tarda más de un segundo, así que
+`cli.py score` arranca rápido. Las predicciones son las mismas que las
+del estimador original. Con otros modelos se guarda el estimador tal cual.
+"""
+import json
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+
+
+def _as_matrix(X, features):
+    if hasattr(X, "columns"):
+        return X[features].to_numpy(dtype=np.float64)
+    return np.asarray(X, dtype=np.float64)
+
+
+class CompiledModel:
+    """
+    Base de los modelos compilados: mismas `classes_`, `predict` y
+    `predict_proba` que el estimador, opcionalmente precedidos de la
+    discretización de out_of_core (`bins`: cortes de cada feature).
+    """
+    def __init__(self, classes, features=None, bins=None):
+        self.classes_ = np.asarray(classes)
+        self.features = list(features) if features is not None else None
+        self.bins = bins
+
+    def transform(self, X) -> np.ndarray:
+        X = _as_matrix(X, self.features) if self.features is not None else np.asarray(X, dtype=np.float64)
+        if self.bins is None:
+            return X
+        from out_of_core import _ranks, _scale, apply_bins
+        return _ranks(apply_bins(X, self.bins), _scale(self.bins))
+
+    def _proba(self, X) -> np.ndarray:
+        raise NotImplementedError
+
+    def predict_proba(self, X) -> np.ndarray:
+        return self._proba(self.transform(X))
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def score(self, X, y) -> float:
+        return float(np.mean(self.predict(X) == np.asarray(y)))
+
+
+class CompiledForest(CompiledModel):
+    """
+    Árboles de decisión (uno o un bosque) como arreglos planos: todos los
+    árboles se recorren a la vez, un nivel por iteración, y en cada nivel
+    sólo se mueven los pares (fila, árbol) que todavía no llegaron a una
+    hoja (las hojas apuntan a sí mismas).
+    """
+    def __init__(self, trees, classes, features=None, bins=None):
+        super().__init__(classes, features, bins)
+        left, right, feature, threshold, missing_left, value, roots = [], [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            n = tree.node_count
+            idx = np.arange(n)
+            leaf = tree.children_left == -1
+            left.append(np.where(leaf, idx, tree.children_left) + offset)
+            right.append(np.where(leaf, idx, tree.children_right) + offset)
+            feature.append(np.where(leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            missing = getattr(tree, "missing_go_to_left", None)
+            missing_left.append(np.zeros(n, dtype=bool) if missing is None else missing.astype(bool))
+            v = tree.value[:, 0, :].astype(np.float64)
+            value.append(v / np.maximum(v.sum(axis=1, keepdims=True), np.finfo(float).tiny))
+            roots.append(offset)
+            offset += n
+        self.left = np.concatenate(left).astype(np.int32)
+        self.right = np.concatenate(right).astype(np.int32)
+        self.feature = np.concatenate(feature).astype(np.int32)
+        self.threshold = np.concatenate(threshold)
+        self.missing_left = np.concatenate(missing_left)
+        self.value = np.concatenate(value)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.leaf = self.left == np.arange(len(self.left))
+
+    def _proba(self, X) -> np.ndarray:
+        # scikit-learn compara en float32
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        n_trees = len(self.roots)
+        flat = X.ravel()
+        # Un par (fila, árbol) por posición; sólo se mueven los que no llegaron a una hoja
+        node = np.tile(self.roots, n_rows)
+        base = np.repeat(np.arange(n_rows, dtype=np.int64) * n_features, n_trees)
+        active = np.flatnonzero(~self.leaf[node])
+        while active.size:
+            current = node[active]
+            x = flat[base[active] + self.feature[current]]
+            go_left = (x <= self.threshold[current]) | (np.isnan(x) & self.missing_left[current])
+            nxt = np.where(go_left, self.left[current], self.right[current])
+            node[active] = nxt
+            active = active[~self.leaf[nxt]]
+        return self.value[node].reshape(n_rows, n_trees, -1).mean(axis=1)
+
+
+class CompiledLinear(CompiledModel):
+    """Clasificador lineal binario con probabilidad logística."""
+    def __init__(self, coef, intercept, classes, features=None, bins=None):
+        super().__init__(classes, features, bins)
+        self.coef = np.asarray(coef, dtype=np.float64).ravel()
+        self.intercept = float(np.ravel(intercept)[0])
+
+    def _proba(self, X) -> np.ndarray:
+        z = X @ self.coef + self.intercept
+        p = 1.0 / (1.0 + np.exp(-np.clip(z, -700, 700)))
+        return np.column_stack([1.0 - p, p])
+
+
+def compile_model(model, features=None):
+    """
+    Versión compilada de `model` o None si el tipo no está soportado
+    (ver el docstring del módulo).
+    """
+    bins = None
+    if hasattr(model, "estimator") and hasattr(model, "thresholds"):
+        # BinnedModel de out_of_core: se compila el estimador y se guardan los cortes
+        model, bins, features = model.estimator, model.thresholds, model.features
+    classes = getattr(model, "classes_", None)
+    if classes is None:
+        return None
+    if hasattr(model, "tree_"):
+        return CompiledForest([model.tree_], classes, features, bins)
+    trees = getattr(model, "estimators_", None)
+    if isinstance(trees, list) and trees and all(hasattr(t, "tree_") for t in trees) \
+            and type(model).__name__ in ("RandomForestClassifier", "ExtraTreesClassifier"):
+        return CompiledForest([t.tree_ for t in trees], classes, features, bins)
+    coef = getattr(model, "coef_", None)
+    if coef is not None and len(classes) == 2 and hasattr(model, "predict_proba") \
+            and getattr(model, "loss", "log_loss") == "log_loss":
+        return CompiledLinear(coef, model.intercept_, classes, features, bins)
+    return None
+
+
+class ModelRegistry:
+    """
+    Versiones de modelos en disco (ver el docstring del módulo).
+
+    Parámetros:
+    - root (str): Carpeta del registro.
+    """
+    def __init__(self, root: str):
+        self.root = root
+
+    def _dir(self, version):
+        return os.path.join(self.root, version)
+
+    def version_names(self) -> list:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root)
+                      if d.startswith("v") and d[1:].isdigit()
+                      and os.path.exists(os.path.join(self.root, d, "meta.json")))
+
+    def resolve(self, version=None) -> str:
+        """Nombre de la versión pedida (None o "latest" = la última)."""
+        names = self.version_names()
+        if not names:
+            raise FileNotFoundError(f"No hay modelos registrados en {self.root}")
+        if version in (None, "latest"):
+            return names[-1]
+        version = str(version)
+        if version.isdigit():
+            version = f"v{int(version):04d}"
+        if version not in names:
+            raise FileNotFoundError(f"Versión {version} no encontrada en {self.root}")
+        return version
+
+    def register(self, model, features, scorer=None, params=None, score=None, metrics=None,
+                 **info) -> str:
+        """
+        Guarda una versión nueva y devuelve su nombre. `info` se agrega tal
+        cual a meta.json (p.ej. tickers, fechas, corte de train/test).
+        """
+        names = self.version_names()
+        version = f"v{int(names[-1][1:]) + 1 if names else 1:04d}"
+        tmp = self._dir(f".{version}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        with open(os.path.join(tmp, "model.pkl"), "wb") as f:
+            pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+        compiled = None
+        if scorer is not None:
+            compiled = compile_model(model, scorer.features)
+            original = scorer.model
+            scorer.model = compiled if compiled is not None else model
+            try:
+                scorer.save(os.path.join(tmp, "scorer.pkl"))
+            finally:
+                scorer.model = original
+        meta = {
+            "version": version,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "model_type": type(model).__name__,
+            "features": list(features),
+            "params": params or {},
+            "cv_score": score,
+            "metrics": metrics or {},
+            "scorer": scorer is not None,
+            "compiled": compiled is not None,
+            **info,
+        }
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2, default=str)
+        os.replace(tmp, self._dir(version))
+        return version
+
+    def meta(self, version=None) -> dict:
+        with open(os.path.join(self._dir(self.resolve(version)), "meta.json")) as f:
+            return json.load(f)
+
+    def versions(self):
+        """Tabla (DataFrame) con una fila por versión."""
+        import pandas as pd
+
+        rows = []
+        for name in self.version_names():
+            m = self.meta(name)
+            rows.append({"version": name, "created": m["created"], "model_type": m["model_type"],
+                         "cv_score": m["cv_score"], **{f"metric_{k}": v for k, v in m["metrics"].items()},
+                         "n_features": len(m["features"]), "compiled": m["compiled"]})
+        return pd.DataFrame(rows)
+
+    def load_model(self, version=None):
+        """El estimador original (importa scikit-learn)."""
+        with open(os.path.join(self._dir(self.resolve(version)), "model.pkl"), "rb") as f:
+            return pickle.load(f)
+
+    def load_scorer(self, version=None):
+        """`BatchScorer` de la versión (con el modelo compilado si lo hay)."""
+        from scoring import BatchScorer
+
+        path = os.path.join(self._dir(self.resolve(version)), "scorer.pkl")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"La versión {self.resolve(version)} no tiene scorer")
+        return BatchScorer.load(path)
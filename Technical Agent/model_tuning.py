@@ -1,35 +1,177 @@
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import GridSearchCV, TimeSeriesSplit
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import (GridSearchCV, HalvingGridSearchCV, HalvingRandomSearchCV,
+                                     ParameterGrid, RandomizedSearchCV,
+                                     TimeSeriesSplit)
+
+import profiling
+
+STRATEGIES = ("grid", "random", "halving", "halving_random", "racing")
+
+
+def _fit_and_score(estimator, params, X, y, train, test):
+    model = clone(estimator).set_params(**params)
+    model.fit(X.iloc[train], y.iloc[train])
+    return accuracy_score(y.iloc[test], model.predict(X.iloc[test]))
+
 
 class ModelTuner:
     """
-    Clase que encapsula la búsqueda de hiperparámetros con GridSearchCV
+    Clase que encapsula la búsqueda de hiperparámetros (RandomForest)
     usando TimeSeriesSplit para datos secuenciales.
+
+    Estrategias (`strategy`):
+    - "grid": GridSearchCV exhaustivo sobre `param_grid`.
+    - "random": RandomizedSearchCV con `n_iter` combinaciones de la grilla.
+    - "halving" / "halving_random": successive halving; todas las
+      combinaciones (o `n_iter` al azar) arrancan con pocos recursos y
+      sólo el mejor 1/3 pasa a la ronda siguiente con el triple. El recurso
+      es `resource`: "n_samples" (filas de entrenamiento) o "n_estimators"
+      (árboles; se saca de la grilla y su máximo es el tope).
+    - "racing": evalúa todas las combinaciones fold por fold y descarta
+      las que quedan más de `tolerance` por debajo del mejor promedio
+      parcial, así las claramente perdedoras no llegan a los folds grandes.
+
+    Tras `tune`, `self.report` resume la corrida (tiempo total, fits y mejor
+    score) y `self.trace` lista (segundos, mejor score hasta ahí) por ronda.
     """
-    def __init__(self, param_grid, cv_splits=5):
+    def __init__(self, param_grid, cv_splits=5, strategy="grid", n_iter=10,
+                 resource="n_samples", tolerance=0.01, random_state=42):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"strategy desconocida: {strategy!r} (usar una de {STRATEGIES})")
+        if resource not in ("n_samples", "n_estimators"):
+            raise ValueError(f"resource desconocido: {resource!r} (usar 'n_samples' o 'n_estimators')")
         self.param_grid = param_grid
         self.cv_splits = cv_splits
+        self.strategy = strategy
+        self.n_iter = n_iter
+        self.resource = resource
+        self.tolerance = tolerance
+        self.random_state = random_state
         self.best_model = None
         self.best_params = None
         self.best_score = None
+        self.report = None
+        self.trace = []
+
+    def _estimator(self):
+        return RandomForestClassifier(random_state=self.random_state)
+
+    def _search(self, tscv):
+        common = dict(cv=tscv, scoring='accuracy', n_jobs=-1, verbose=2)
+        if self.strategy == "grid":
+            return GridSearchCV(estimator=self._estimator(), param_grid=self.param_grid, **common)
+        if self.strategy == "random":
+            return RandomizedSearchCV(self._estimator(), self.param_grid, n_iter=self.n_iter,
+                                      random_state=self.random_state, **common)
+
+        # "exhaust": la última ronda usa el recurso completo, así el score
+        # final es comparable con el de la grilla
+        grid = self.param_grid
+        halving = dict(factor=3, min_resources="exhaust", random_state=self.random_state, **common)
+        if self.resource == "n_estimators":
+            grid = {k: v for k, v in grid.items() if k != "n_estimators"}
+            halving.update(resource="n_estimators",
+                           max_resources=max(self.param_grid.get("n_estimators", [100])))
+        if self.strategy == "halving":
+            return HalvingGridSearchCV(self._estimator(), grid, **halving)
+        return HalvingRandomSearchCV(self._estimator(), grid, n_candidates=self.n_iter, **halving)
+
+    def _race(self, X_train, y_train, tscv, t0):
+        """
+        Evalúa las combinaciones fold por fold (de menor a mayor entrenamiento)
+        y descarta las que quedan más de `tolerance` por debajo del mejor
+        promedio parcial. Devuelve (mejores parámetros, su score, fits).
+        """
+        candidates = list(ParameterGrid(self.param_grid))
+        estimator = self._estimator()
+        scores = [[] for _ in candidates]
+        alive = list(range(len(candidates)))
+        splits = list(tscv.split(X_train))
+        n_fits = 0
+        for k, (train, test) in enumerate(splits):
+            with profiling.span("racing_fold", "model", fold=k, candidates=len(alive),
+                                rows=len(train) * len(alive)):
+                fold_scores = Parallel(n_jobs=-1)(
+                    delayed(_fit_and_score)(estimator, candidates[i], X_train, y_train, train, test)
+                    for i in alive
+                )
+            n_fits += len(alive)
+            for i, score in zip(alive, fold_scores):
+                scores[i].append(score)
+            means = {i: np.mean(scores[i]) for i in alive}
+            best = max(means.values())
+            self.trace.append((time.perf_counter() - t0, best))
+            if k < len(splits) - 1:
+                alive = [i for i in alive if means[i] >= best - self.tolerance]
+            print(f"[racing] fold {k + 1}/{len(splits)}: mejor {best:.4f}, "
+                  f"siguen {len(alive)} de {len(candidates)}")
+        best_i = max(alive, key=lambda i: means[i])
+        return candidates[best_i], means[best_i], n_fits
 
     def tune(self, X_train, y_train):
         """
-        Aplica GridSearchCV (RandomForest) con validación temporal.
+        Busca hiperparámetros con la estrategia configurada y validación temporal.
         Retorna: (best_model, best_params, best_score)
         """
+        with profiling.span("tune", "model", strategy=self.strategy, rows=len(X_train)):
+            return self._tune(X_train, y_train)
+
+    def _tune(self, X_train, y_train):
         tscv = TimeSeriesSplit(n_splits=self.cv_splits)
-        grid_search = GridSearchCV(
-            estimator=RandomForestClassifier(random_state=42),
-            param_grid=self.param_grid,
-            cv=tscv,
-            scoring='accuracy',
-            n_jobs=-1,
-            verbose=2
-        )
-        grid_search.fit(X_train, y_train)
-
-        self.best_model  = grid_search.best_estimator_
-        self.best_params = grid_search.best_params_
-        self.best_score  = grid_search.best_score_
+        self.trace = []
+        t0 = time.perf_counter()
+        if self.strategy == "racing":
+            self.best_params, self.best_score, n_fits = self._race(X_train, y_train, tscv, t0)
+            self.best_model = self._estimator().set_params(**self.best_params)
+            with profiling.span("fit", "model", rows=len(X_train)):
+                self.best_model.fit(X_train, y_train)
+        else:
+            search = self._search(tscv)
+            search.fit(X_train, y_train)
+            self.best_model  = search.best_estimator_
+            self.best_params = search.best_params_
+            self.best_score  = search.best_score_
+            results = pd.DataFrame(search.cv_results_)
+            n_fits = len(results) * self.cv_splits
+            # Successive halving: mejor score al cerrar cada ronda (tiempo aproximado
+            # por la suma de fits de esa ronda, repartida entre las rondas)
+            if "iter" in results:
+                cost = (results["mean_fit_time"] + results["mean_score_time"]).groupby(results["iter"]).sum()
+                elapsed = time.perf_counter() - t0
+                cumulative = cost.cumsum() / cost.sum() * elapsed
+                best = results.groupby("iter")["mean_test_score"].max().cummax()
+                self.trace = list(zip(cumulative.tolist(), best.tolist()))
+            else:
+                self.trace = [(time.perf_counter() - t0, self.best_score)]
+
+        self.report = {
+            "strategy": self.strategy,
+            "wall_time": time.perf_counter() - t0,
+            "n_fits": n_fits,
+            "best_score": self.best_score,
+            "best_params": self.best_params,
+        }
+        print(f"[{self.strategy}] {self.report['wall_time']:.1f}s, {n_fits} fits, "
+              f"mejor score {self.best_score:.4f}")
         return self.best_model, self.best_params, self.best_score
+
+
+def compare_strategies(param_grid, X_train, y_train, strategies=STRATEGIES, **kwargs) -> pd.DataFrame:
+    """
+    Corre `ModelTuner` con cada estrategia sobre los mismos datos y devuelve
+    una tabla con tiempo total, cantidad de fits y mejor score de cada una.
+    """
+    rows = []
+    for strategy in strategies:
+        tuner = ModelTuner(param_grid, strategy=strategy, **kwargs)
+        tuner.tune(X_train, y_train)
+        rows.append(tuner.report)
+    return pd.DataFrame(rows).set_index("strategy")
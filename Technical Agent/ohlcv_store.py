@@ -0,0 +1,195 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from columnar_store import ColumnarStore
+from data_sources import normalize_bars
+
+
+def _merge_ranges(ranges):
+    """
+    Une rangos [start, end) que se solapan o se tocan.
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def missing_ranges(covered, start, end):
+    """
+    Devuelve los sub-rangos de [start, end) que no están en `covered`
+    (lista de rangos [start, end) ya unidos y ordenados).
+    """
+    gaps = []
+    cursor = start
+    for c_start, c_end in covered:
+        if c_end <= cursor:
+            continue
+        if c_start >= end:
+            break
+        if c_start > cursor:
+            gaps.append((cursor, min(c_start, end)))
+        cursor = max(cursor, c_end)
+        if cursor >= end:
+            break
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+class OHLCVStore:
+    """
+    Almacén local de barras OHLCV en Parquet, particionado por intervalo y ticker:
+
+        {root}/interval={interval}/ticker={ticker}/bars.parquet
+        {root}/interval={interval}/ticker={ticker}/coverage.json
+
+    `coverage.json` guarda los rangos [start, end) ya consultados a la fuente
+    (aunque no tuvieran barras, p.ej. fines de semana), de modo que `load()`
+    sólo descarga los huecos. Los rangos que llegan hasta hoy no se marcan
+    como cubiertos más allá del día actual: la barra de hoy puede cambiar.
+    Con `max_span` (p.ej. pd.Timedelta(days=7) para barras de 1 minuto)
+    cada hueco se pide y se guarda en tramos de ese largo como mucho.
+    """
+    def __init__(self, root, source=None, max_span=None):
+        self.root = root
+        self.source = source
+        self.max_span = pd.Timedelta(max_span) if max_span is not None else None
+
+    def _partition(self, ticker, interval):
+        return os.path.join(self.root, f"interval={interval}", f"ticker={ticker}")
+
+    def coverage(self, ticker, interval="1d"):
+        path = os.path.join(self._partition(ticker, interval), "coverage.json")
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            ranges = json.load(f)["ranges"]
+        return [[pd.Timestamp(s), pd.Timestamp(e)] for s, e in ranges]
+
+    def missing_ranges(self, ticker, start, end, interval="1d"):
+        return missing_ranges(
+            self.coverage(ticker, interval), pd.Timestamp(start), pd.Timestamp(end)
+        )
+
+    def read(self, ticker, start=None, end=None, interval="1d") -> pd.DataFrame:
+        """
+        Lee del disco las barras del rango [start, end) sin tocar la fuente.
+        """
+        path = os.path.join(self._partition(ticker, interval), "bars.parquet")
+        if not os.path.exists(path):
+            return normalize_bars(None)
+        filters = []
+        if start is not None:
+            filters.append(("Date", ">=", pd.Timestamp(start)))
+        if end is not None:
+            filters.append(("Date", "<", pd.Timestamp(end)))
+        return pd.read_parquet(path, filters=filters or None).reset_index(drop=True)
+
+    def write(self, ticker, bars, start, end, interval="1d"):
+        """
+        Fusiona `bars` con lo ya guardado (las barras nuevas pisan a las viejas
+        en la misma fecha) y marca [start, end) como cubierto.
+        """
+        partition = self._partition(ticker, interval)
+        os.makedirs(partition, exist_ok=True)
+
+        bars = normalize_bars(bars)
+        if not bars.empty:
+            existing = self.read(ticker, interval=interval)
+            if not existing.empty:
+                bars = pd.concat([existing, bars], ignore_index=True)
+                bars = bars.drop_duplicates("Date", keep="last").sort_values("Date")
+            path = os.path.join(partition, "bars.parquet")
+            tmp_path = path + ".tmp"
+            bars.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        self._mark_covered(ticker, start, end, interval)
+
+    def _mark_covered(self, ticker, start, end, interval):
+        partition = self._partition(ticker, interval)
+        os.makedirs(partition, exist_ok=True)
+        start = pd.Timestamp(start)
+        end = min(pd.Timestamp(end), pd.Timestamp.today().normalize())
+        if start < end:
+            ranges = _merge_ranges(self.coverage(ticker, interval) + [[start, end]])
+            path = os.path.join(partition, "coverage.json")
+            with open(path + ".tmp", "w") as f:
+                json.dump({"ranges": [[s.isoformat(), e.isoformat()] for s, e in ranges]}, f)
+            os.replace(path + ".tmp", path)
+
+    def sync(self, ticker, start, end, interval="1d", source=None) -> int:
+        """
+        Descarga de la fuente (`source` o, si no se pasa, `self.source`) sólo
+        los huecos de [start, end) que aún no están en disco y los guarda,
+        sin leer el rango. Devuelve la cantidad de barras descargadas.
+        """
+        source = source if source is not None else self.source
+        gaps = self.missing_ranges(ticker, start, end, interval)
+        if gaps and source is None:
+            raise ValueError(f"Faltan datos de {ticker} en el almacén y no hay fuente configurada.")
+        fetched = 0
+        for gap_start, gap_end in gaps:
+            step = self.max_span or (gap_end - gap_start)
+            while gap_start < gap_end:
+                piece_end = min(gap_start + step, gap_end)
+                with profiling.span("fetch", "load", ticker=ticker, start=str(gap_start),
+                                    end=str(piece_end)) as sp:
+                    bars = source.fetch(ticker, gap_start, piece_end, interval)
+                    sp.set(rows=len(bars))
+                self.write(ticker, bars, gap_start, piece_end, interval)
+                fetched += len(bars)
+                gap_start = piece_end
+        return fetched
+
+    def load(self, ticker, start, end, interval="1d", source=None) -> pd.DataFrame:
+        """
+        Como `sync`, y devuelve el rango completo leído del almacén.
+        """
+        self.sync(ticker, start, end, interval, source)
+        return self.read(ticker, start, end, interval)
+
+
+class MmapOHLCVStore(OHLCVStore):
+    """
+    `OHLCVStore` para historias que no entran en memoria (barras de 1
+    minuto de muchos tickers): mismas particiones y `coverage.json`, pero
+    las barras van a un `ColumnarStore` (un archivo por columna, leído con
+    memmap). Escribir un tramo nuevo sólo agrega al final, en vez de
+    reescribir el Parquet completo, y `iter_chunks` recorre la historia de
+    a bloques sin cargarla entera.
+    """
+    def __init__(self, root, source=None, max_span=None):
+        super().__init__(root, source, max_span)
+        self.columns = ColumnarStore(root)
+
+    @staticmethod
+    def _key(ticker, interval):
+        return os.path.join(f"interval={interval}", f"ticker={ticker}")
+
+    def read(self, ticker, start=None, end=None, interval="1d") -> pd.DataFrame:
+        df = self.columns.read(self._key(ticker, interval), start, end)
+        return df if len(df.columns) > 1 else normalize_bars(None)
+
+    def iter_chunks(self, ticker, chunk_rows, start=None, end=None, interval="1d"):
+        """Barras de [start, end) de a `chunk_rows` filas."""
+        return self.columns.iter_chunks(self._key(ticker, interval), chunk_rows, start, end)
+
+    def dates(self, ticker, interval="1d") -> np.ndarray:
+        """Fechas guardadas (int64 ns, memmap)."""
+        return self.columns.dates(self._key(ticker, interval))
+
+    def write(self, ticker, bars, start, end, interval="1d"):
+        bars = normalize_bars(bars)
+        if not bars.empty:
+            numeric = bars.columns.drop("Date")
+            bars[numeric] = bars[numeric].astype(np.float64)
+            self.columns.append(self._key(ticker, interval), bars)
+        self._mark_covered(ticker, start, end, interval)
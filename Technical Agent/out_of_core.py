@@ -0,0 +1,368 @@
+"""
+Entrenamiento fuera de memoria: las features se guardan en disco ya
+discretizadas (uint8) y el modelo se entrena recorriéndolas de a bloques,
+así la memoria depende del tamaño del bloque y no de cuántos tickers o
+años haya.
+
+    store = BinnedFeatureStore("data/binned")
+    store.build(lambda: engineer_chunks(), features)     # dos pasadas
+    tuner = IncrementalTuner({"alpha": [1e-5, 1e-4, 1e-3]}, cv_splits=3)
+    model, params, score = tuner.tune(store, stop=store.position("2022-12-31"))
+    acc = streaming_accuracy(model, store, start=store.position("2022-12-31"))
+
+Discretización: como en HistGradientBoosting, cada feature se parte en
+hasta 255 bins por cuantiles (calculados sobre una muestra acotada de
+toda la historia) y el bin 255 queda para los NaN. Una fila ocupa un byte
+por feature (la cuarta parte que en float32) y se lee con `np.memmap`.
+
+Los modelos son los de scikit-learn con `partial_fit` (por defecto
+`SGDClassifier` con log-loss) y reciben el rango por cuantiles de cada
+feature (bin / cantidad de bins, en [0, 1]; NaN = 0.5). `BinnedModel`
+guarda los cortes junto con el modelo, así que predice sobre las features
+crudas (float) igual que el RandomForest del pipeline en memoria.
+
+La validación respeta `TimeSeriesSplit`: mismos bloques de test (sobre el
+orden de las filas en el store, que es cronológico) y cada fold entrena
+con todo lo anterior a su bloque. Como los entrenamientos de los folds
+son prefijos del mismo recorrido, alcanza con una sola pasada: al llegar
+al comienzo del bloque de test de un fold se congela una copia del modelo
+que se evalúa sobre ese bloque mientras el original sigue aprendiendo.
+"""
+import copy
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import profiling
+
+MAX_BINS = 255
+MISSING_BIN = 255
+
+
+def bin_thresholds(values: np.ndarray, max_bins: int = MAX_BINS) -> np.ndarray:
+    """
+    Cortes de una feature (hasta `max_bins` bins) a partir de una muestra:
+    puntos medios entre valores distintos si hay pocos, si no percentiles.
+    """
+    values = values[~np.isnan(values)]
+    distinct = np.unique(values)
+    if len(distinct) <= max_bins:
+        return (distinct[:-1] + distinct[1:]) / 2
+    percentiles = np.linspace(0, 100, max_bins + 1)[1:-1]
+    return np.unique(np.percentile(values, percentiles, method="midpoint"))
+
+
+def apply_bins(X: np.ndarray, thresholds) -> np.ndarray:
+    """Matriz (filas × features) float => bins uint8 (NaN => MISSING_BIN)."""
+    X = np.asarray(X, dtype=np.float64)
+    out = np.empty(X.shape, dtype=np.uint8)
+    for j, thr in enumerate(thresholds):
+        col = X[:, j]
+        out[:, j] = np.searchsorted(thr, col, side="left")
+        out[np.isnan(col), j] = MISSING_BIN
+    return out
+
+
+def time_series_folds(n_samples: int, n_splits: int):
+    """
+    Bloques de `TimeSeriesSplit(n_splits)` como (fin del train, fin del
+    test): el fold k entrena con [0, fin del train) y evalúa el bloque
+    siguiente. Se calculan sin armar los índices.
+    """
+    n_folds = n_splits + 1
+    if n_folds > n_samples:
+        raise ValueError(f"No se pueden hacer {n_splits} folds con {n_samples} filas")
+    test_size = n_samples // n_folds
+    first = n_samples - n_splits * test_size
+    return [(start, start + test_size) for start in range(first, n_samples, test_size)]
+
+
+class BinnedFeatureStore:
+    """
+    Features discretizadas en disco, en el orden (cronológico) en que se
+    agregan:
+
+        {root}/meta.json    (features, cortes de cada feature y clases)
+        {root}/X.u8         (filas × features, uint8, fila por fila)
+        {root}/y.i1         (target, int8)
+        {root}/Date.i8      (int64, ns)
+
+    Parámetros:
+    - root (str): Carpeta del store.
+    """
+    def __init__(self, root: str):
+        self.root = root
+        self.meta = self._load_meta()
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    def _load_meta(self):
+        path = self._path("meta.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            meta = json.load(f)
+        meta["thresholds"] = [np.asarray(t, dtype=np.float64) for t in meta["thresholds"]]
+        return meta
+
+    def _save_meta(self):
+        meta = dict(self.meta, thresholds=[t.tolist() for t in self.meta["thresholds"]])
+        path = self._path("meta.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp", path)
+
+    @property
+    def features(self) -> list:
+        return list(self.meta["features"]) if self.meta else []
+
+    @property
+    def classes(self) -> np.ndarray:
+        return np.asarray(self.meta["classes"]) if self.meta else np.empty(0, dtype=int)
+
+    def rows(self) -> int:
+        if self.meta is None:
+            return 0
+        n_features = len(self.meta["features"])
+        sizes = [os.path.getsize(self._path("X.u8")) // max(n_features, 1),
+                 os.path.getsize(self._path("y.i1")),
+                 os.path.getsize(self._path("Date.i8")) // 8]
+        # Si una escritura quedó a medias, vale el archivo más corto
+        return min(sizes)
+
+    def dates(self) -> np.ndarray:
+        """Columna Date (int64 ns) en memmap, sin leerla."""
+        n = self.rows()
+        if n == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.memmap(self._path("Date.i8"), dtype=np.int64, mode="r", shape=(n,))
+
+    def position(self, date) -> int:
+        """Cantidad de filas con Date <= date (el corte train/test de `split_by_date`)."""
+        return int(np.searchsorted(self.dates(), pd.Timestamp(date).value, side="right"))
+
+    def build(self, make_chunks, features, target="target", sample_rows=200_000,
+              max_bins=MAX_BINS, random_state=0) -> int:
+        """
+        Arma el store desde cero con dos pasadas sobre los bloques:
+        `make_chunks()` devuelve un iterable de DataFrames (en orden
+        cronológico, con 'Date', `target` y las `features`). La primera
+        pasada toma una muestra uniforme de a lo sumo `sample_rows` filas de
+        toda la historia (reservoir sampling) para fijar los cortes; la
+        segunda discretiza y escribe. Devuelve la cantidad de filas.
+        """
+        features = list(features)
+        rng = np.random.default_rng(random_state)
+        sample = np.empty((0, len(features)))
+        keys = np.empty(0)
+        classes = set()
+        with profiling.span("bin_sample", "model", features=len(features)):
+            for chunk in make_chunks():
+                # Se quedan las `sample_rows` filas con menor clave aleatoria
+                sample = np.vstack([sample, chunk[features].to_numpy(dtype=np.float64)])
+                keys = np.concatenate([keys, rng.random(len(chunk))])
+                if len(keys) > sample_rows:
+                    keep = np.argpartition(keys, sample_rows)[:sample_rows]
+                    sample, keys = sample[keep], keys[keep]
+                classes.update(np.unique(chunk[target]).tolist())
+        if not classes:
+            raise ValueError("build(): los bloques no tienen filas")
+
+        os.makedirs(self.root, exist_ok=True)
+        self.meta = {
+            "features": features,
+            "target": target,
+            "thresholds": [bin_thresholds(sample[:, j], max_bins) for j in range(len(features))],
+            "classes": sorted(int(c) for c in classes),
+        }
+        for name in ("X.u8", "y.i1", "Date.i8"):
+            open(self._path(name), "wb").close()
+        self._save_meta()
+        return sum(self.append(chunk) for chunk in make_chunks())
+
+    def append(self, chunk: pd.DataFrame) -> int:
+        """Discretiza `chunk` con los cortes ya fijados y lo agrega al final."""
+        if self.meta is None:
+            raise ValueError("append() necesita un store armado con build()")
+        if chunk is None or chunk.empty:
+            return 0
+        with profiling.span("bin_append", "model", rows=len(chunk)):
+            chunk = chunk.sort_values("Date", kind="mergesort")
+            X = apply_bins(chunk[self.meta["features"]].to_numpy(dtype=np.float64),
+                           self.meta["thresholds"])
+            y = chunk[self.meta["target"]].to_numpy(dtype=np.int8)
+            dates = chunk["Date"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+            new = sorted(set(np.unique(y).tolist()) - set(self.meta["classes"]))
+            if new:
+                self.meta["classes"] = sorted(self.meta["classes"] + new)
+                self._save_meta()
+            n = self.rows()
+            for name, values, width in (("X.u8", X, X.shape[1]), ("y.i1", y, 1), ("Date.i8", dates, 8)):
+                with open(self._path(name), "ab") as f:
+                    # Descarta una cola a medias de una escritura anterior
+                    f.truncate(n * width)
+                    f.write(np.ascontiguousarray(values).tobytes())
+        return len(chunk)
+
+    def iter_batches(self, batch_rows=65_536, start=0, stop=None, cuts=()):
+        """
+        Recorre las filas [start, stop) de a `batch_rows`, sin que un bloque
+        cruce ninguna posición de `cuts`. Genera (lo, hi, X uint8, y).
+        """
+        n = self.rows()
+        stop = n if stop is None else min(stop, n)
+        if start >= stop:
+            return
+        n_features = len(self.meta["features"])
+        X_all = np.memmap(self._path("X.u8"), dtype=np.uint8, mode="r", shape=(n, n_features))
+        y_all = np.memmap(self._path("y.i1"), dtype=np.int8, mode="r", shape=(n,))
+        bounds = set(range(start, stop, batch_rows)) | {c for c in cuts if start < c < stop}
+        bounds = sorted(bounds) + [stop]
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            yield lo, hi, np.array(X_all[lo:hi]), np.array(y_all[lo:hi], dtype=np.int64)
+
+
+def _ranks(X_binned: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    """Bins => rango por cuantiles en [0, 1] (NaN => 0.5), en float32."""
+    out = X_binned.astype(np.float32) * scale
+    out[X_binned == MISSING_BIN] = 0.5
+    return out
+
+
+def _scale(thresholds) -> np.ndarray:
+    return np.array([1.0 / len(t) if len(t) else 0.0 for t in thresholds], dtype=np.float32)
+
+
+class BinnedModel:
+    """
+    Modelo entrenado sobre features discretizadas, con los cortes para
+    discretizar las features crudas al predecir (DataFrame con esas
+    columnas o matriz en ese orden).
+    """
+    def __init__(self, estimator, features, thresholds):
+        self.estimator = estimator
+        self.features = list(features)
+        self.thresholds = thresholds
+        self._scale_ = _scale(thresholds)
+
+    @property
+    def classes_(self):
+        return self.estimator.classes_
+
+    def transform(self, X) -> np.ndarray:
+        values = X[self.features].to_numpy(dtype=np.float64) if isinstance(X, pd.DataFrame) else X
+        return _ranks(apply_bins(values, self.thresholds), self._scale_)
+
+    def predict(self, X):
+        return self.estimator.predict(self.transform(X))
+
+    def predict_proba(self, X):
+        return self.estimator.predict_proba(self.transform(X))
+
+    def score(self, X, y) -> float:
+        return float(np.mean(self.predict(X) == np.asarray(y)))
+
+
+def streaming_accuracy(model: BinnedModel, store: BinnedFeatureStore, start=0, stop=None,
+                       batch_rows=65_536) -> float:
+    """Accuracy de `model` sobre las filas [start, stop) del store, de a bloques."""
+    hits = total = 0
+    for _, _, Xb, y in store.iter_batches(batch_rows, start, stop):
+        hits += int((model.estimator.predict(_ranks(Xb, model._scale_)) == y).sum())
+        total += len(y)
+    return hits / total if total else float("nan")
+
+
+class IncrementalTuner:
+    """
+    Búsqueda de hiperparámetros sobre un `BinnedFeatureStore` con modelos
+    de `partial_fit`, validación temporal equivalente a `TimeSeriesSplit`
+    y una sola pasada por los datos (ver el docstring del módulo).
+
+    Parámetros:
+    - param_grid (dict): Grilla para el estimador (como en `ModelTuner`).
+    - cv_splits (int): Folds de la validación temporal.
+    - estimator: Estimador con `partial_fit` (por defecto SGDClassifier log-loss).
+    - batch_rows (int): Filas por bloque leído del disco.
+
+    Tras `tune`, `self.report` tiene el mismo formato que en `ModelTuner` y
+    `self.cv_scores` el score de cada combinación en cada fold.
+    """
+    def __init__(self, param_grid, cv_splits=5, estimator=None, batch_rows=65_536, random_state=42):
+        if estimator is None:
+            from sklearn.linear_model import SGDClassifier
+
+            estimator = SGDClassifier(loss="log_loss", random_state=random_state)
+        if not hasattr(estimator, "partial_fit"):
+            raise ValueError(f"{type(estimator).__name__} no tiene partial_fit")
+        self.param_grid = param_grid
+        self.cv_splits = cv_splits
+        self.estimator = estimator
+        self.batch_rows = batch_rows
+        self.best_model = None
+        self.best_params = None
+        self.best_score = None
+        self.cv_scores = None
+        self.report = None
+
+    def tune(self, store: BinnedFeatureStore, start=0, stop=None):
+        """
+        Valida cada combinación sobre las filas [start, stop) del store y
+        devuelve (best_model, best_params, best_score); el mejor modelo
+        queda entrenado con todas esas filas.
+        """
+        stop = store.rows() if stop is None else min(stop, store.rows())
+        with profiling.span("tune", "model", strategy="incremental", rows=stop - start):
+            return self._tune(store, start, stop)
+
+    def _tune(self, store, start, stop):
+        from sklearn.base import clone
+        from sklearn.model_selection import ParameterGrid
+
+        t0 = time.perf_counter()
+        candidates = list(ParameterGrid(self.param_grid))
+        folds = [(start + a, start + b) for a, b in time_series_folds(stop - start, self.cv_splits)]
+        classes = store.classes
+        scale = _scale(store.meta["thresholds"])
+        models = [clone(self.estimator).set_params(**params) for params in candidates]
+        frozen = {}
+        hits = np.zeros((len(folds), len(candidates)))
+
+        cuts = [a for a, _ in folds]
+        for lo, hi, Xb, y in store.iter_batches(self.batch_rows, start, stop, cuts):
+            with profiling.span("batch", "model", candidates=len(models), rows=hi - lo):
+                X = _ranks(Xb, scale)
+                for k, (test_start, test_end) in enumerate(folds):
+                    if lo == test_start:
+                        # Fold k: modelo entrenado con todo lo anterior a su bloque de test
+                        frozen[k] = [copy.deepcopy(m) for m in models]
+                    if test_start <= lo < test_end:
+                        for i, m in enumerate(frozen[k]):
+                            hits[k, i] += (m.predict(X) == y).sum()
+                    elif lo >= test_end:
+                        frozen.pop(k, None)
+                for m in models:
+                    m.partial_fit(X, y, classes=classes)
+
+        sizes = np.array([b - a for a, b in folds], dtype=float)[:, None]
+        self.cv_scores = pd.DataFrame(hits / sizes, columns=[str(p) for p in candidates],
+                                      index=pd.RangeIndex(len(folds), name="fold"))
+        means = (hits / sizes).mean(axis=0)
+        best = int(np.argmax(means))
+        self.best_params = candidates[best]
+        self.best_score = float(means[best])
+        self.best_model = BinnedModel(models[best], store.features, store.meta["thresholds"])
+        self.report = {
+            "strategy": "incremental",
+            "wall_time": time.perf_counter() - t0,
+            "n_fits": len(candidates) * (len(folds) + 1),
+            "best_score": self.best_score,
+            "best_params": self.best_params,
+        }
+        print(f"[incremental] {self.report['wall_time']:.1f}s, {len(candidates)} combinaciones "
+              f"x {len(folds)} folds en una pasada, mejor score {self.best_score:.4f}")
+        return self.best_model, self.best_params, self.best_score
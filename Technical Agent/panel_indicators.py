@@ -0,0 +1,508 @@
+"""
+Motor vectorizado de indicadores técnicos sobre paneles 2-D (barras × tickers).
+
+Cada columna del panel es la serie de un ticker alineada a la izquierda: la
+fila t es la barra número t de ese ticker, y los tickers con menos historia
+se rellenan con NaN al final. Así las recursiones (EMA, suavizado de Wilder)
+avanzan una fila por vez para todos los tickers a la vez, y cada ticker
+arranca su calentamiento en su primera barra aunque haya salido a cotizar
+más tarde que el resto.
+
+Las fórmulas replican las de `ta` (incluidas sus particularidades: ATR y ADX
+valen 0 durante el calentamiento en lugar de NaN) para que el resultado sea
+intercambiable con `FeatureEngineer._calc_indicators_for_group`.
+
+Todo el estado que necesitan las recursiones y las ventanas móviles vive en
+un `IndicatorState` (una columna por ticker). `compute_indicators` lo recibe
+y devuelve actualizado, de modo que procesar la historia completa de una vez
+o en bloques sucesivos (hasta de una barra) da exactamente los mismos valores.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+import profiling
+
+# Parámetros por defecto de cada indicador (los mismos que usaba FeatureEngineer)
+DEFAULT_PARAMS = {
+    "rsi": {"window": 14},
+    "macd": {"window_slow": 26, "window_fast": 12, "window_sign": 9},
+    "bb": {"window": 20, "window_dev": 2},
+    "atr": {"window": 14},
+    "obv": {},
+    "adx": {"window": 14},
+    "stoch": {"window": 14, "smooth_window": 3},
+}
+
+# Columnas que produce cada indicador
+OUTPUT_COLUMNS = {
+    "rsi": ["rsi"],
+    "macd": ["macd", "macd_signal"],
+    "bb": ["bb_mavg", "bb_hband", "bb_lband"],
+    "atr": ["atr"],
+    "obv": ["obv"],
+    "adx": ["adx", "adx_pos", "adx_neg"],
+    "stoch": ["stoch_k", "stoch_d"],
+}
+INDICATOR_COLUMNS = [c for cols in OUTPUT_COLUMNS.values() for c in cols]
+
+
+def resolve_params(params=None) -> dict:
+    """Completa `params` ({indicador: {parámetro: valor}}) con los valores por defecto."""
+    params = params or {}
+    unknown = set(params) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError(f"Indicadores desconocidos: {sorted(unknown)}")
+    return {name: {**defaults, **params.get(name, {})} for name, defaults in DEFAULT_PARAMS.items()}
+
+
+# ---------------------------------------------------------------------------
+# Conversión formato largo <-> panel
+# ---------------------------------------------------------------------------
+
+def panel_layout(df: pd.DataFrame):
+    """
+    Recibe un DataFrame largo ordenado por [Ticker, Date] y devuelve
+    (rows, cols, shape, tickers): la posición (barra, ticker) de cada fila.
+    """
+    codes, tickers = pd.factorize(df["Ticker"], sort=True)
+    rows = pd.Series(codes).groupby(codes).cumcount().to_numpy()
+    shape = (int(rows.max()) + 1 if len(rows) else 0, len(tickers))
+    return rows, codes, shape, tickers
+
+
+def to_panel(values, rows, cols, shape) -> np.ndarray:
+    panel = np.full(shape, np.nan)
+    panel[rows, cols] = values
+    return panel
+
+
+# ---------------------------------------------------------------------------
+# Estado
+# ---------------------------------------------------------------------------
+
+# Campos comunes a todos los indicadores: barras vistas y la última barra
+COMMON_FIELDS = ("n_bars", "last_date", "prev_high", "prev_low", "prev_close")
+
+
+def _state_fields(name, p):
+    """
+    Campos de estado de un indicador: {campo: (filas, valor inicial)}, con
+    filas=None para vectores (uno por ticker) o el largo del buffer.
+    """
+    nan = np.nan
+    if name == "rsi":
+        return {"up": (None, nan), "up_n": (None, 0.0), "dn": (None, nan), "dn_n": (None, 0.0)}
+    if name == "macd":
+        return {"fast": (None, nan), "fast_n": (None, 0.0), "slow": (None, nan),
+                "slow_n": (None, 0.0), "sig": (None, nan), "sig_n": (None, 0.0)}
+    if name == "bb":
+        return {"buf_close": (p["window"] - 1, nan)}
+    if name == "atr":
+        return {"atr": (None, 0.0)}
+    if name == "obv":
+        return {"obv": (None, 0.0)}
+    if name == "adx":
+        return {"trs": (None, 0.0), "dip": (None, 0.0), "din": (None, 0.0), "adx": (None, 0.0)}
+    if name == "stoch":
+        return {"buf_high": (p["window"] - 1, nan), "buf_low": (p["window"] - 1, nan),
+                "buf_k": (p["smooth_window"] - 1, nan)}
+    raise ValueError(f"Indicador desconocido: {name!r}")
+
+
+class IndicatorState:
+    """
+    Estado compacto de los indicadores, una columna por ticker: acumuladores
+    EMA (RSI, MACD y señal), suavizados de Wilder (ATR, ADX), total de OBV,
+    la última barra vista y las últimas filas de High/Low/Close y %K que
+    necesitan Bollinger y el Estocástico. Los campos de cada indicador se
+    guardan como "{indicador}.{campo}" en `arrays`, junto a los comunes.
+    `last_date` (fecha de la última barra, en ns) no lo usa el motor: lo
+    mantiene quien le pasa las barras para rechazar datos repetidos o fuera
+    de orden.
+
+    Se serializa con `save()` / `load()` (un .npz) para retomar el cálculo
+    entre corridas sin reprocesar la historia.
+    """
+
+    def __init__(self, tickers, arrays, params):
+        self.tickers = list(tickers)
+        self.arrays = arrays
+        # {indicador: parámetros} de los indicadores que cubre este estado
+        self.params = params
+
+    @classmethod
+    def empty(cls, tickers, params=None, names=None):
+        n = len(tickers)
+        params = resolve_params(params)
+        names = list(OUTPUT_COLUMNS) if names is None else list(names)
+        arrays = {
+            "n_bars": np.zeros(n),
+            **{name: np.full(n, np.nan) for name in COMMON_FIELDS if name != "n_bars"},
+        }
+        for name in names:
+            for field, (rows, value) in _state_fields(name, params[name]).items():
+                shape = n if rows is None else (rows, n)
+                arrays[f"{name}.{field}"] = np.full(shape, value)
+        return cls(tickers, arrays, {name: params[name] for name in names})
+
+    def for_indicators(self, names):
+        """Estado reducido a los campos comunes y a los de `names`."""
+        keep = [k for k in self.arrays if k in COMMON_FIELDS or k.split(".")[0] in names]
+        return IndicatorState(self.tickers, {k: self.arrays[k] for k in keep},
+                              {n: self.params[n] for n in names})
+
+    @classmethod
+    def combine(cls, states):
+        """Une estados de los mismos tickers que cubren indicadores distintos."""
+        arrays, params = {}, {}
+        for st in states:
+            arrays.update(st.arrays)
+            params.update(st.params)
+        return cls(states[0].tickers, arrays, params)
+
+    @classmethod
+    def concat(cls, states):
+        """Une estados de los mismos indicadores para tickers distintos."""
+        arrays = {k: np.concatenate([st.arrays[k] for st in states], axis=-1)
+                  for k in states[0].arrays}
+        tickers = [t for st in states for t in st.tickers]
+        return cls(tickers, arrays, states[0].params)
+
+    def select(self, tickers):
+        """
+        Devuelve el estado de `tickers` en ese orden; los que no estaban
+        arrancan con estado vacío.
+        """
+        fresh = IndicatorState.empty(tickers, self.params, self.params)
+        pos = {t: i for i, t in enumerate(self.tickers)}
+        src = np.array([pos.get(t, -1) for t in tickers], dtype=int)
+        known = src >= 0
+        for name, values in fresh.arrays.items():
+            values[..., known] = self.arrays[name][..., src[known]]
+        return fresh
+
+    def update(self, other):
+        """Incorpora (o reemplaza) las columnas de `other`."""
+        if not self.tickers:
+            self.params = other.params
+        merged = self.select(list(dict.fromkeys(self.tickers + other.tickers)))
+        pos = {t: i for i, t in enumerate(merged.tickers)}
+        dst = np.array([pos[t] for t in other.tickers], dtype=int)
+        for name, values in merged.arrays.items():
+            values[..., dst] = other.arrays[name]
+        self.tickers, self.arrays = merged.tickers, merged.arrays
+
+    def save(self, path):
+        np.savez(path, tickers=np.array(self.tickers, dtype=str),
+                 params=np.array(json.dumps(self.params)), **self.arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files if name not in ("tickers", "params")}
+            return cls(data["tickers"].tolist(), arrays, json.loads(str(data["params"])))
+
+
+# ---------------------------------------------------------------------------
+# Primitivas por columnas
+# ---------------------------------------------------------------------------
+
+def _prev(x, first):
+    """Fila anterior de cada barra; la primera toma `first` (última barra previa)."""
+    out = np.empty_like(x)
+    if len(x):
+        out[0] = first
+        out[1:] = x[:-1]
+    return out
+
+
+def _with_buffer(buffer, x, size):
+    """Antepone a `x` las últimas `size` filas ya vistas."""
+    return np.vstack([buffer[buffer.shape[0] - size:], x])
+
+
+def _tail(buffer, x, n_valid, size):
+    """Últimas `size` filas de cada columna tras sumar las `n_valid` barras nuevas."""
+    if size == 0:
+        return buffer[:0]
+    full = _with_buffer(buffer, x, size)
+    idx = n_valid[None, :] + np.arange(size)[:, None]
+    return np.take_along_axis(full, idx, axis=0)
+
+
+def _last(x, n_valid, previous):
+    """Último valor válido de cada columna (o `previous` si no hubo barras)."""
+    idx = np.maximum(n_valid - 1, 0)
+    last = np.take_along_axis(x, idx[None, :], axis=0)[0] if len(x) else previous
+    return np.where(n_valid > 0, last, previous)
+
+
+def _rolling(x, window, reducer):
+    """
+    Aplica `reducer` (np.add, np.minimum, np.maximum) sobre ventanas de
+    `window` filas. Las ventanas incompletas quedan en NaN y cualquier NaN
+    dentro de la ventana se propaga, como `rolling(min_periods=window)`.
+    El orden de acumulación es fijo, así el valor de una ventana no depende
+    del tamaño del panel ni de cómo se haya partido la historia en bloques.
+    """
+    out = np.full_like(x, np.nan)
+    n = x.shape[0] - window + 1
+    if n <= 0:
+        return out
+    acc = x[window - 1:window - 1 + n].copy()
+    for k in range(1, window):
+        reducer(acc, x[window - 1 - k:window - 1 - k + n], out=acc)
+    out[window - 1:] = acc
+    return out
+
+
+def rolling_mean(x, window):
+    return _rolling(x, window, np.add) / window
+
+
+def rolling_std(x, window):
+    """Desvío estándar poblacional (ddof=0) en dos pasadas."""
+    mean = rolling_mean(x, window)
+    n = x.shape[0] - window + 1
+    out = np.full_like(x, np.nan)
+    if n <= 0:
+        return out
+    m = mean[window - 1:]
+    acc = (x[window - 1:window - 1 + n] - m) ** 2
+    for k in range(1, window):
+        acc += (x[window - 1 - k:window - 1 - k + n] - m) ** 2
+    out[window - 1:] = np.sqrt(acc / window)
+    return out
+
+
+def ewm_mean(x, alpha, min_periods, weighted=None, nobs=None):
+    """
+    Réplica por columnas de `Series.ewm(alpha=alpha, adjust=False,
+    min_periods=min_periods).mean()`: cada columna arranca en su primera
+    observación no-NaN y sólo emite valores desde la observación número
+    `min_periods`. Devuelve (salida, weighted, nobs) para continuar luego.
+    """
+    T, N = x.shape
+    out = np.full((T, N), np.nan)
+    old_wt = 1.0 - alpha
+    denom = old_wt + alpha
+    weighted = np.full(N, np.nan) if weighted is None else weighted.copy()
+    nobs = np.zeros(N) if nobs is None else nobs.copy()
+    with np.errstate(invalid="ignore"):
+        for t in range(T):
+            cur = x[t]
+            obs = cur == cur
+            nobs += obs
+            started = weighted == weighted
+            step = started & obs & (weighted != cur)
+            weighted = np.where(step, (old_wt * weighted + alpha * cur) / denom, weighted)
+            weighted = np.where(~started & obs, cur, weighted)
+            out[t] = np.where(nobs >= min_periods, weighted, np.nan)
+    return out, weighted, nobs
+
+
+# ---------------------------------------------------------------------------
+# Indicadores
+#
+# Cada función recibe el contexto del bloque `c` (barras, barra previa,
+# máscara de barras válidas y número de barra `t0` de la primera fila), el
+# estado `s` (dict que actualiza in situ) y sus parámetros, y devuelve una
+# tupla con sus columnas en el orden de OUTPUT_COLUMNS.
+# ---------------------------------------------------------------------------
+
+def _rsi(c, s, window):
+    close = c["close"]
+    diff = close - c["prev_close"]
+    with np.errstate(invalid="ignore"):
+        up = np.where(diff > 0, diff, 0.0)
+        down = np.where(diff < 0, -diff, 0.0)
+    up[~c["valid"]] = np.nan
+    down[~c["valid"]] = np.nan
+    emaup, s["rsi.up"], s["rsi.up_n"] = ewm_mean(up, 1.0 / window, window, s["rsi.up"], s["rsi.up_n"])
+    emadn, s["rsi.dn"], s["rsi.dn_n"] = ewm_mean(down, 1.0 / window, window, s["rsi.dn"], s["rsi.dn_n"])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (np.where(emadn == 0, 100.0, 100 - (100 / (1 + emaup / emadn))),)
+
+
+def _macd(c, s, window_slow, window_fast, window_sign):
+    close = c["close"]
+    fast, s["macd.fast"], s["macd.fast_n"] = ewm_mean(
+        close, 2.0 / (window_fast + 1), window_fast, s["macd.fast"], s["macd.fast_n"])
+    slow, s["macd.slow"], s["macd.slow_n"] = ewm_mean(
+        close, 2.0 / (window_slow + 1), window_slow, s["macd.slow"], s["macd.slow_n"])
+    line = fast - slow
+    # La EMA devuelve el último valor en las filas de relleno: no son barras
+    line[~c["valid"]] = np.nan
+    signal, s["macd.sig"], s["macd.sig_n"] = ewm_mean(
+        line, 2.0 / (window_sign + 1), window_sign, s["macd.sig"], s["macd.sig_n"])
+    return line, signal
+
+
+def _bollinger(c, s, window, window_dev):
+    full = _with_buffer(s["bb.buf_close"], c["close"], window - 1)
+    s["bb.buf_close"] = _tail(s["bb.buf_close"], c["close"], c["n_valid"], window - 1)
+    mavg = rolling_mean(full, window)[window - 1:]
+    mstd = rolling_std(full, window)[window - 1:]
+    return mavg, mavg + window_dev * mstd, mavg - window_dev * mstd
+
+
+def true_range(high, low, prev_close):
+    tr = np.fmax(high - low, np.abs(high - prev_close))
+    return np.fmax(tr, np.abs(low - prev_close))
+
+
+def _atr(c, s, window):
+    """
+    Durante las primeras `window` barras `s["atr.atr"]` acumula la suma del
+    rango verdadero; en la barra window-1 pasa a ser su media y de ahí en
+    más sigue el suavizado de Wilder.
+    """
+    tr = c["true_range"]
+    out = np.zeros_like(tr)
+    cur = s["atr.atr"]
+    w = window
+    for r in range(tr.shape[0]):
+        t = c["t0"] + r
+        x = tr[r]
+        new = np.where(t == 0, x, cur + x)
+        new = np.where(t == w - 1, (cur + x) / w, new)
+        new = np.where(t >= w, (cur * (w - 1) + x) / float(w), new)
+        out[r] = np.where(t >= w - 1, new, 0.0)
+        cur = np.where(c["valid"][r], new, cur)
+    s["atr.atr"] = cur
+    return (out,)
+
+
+def _obv(c, s):
+    with np.errstate(invalid="ignore"):
+        signed = np.where(c["close"] < c["prev_close"], -c["volume"], c["volume"])
+    signed = np.where(c["valid"], signed, 0.0)
+    out = np.cumsum(np.vstack([s["obv.obv"], signed]), axis=0)[1:]
+    # Copia: la salida se enmascara con NaN en las celdas de relleno
+    s["obv.obv"] = out[-1].copy() if len(out) else s["obv.obv"]
+    return (out,)
+
+
+def _adx(c, s, window):
+    """
+    Devuelve (adx, adx_pos, adx_neg) con la misma indexación que
+    `ta.trend.ADXIndicator`: +DI/-DI desde la barra window+1 y ADX desde la
+    barra 2*window-1, en 0 antes de eso. `ta` usa max(High, Close previo) -
+    min(Low, Close previo), que es el rango verdadero (con High >= Low).
+    """
+    w = window
+    high, low = c["high"], c["low"]
+    dm = c["true_range"]
+    diff_up = high - c["prev_high"]
+    diff_down = c["prev_low"] - low
+    with np.errstate(invalid="ignore"):
+        pos = np.where((diff_up > diff_down) & (diff_up > 0), diff_up, 0.0)
+        neg = np.where((diff_down > diff_up) & (diff_down > 0), diff_down, 0.0)
+
+    adx_out = np.zeros_like(dm)
+    pos_out = np.zeros_like(dm)
+    neg_out = np.zeros_like(dm)
+    trs, dip, din, adx = s["adx.trs"], s["adx.dip"], s["adx.din"], s["adx.adx"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for r in range(dm.shape[0]):
+            t = c["t0"] + r
+            v = c["valid"][r] & (t >= 1)
+            # Suma inicial (barras 1..w) y luego suavizado de Wilder
+            first, smooth = t == 1, t > w
+            new_trs = np.where(first, dm[r], np.where(smooth, trs - (trs / float(w)), trs) + dm[r])
+            new_dip = np.where(first, pos[r], np.where(smooth, dip - (dip / float(w)), dip) + pos[r])
+            new_din = np.where(first, neg[r], np.where(smooth, din - (din / float(w)), din) + neg[r])
+
+            dip_r = np.where(new_trs != 0, 100 * (new_dip / new_trs), 0.0)
+            din_r = np.where(new_trs != 0, 100 * (new_din / new_trs), 0.0)
+            total = dip_r + din_r
+            dx = np.where(total != 0, 100 * np.abs((dip_r - din_r) / total), 0.0)
+            pos_out[r] = np.where(smooth, dip_r, 0.0)
+            neg_out[r] = np.where(smooth, din_r, 0.0)
+
+            # ADX: suma de DX en las barras w..2w-1, su media en 2w-1, luego Wilder
+            new_adx = np.where(t == w, dx, adx + dx)
+            new_adx = np.where(t == 2 * w - 1, (adx + dx) / w, new_adx)
+            new_adx = np.where(t >= 2 * w, ((adx * (w - 1)) + dx) / float(w), new_adx)
+            adx_out[r] = np.where(t >= 2 * w - 1, new_adx, 0.0)
+
+            trs = np.where(v, new_trs, trs)
+            dip = np.where(v, new_dip, dip)
+            din = np.where(v, new_din, din)
+            adx = np.where(v & (t >= w), new_adx, adx)
+    s["adx.trs"], s["adx.dip"], s["adx.din"], s["adx.adx"] = trs, dip, din, adx
+    return adx_out, pos_out, neg_out
+
+
+def _stochastic(c, s, window, smooth_window):
+    n_valid = c["n_valid"]
+    low = _with_buffer(s["stoch.buf_low"], c["low"], window - 1)
+    high = _with_buffer(s["stoch.buf_high"], c["high"], window - 1)
+    s["stoch.buf_low"] = _tail(s["stoch.buf_low"], c["low"], n_valid, window - 1)
+    s["stoch.buf_high"] = _tail(s["stoch.buf_high"], c["high"], n_valid, window - 1)
+    smin = _rolling(low, window, np.minimum)[window - 1:]
+    smax = _rolling(high, window, np.maximum)[window - 1:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        k = 100 * (c["close"] - smin) / (smax - smin)
+    full_k = _with_buffer(s["stoch.buf_k"], k, smooth_window - 1)
+    s["stoch.buf_k"] = _tail(s["stoch.buf_k"], k, n_valid, smooth_window - 1)
+    return k, rolling_mean(full_k, smooth_window)[smooth_window - 1:]
+
+
+_COMPUTE = {
+    "rsi": _rsi, "macd": _macd, "bb": _bollinger, "atr": _atr,
+    "obv": _obv, "adx": _adx, "stoch": _stochastic,
+}
+
+
+def compute_indicators(high, low, close, volume, state=None, params=None, names=None):
+    """
+    Calcula los indicadores `names` (por defecto todos los de
+    `FeatureEngineer`) sobre paneles (barras × tickers) y devuelve
+    ({columna: panel}, estado_final).
+
+    `state` es el `IndicatorState` de las mismas columnas tras la última
+    barra ya procesada (None = tickers sin historia); si se pasa, sus
+    parámetros mandan. Las celdas de relleno (fuera de la historia de cada
+    ticker) quedan en NaN y no avanzan el estado.
+    """
+    T, N = close.shape
+    names = list(OUTPUT_COLUMNS) if names is None else list(names)
+    if state is None:
+        state = IndicatorState.empty(range(N), params, names)
+    elif params is not None:
+        requested = resolve_params(params)
+        changed = [n for n in names if state.params.get(n) != requested[n]]
+        if changed:
+            raise ValueError(f"El estado se calculó con otros parámetros para: {changed}")
+    s = {name: values.copy() for name, values in state.arrays.items()}
+
+    valid = ~np.isnan(close)
+    c = {
+        "high": high, "low": low, "close": close, "volume": volume,
+        "valid": valid, "n_valid": valid.sum(axis=0), "t0": s["n_bars"],
+        "prev_high": _prev(high, s["prev_high"]),
+        "prev_low": _prev(low, s["prev_low"]),
+        "prev_close": _prev(close, s["prev_close"]),
+    }
+    if {"atr", "adx"} & set(names):
+        # Compartido por ATR y ADX
+        c["true_range"] = true_range(high, low, c["prev_close"])
+
+    out = {}
+    for name in names:
+        with profiling.span(name, "indicator", tickers=N, rows=int(c["n_valid"].sum())):
+            columns = _COMPUTE[name](c, s, **state.params[name])
+        out.update(zip(OUTPUT_COLUMNS[name], columns))
+
+    n_valid = c["n_valid"]
+    s["prev_high"] = _last(high, n_valid, s["prev_high"])
+    s["prev_low"] = _last(low, n_valid, s["prev_low"])
+    s["prev_close"] = _last(close, n_valid, s["prev_close"])
+    s["n_bars"] = c["t0"] + n_valid
+
+    for values in out.values():
+        values[~valid] = np.nan
+    return out, IndicatorState(state.tickers, s, state.params)
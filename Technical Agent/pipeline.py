@@ -0,0 +1,184 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import profiling
+
+
+class Stage:
+    """
+    Un paso del pipeline: `func(**{dep: salida_de_dep}, **config)`.
+    Con `cache=True` su salida se guarda en disco bajo una clave que depende
+    de su nombre, su código, su `config` y las claves de sus dependencias.
+    Con `exclusive=True` corre sola (ver `Pipeline`).
+    """
+    def __init__(self, name, func, deps=(), config=None, cache=True, exclusive=False):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.config = dict(config or {})
+        self.cache = cache
+        self.exclusive = exclusive
+
+    def code_digest(self):
+        try:
+            source = inspect.getsource(self.func)
+        except (OSError, TypeError):
+            source = f"{self.func.__module__}.{self.func.__qualname__}"
+        return hashlib.sha256(source.encode()).hexdigest()
+
+
+class Pipeline:
+    """
+    Grafo de etapas con resultados persistidos y reanudables.
+
+        pipe = Pipeline(cache_dir)
+        pipe.add("load", load, config={"tickers": [...]})
+        pipe.add("features", features, deps=["load"])
+        results = pipe.run()
+
+    La clave de cada etapa encadena las de sus dependencias, así que cambiar
+    la config o el código de una etapa invalida esa etapa y las que dependen
+    de ella (sólo se mira el código de la función de la etapa, no el de los
+    módulos que usa), y la corrida siguiente retoma desde ahí: las anteriores se leen
+    de `{cache_dir}/{etapa}-{clave}.pkl` (y sólo si alguien las necesita).
+    Las etapas cuyas dependencias ya están listas corren en paralelo en un
+    pool de `max_workers` hilos. Si una etapa falla, las que ya terminaron
+    quedan guardadas.
+
+    Las etapas que abren un pool de procesos (fork) se agregan con
+    `exclusive=True`: hacer fork mientras otros hilos están en medio de una
+    etapa puede dejar al hijo trabado en un lock que tenía uno de ellos
+    (BLAS, logging, ...). Una etapa exclusiva arranca cuando no corre
+    ninguna otra, y mientras corre no se lanza ni se lee de caché nada más.
+
+    Con `tracker` (un `low_memory.MemoryTracker`) se mide la memoria de cada
+    etapa que se ejecuta. El pico de tracemalloc es de todo el proceso, así
+    que para que sea el de esa etapa todas corren como exclusivas, de a una.
+    """
+    def __init__(self, cache_dir, max_workers=4, tracker=None):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.tracker = tracker
+        self.stages = {}
+        self.timings = {}
+
+    def add(self, name, func, deps=(), config=None, cache=True, exclusive=False):
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"La etapa {name!r} depende de {dep!r}, que no está definida")
+        self.stages[name] = Stage(name, func, deps, config, cache, exclusive)
+        return self.stages[name]
+
+    def keys(self) -> dict:
+        """Clave de cada etapa (las etapas se agregan en orden topológico)."""
+        keys = {}
+        for name, stage in self.stages.items():
+            payload = json.dumps(
+                [name, stage.code_digest(), stage.config, [keys[d] for d in stage.deps]],
+                sort_keys=True, default=repr,
+            )
+            keys[name] = hashlib.sha256(payload.encode()).hexdigest()[:16]
+        return keys
+
+    def _path(self, name, key):
+        return os.path.join(self.cache_dir, f"{name}-{key}.pkl")
+
+    def _cached(self, name, key):
+        return self.stages[name].cache and os.path.exists(self._path(name, key))
+
+    def _load(self, name, key):
+        with open(self._path(name, key), "rb") as f:
+            return pickle.load(f)
+
+    def _save(self, name, key, value):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(name, key)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+    def _needed(self, targets, keys):
+        """Etapas cuyo resultado hace falta: los objetivos y las entradas de lo que se recalcula."""
+        needed = set(targets)
+        for name in reversed(list(self.stages)):
+            if name in needed and not self._cached(name, keys[name]):
+                needed.update(self.stages[name].deps)
+        return needed
+
+    def _execute(self, name, key, values):
+        stage = self.stages[name]
+        t0 = time.perf_counter()
+        if self._cached(name, key):
+            value = self._load(name, key)
+            print(f"[pipeline] {name}: desde caché ({key})")
+        else:
+            print(f"[pipeline] {name}: ejecutando")
+            if self.tracker is not None:
+                measure = self.tracker.stage(name)
+            else:
+                measure = profiling.span(name, "stage")
+            with measure:
+                value = stage.func(**{d: values[d] for d in stage.deps}, **stage.config)
+            if stage.cache:
+                self._save(name, key, value)
+            print(f"[pipeline] {name}: listo en {time.perf_counter() - t0:.1f}s")
+        self.timings[name] = time.perf_counter() - t0
+        return value
+
+    def run(self, targets=None) -> dict:
+        """
+        Corre (o lee de caché) lo necesario para `targets` (por defecto, las
+        etapas finales: las que ninguna otra usa) y devuelve {etapa: salida}
+        de las etapas que se usaron.
+        """
+        if targets is None:
+            used = {d for stage in self.stages.values() for d in stage.deps}
+            targets = [n for n in self.stages if n not in used]
+        keys = self.keys()
+        needed = self._needed(targets, keys)
+        pending = [n for n in self.stages if n in needed]
+        values, running = {}, {}
+
+        def ready(name):
+            return self._cached(name, keys[name]) or all(d in values for d in self.stages[name].deps)
+
+        def alone(name):
+            exclusive = self.stages[name].exclusive or self.tracker is not None
+            return exclusive and not self._cached(name, keys[name])
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                progress = True
+                while progress:
+                    progress = False
+                    for name in [n for n in pending if ready(n)]:
+                        if any(alone(n) for n in running.values()):
+                            break
+                        if alone(name) and running:
+                            # Espera a que terminen las que están corriendo
+                            continue
+                        pending.remove(name)
+                        if self._cached(name, keys[name]):
+                            # Leer de disco es rápido: se hace acá, sin ocupar el pool
+                            values[name] = self._execute(name, keys[name], values)
+                            progress = True
+                        else:
+                            running[pool.submit(self._execute, name, keys[name], values)] = name
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        values[name] = future.result()
+                    except Exception:
+                        # No se lanzan etapas nuevas; se espera a las que ya corren
+                        pending.clear()
+                        wait(running)
+                        raise
+        return values
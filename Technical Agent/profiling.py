@@ -0,0 +1,204 @@
+"""
+Instrumentación de los caminos calientes del Technical Agent.
+
+    import profiling
+    profiling.enable()                    # o enable(memory=True)
+    with profiling.span("download", "load", ticker="AAPL") as sp:
+        df = ...
+        sp.set(rows=len(df))
+    profiling.export_json("profile.json")
+    profiling.export_chrome_trace("trace.json")   # chrome://tracing o Perfetto
+
+Cada span registra tiempo de pared, tiempo de CPU del hilo, filas/seg (si
+se informan filas) y, con `memory=True`, el pico de memoria (tracemalloc)
+durante el span. Apagado (por defecto) `span` devuelve siempre el mismo
+objeto vacío: el costo es una llamada a función.
+
+Los spans se guardan por hilo, así que funcionan con los pools de hilos.
+Lo que corre en otros procesos no se ve, salvo lo que se registre a mano
+con `record` (p.ej. los folds del walk-forward, que devuelven sus tiempos).
+El pico de memoria de tracemalloc es global: con spans concurrentes en
+varios hilos es una cota, no una medida exacta.
+"""
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+_PROFILER = None
+
+
+class _NoSpan:
+    """Span vacío que se devuelve con la instrumentación apagada."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    def __init__(self, profiler, name, category, fields):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.fields = fields
+        self.child_peak = 0
+        self.peak_mb = None
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self):
+        stack = self.profiler._stack()
+        if self.profiler.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # Se guarda el pico del padre antes de reiniciarlo
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+            self.mem_start = current
+            tracemalloc.reset_peak()
+        stack.append(self)
+        self.start = time.time()
+        self.cpu0 = time.thread_time()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.t0
+        cpu = time.thread_time() - self.cpu0
+        stack = self.profiler._stack()
+        stack.pop()
+        peak = None
+        if self.profiler.memory:
+            # reset_peak es global: el pico de un span hijo se propaga al padre
+            own = tracemalloc.get_traced_memory()[1]
+            peak_bytes = max(own, self.child_peak) - self.mem_start
+            peak = max(peak_bytes, 0) / 2 ** 20
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, max(own, self.child_peak))
+        self.peak_mb = peak
+        self.profiler.record(self.name, self.category, self.start, wall, cpu, peak_mb=peak,
+                             error=exc[0].__name__ if exc[0] else None, **self.fields)
+        return False
+
+
+class Profiler:
+    """Colector de spans (ver el docstring del módulo)."""
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.records = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def record(self, name, category, start, wall, cpu=None, rows=None, peak_mb=None,
+               pid=None, tid=None, **fields):
+        """Agrega un registro ya medido (p.ej. en otro proceso)."""
+        rec = {
+            "name": name, "cat": category, "start": start, "wall": wall, "cpu": cpu,
+            "peak_mb": peak_mb, "rows": rows,
+            "rows_per_sec": rows / wall if rows is not None and wall > 0 else None,
+            "pid": pid if pid is not None else os.getpid(),
+            "tid": tid if tid is not None else threading.get_ident(),
+            "args": {k: v for k, v in fields.items() if v is not None},
+        }
+        with self._lock:
+            self.records.append(rec)
+
+
+def enable(memory=False) -> Profiler:
+    """Enciende la instrumentación (con `memory=True` también mide memoria)."""
+    global _PROFILER
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _PROFILER = Profiler(memory=memory)
+    return _PROFILER
+
+
+def disable():
+    global _PROFILER
+    if _PROFILER is not None and _PROFILER.memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _PROFILER = None
+
+
+def is_enabled() -> bool:
+    return _PROFILER is not None
+
+
+def measures_memory() -> bool:
+    """True si la instrumentación está encendida con `memory=True`."""
+    return _PROFILER is not None and _PROFILER.memory
+
+
+def span(name, category="", **fields):
+    """Mide el bloque `with`; `fields` (ticker, rows, ...) van al registro."""
+    if _PROFILER is None:
+        return _NO_SPAN
+    return _Span(_PROFILER, name, category, fields)
+
+
+def record(name, category, start, wall, **kwargs):
+    """`Profiler.record` sobre el colector activo (no hace nada si está apagado)."""
+    if _PROFILER is not None:
+        _PROFILER.record(name, category, start, wall, **kwargs)
+
+
+def summary(records=None, by=("cat", "name")) -> pd.DataFrame:
+    """
+    Totales por `by` (columnas del registro o de sus campos, p.ej.
+    ("name", "ticker")): cantidad, tiempo de pared y de CPU, pico de memoria
+    y filas/seg, ordenados por tiempo total.
+    """
+    records = _PROFILER.records if records is None and _PROFILER is not None else (records or [])
+    df = pd.DataFrame([{**rec["args"], **rec} for rec in records])
+    if df.empty or any(col not in df for col in by):
+        return pd.DataFrame()
+    out = df.groupby(list(by)).agg(
+        count=("wall", "size"), wall=("wall", "sum"), cpu=("cpu", "sum"),
+        peak_mb=("peak_mb", "max"), rows=("rows", "sum"),
+    )
+    out["rows_per_sec"] = out["rows"] / out["wall"]
+    return out.sort_values("wall", ascending=False)
+
+
+def export_json(path, records=None):
+    """Registros crudos + resumen por (categoría, nombre)."""
+    records = _PROFILER.records if records is None else records
+    table = summary(records).reset_index()
+    with open(path, "w") as f:
+        json.dump({"records": records, "summary": table.to_dict(orient="records")}, f,
+                  indent=1, default=str)
+
+
+def export_chrome_trace(path, records=None):
+    """Formato Trace Event (eventos completos "X"), para chrome://tracing o Perfetto."""
+    records = _PROFILER.records if records is None else records
+    events = []
+    for rec in records:
+        args = dict(rec["args"])
+        for key in ("cpu", "peak_mb", "rows", "rows_per_sec"):
+            if rec[key] is not None:
+                args[key] = rec[key]
+        events.append({
+            "name": rec["name"], "cat": rec["cat"], "ph": "X",
+            "ts": rec["start"] * 1e6, "dur": rec["wall"] * 1e6,
+            "pid": rec["pid"], "tid": rec["tid"], "args": args,
+        })
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
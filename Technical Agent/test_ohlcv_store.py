@@ -0,0 +1,119 @@
+"""
+`OHLCVStore` + `DataLoader` contra `LocalFixtureSource`: una carga con el
+almacén ya lleno no descarga nada, ampliar el rango sólo pide los huecos
+y el resultado es el mismo que el de una carga en frío. También el
+limitador compartido por host y qué errores se reintentan.
+
+    python -m pytest "Technical Agent/test_ohlcv_store.py"
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from columnar_store import ColumnarStore
+from data_loader import DataLoader
+from data_sources import LocalFixtureSource, RateLimitedSource, host_rate_limiter
+from ohlcv_store import OHLCVStore
+
+TICKERS = ["AAA", "BBB"]
+
+
+def _frames():
+    rng = np.random.default_rng(0)
+    frames = {}
+    for ticker in TICKERS:
+        dates = pd.bdate_range("2019-01-01", "2020-12-31")
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates))))
+        frames[ticker] = pd.DataFrame({
+            "Date": dates, "Open": close, "High": close * 1.01, "Low": close * 0.99,
+            "Close": close, "Volume": rng.integers(1_000, 10_000, len(dates)).astype(float),
+        })
+    return frames
+
+
+def _load(root, source, start, end):
+    loader = DataLoader(TICKERS, start, end, source=source, store=OHLCVStore(root), max_workers=2)
+    return loader.load_data_multi()
+
+
+def test_warm_load_makes_no_fetches(tmp_path):
+    cold = _load(tmp_path, LocalFixtureSource(_frames()), "2020-01-01", "2020-07-01")
+
+    source = LocalFixtureSource(_frames())
+    warm = _load(tmp_path, source, "2020-01-01", "2020-07-01")
+
+    assert source.calls == []
+    pd.testing.assert_frame_equal(warm, cold)
+
+
+def test_extended_range_fetches_only_missing_ranges(tmp_path):
+    _load(tmp_path, LocalFixtureSource(_frames()), "2020-01-01", "2020-07-01")
+
+    source = LocalFixtureSource(_frames())
+    extended = _load(tmp_path, source, "2019-07-01", "2020-10-01")
+
+    fetched = sorted((t, str(s.date()), str(e.date())) for t, s, e, _ in source.calls)
+    assert fetched == sorted(
+        (t, s, e) for t in TICKERS
+        for s, e in [("2019-07-01", "2020-01-01"), ("2020-07-01", "2020-10-01")]
+    )
+    cold = _load(tmp_path / "cold", LocalFixtureSource(_frames()), "2019-07-01", "2020-10-01")
+    pd.testing.assert_frame_equal(extended, cold)
+    # Y lo mismo que pedir el rango directo a la fuente, sin almacén
+    direct = DataLoader(TICKERS, "2019-07-01", "2020-10-01",
+                        source=LocalFixtureSource(_frames())).load_data_multi()
+    pd.testing.assert_frame_equal(extended, direct, check_dtype=False)
+
+
+def test_sources_on_one_host_share_a_single_limiter():
+    class Source(LocalFixtureSource):
+        host = "test-shared-host"
+
+    fast = RateLimitedSource(Source(), rate=10)
+    slow = RateLimitedSource(Source(), rate=2)
+    again = RateLimitedSource(Source(), rate=10)
+
+    assert fast.limiter is slow.limiter is again.limiter is host_rate_limiter("test-shared-host", 10)
+    assert fast.limiter.rate == 2
+
+
+def test_only_transient_errors_are_retried():
+    class BadSymbol(LocalFixtureSource):
+        def fetch(self, ticker, start, end, interval="1d"):
+            self.calls.append(ticker)
+            raise ValueError(f"{ticker}: símbolo inválido")
+
+    flaky = LocalFixtureSource(_frames(), failures={"AAA": 2})
+    loader = DataLoader(["AAA"], "2020-01-01", "2020-02-01", source=flaky, backoff=0)
+    assert len(loader.load_data_multi()) > 0
+    assert len(flaky.calls) == 3
+
+    bad = BadSymbol()
+    loader = DataLoader(["AAA", "BBB"], "2020-01-01", "2020-02-01", source=bad, backoff=0)
+    with pytest.raises(RuntimeError):
+        loader.load_data_multi()
+    assert sorted(bad.calls) == ["AAA", "BBB"]
+    assert sorted(loader.failures) == ["AAA", "BBB"]
+
+
+def test_columnar_backfill_merges_in_bounded_blocks(tmp_path, monkeypatch):
+    dates = pd.bdate_range("2020-01-01", periods=60)
+    bars = pd.DataFrame({"Date": dates, "Close": np.arange(60.0), "Volume": np.arange(60.0) * 10})
+    store = ColumnarStore(tmp_path, merge_rows=7)
+    store.append("p", bars.iloc[30:50])
+
+    read = []
+    original = store._read_rows
+    monkeypatch.setattr(store, "_read_rows", lambda p, lo, hi, columns=None:
+                        read.append(hi - lo) or original(p, lo, hi, columns))
+    # Relleno hacia atrás que además pisa dos fechas guardadas, y un hueco sin Volume
+    backfill = bars.iloc[[0, 5, 10, 31, 40]].assign(Close=-1.0)
+    store.append("p", backfill)
+    store.append("p", bars.iloc[52:55][["Date", "Close"]])
+
+    assert read and max(read) <= 7
+    expected = pd.concat([bars.iloc[30:50], backfill,
+                          bars.iloc[52:55].assign(Volume=np.nan)])
+    expected = expected.drop_duplicates("Date", keep="last").sort_values("Date", ignore_index=True)
+    pd.testing.assert_frame_equal(store.read("p"), expected)
+    assert not list(tmp_path.glob("p/*.tmp"))
@@ -0,0 +1,101 @@
+"""
+Regresión del modo incremental: sobre un panel desparejo (tickers con
+distinta historia, que empiezan o terminan en otras fechas y con barras
+faltantes) procesar por bloques o barra a barra tiene que dar exactamente
+lo mismo que el cálculo de una sola vez. Y paridad del motor numpy con
+`ta`, incluida una serie más corta que las ventanas de los indicadores.
+
+    python -m pytest "Technical Agent/test_panel_indicators.py"
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import panel_indicators
+from feature_engineering import FeatureEngineer, IncrementalFeatureEngineer, _ta_indicators
+
+CUTOFF = 150
+
+
+def _bars(seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2020-01-01", periods=300)
+    spans = {"AAA": (0, 300), "BBB": (60, 300), "CCC": (0, 250), "DDD": (0, 300), "EEE": (170, 300)}
+    frames = []
+    for ticker, (start, stop) in spans.items():
+        d = dates[start:stop]
+        if ticker == "DDD":
+            # Barras faltantes sueltas
+            d = d[rng.random(len(d)) > 0.1]
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(d))))
+        spread = close * rng.uniform(0.001, 0.03, len(d))
+        frames.append(pd.DataFrame({
+            "Date": d,
+            "Open": close + rng.normal(0, 0.5, len(d)),
+            "High": close + spread,
+            "Low": close - spread,
+            "Close": close,
+            "Volume": rng.integers(1_000, 100_000, len(d)).astype(float),
+            "Ticker": ticker,
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _sorted(df):
+    return df.sort_values(["Ticker", "Date"], kind="mergesort").reset_index(drop=True)
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 40])
+def test_incremental_matches_batch_on_ragged_panel(chunk, tmp_path):
+    bars = _bars()
+    dates = np.sort(bars["Date"].unique())
+    cutoff = dates[CUTOFF]
+    batch = FeatureEngineer(bars, engine="numpy").add_technical_indicators()
+    expected = _sorted(batch[batch["Date"] > cutoff])
+    assert expected["Ticker"].nunique() == 5
+
+    inc = IncrementalFeatureEngineer.from_history(bars[bars["Date"] <= cutoff])
+    new = dates[dates > cutoff]
+    parts = []
+    for i in range(0, len(new), chunk):
+        block = bars[bars["Date"].isin(new[i:i + chunk])]
+        parts.append(inc.update(block))
+        # El estado guardado y vuelto a cargar tiene que seguir igual
+        inc.save(tmp_path / "state.npz")
+        inc = IncrementalFeatureEngineer.load(tmp_path / "state.npz")
+    # El batch descarta el calentamiento y la última barra (sin target)
+    got = expected[["Ticker", "Date"]].merge(pd.concat(parts), on=["Ticker", "Date"], how="left")
+
+    assert len(got) == len(expected) > 0
+    for name in panel_indicators.INDICATOR_COLUMNS:
+        np.testing.assert_array_equal(got[name].to_numpy(), expected[name].to_numpy(), err_msg=name)
+
+
+def test_numpy_engine_matches_ta():
+    # Incluye una serie más corta que las ventanas (MACD lento 26, ADX 2*14)
+    bars = _bars(seed=1)
+    short = bars[bars["Ticker"] == "AAA"].head(20).assign(Ticker="SHORT")
+    bars = pd.concat([bars, short], ignore_index=True)
+
+    numpy_ = _sorted(FeatureEngineer(bars, engine="numpy").add_technical_indicators())
+    ta_ = _sorted(FeatureEngineer(bars, engine="ta").add_technical_indicators())
+
+    pd.testing.assert_frame_equal(numpy_[["Ticker", "Date"]], ta_[["Ticker", "Date"]])
+    assert set(numpy_["Ticker"]) == {"AAA", "BBB", "CCC", "DDD", "EEE"}
+    np.testing.assert_array_equal(numpy_["target"].to_numpy(), ta_["target"].to_numpy())
+    for name in panel_indicators.INDICATOR_COLUMNS:
+        np.testing.assert_allclose(numpy_[name].to_numpy(), ta_[name].to_numpy(),
+                                   rtol=1e-9, atol=1e-9, err_msg=name)
+
+
+def test_warmup_of_short_series_matches_ta():
+    # Sin dropna: el calentamiento (NaN o 0, como en `ta`) también tiene que coincidir
+    short = _bars(seed=2)
+    short = short[short["Ticker"] == "AAA"].head(20)
+    cols = {c: short[c].to_numpy(dtype=float)[:, None] for c in ("High", "Low", "Close", "Volume")}
+    got, _ = panel_indicators.compute_indicators(cols["High"], cols["Low"], cols["Close"], cols["Volume"])
+    expected = _ta_indicators(*(short[c].reset_index(drop=True) for c in ("High", "Low", "Close", "Volume")),
+                              params=panel_indicators.resolve_params())
+    for name in panel_indicators.INDICATOR_COLUMNS:
+        np.testing.assert_allclose(got[name][:, 0], expected[name].to_numpy(dtype=float),
+                                   rtol=1e-9, atol=1e-9, err_msg=name)
@@ -0,0 +1,342 @@
+"""
+Patrones de velas y de gráfico sobre paneles (barras × tickers).
+
+    events = pattern_events(df)                 # Ticker, Date, pattern
+    features = pattern_features(df)             # columnas ralas (0/1), índice de df
+    counts = features.sum()                     # marcas por patrón
+    df = df.join(features)
+
+`df` es el formato largo de `DataLoader`/`FeatureEngineer` (Date, Open,
+High, Low, Close, Ticker). Como en `panel_indicators`, cada columna del
+panel es un ticker alineado a la izquierda (fila t = barra número t), así
+que cada regla es una operación de numpy sobre todo el panel a la vez: las
+velas comparan la barra con las anteriores (desplazando filas) y los
+pivotes salen de ventanas deslizantes (`sliding_window_view`), sin bucles
+por fila ni por ticker.
+
+Todo es causal: una marca en la barra t sólo usa barras hasta t. Un pivote
+(máximo o mínimo de las `order` barras a cada lado) recién se conoce
+`order` barras después, y los patrones de gráfico (hombro-cabeza-hombro,
+doble techo/piso) se marcan en la barra que confirma su último pivote.
+Soporte y resistencia son el último mínimo y máximo pivote ya confirmados.
+
+Los tickers se procesan de a `block` columnas para acotar la memoria; con
+5.000 tickers × 10 años el escaneo completo lleva unos segundos.
+
+    python modules/pattern_recognition.py barras.csv
+"""
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import sparse
+
+CANDLESTICK_PATTERNS = [
+    "doji", "hammer", "hanging_man", "inverted_hammer", "shooting_star",
+    "bullish_engulfing", "bearish_engulfing", "morning_star", "evening_star",
+    "three_white_soldiers", "three_black_crows",
+]
+CHART_PATTERNS = [
+    "head_and_shoulders", "inverse_head_and_shoulders", "double_top", "double_bottom",
+    "support_test", "resistance_test", "support_break", "resistance_break",
+]
+PATTERN_COLUMNS = CANDLESTICK_PATTERNS + CHART_PATTERNS
+
+# Parámetros por defecto de `detect_patterns`
+DEFAULT_PARAMS = {
+    "trend": 5,           # barras para decidir la tendencia previa de una vela
+    "order": 5,           # barras a cada lado de un pivote
+    "tolerance": 0.03,    # diferencia relativa máxima entre hombros / techos / pisos
+    "depth": 0.03,        # caída (o suba) mínima entre los dos techos (pisos)
+    "max_bars": 120,      # largo máximo de un patrón de gráfico
+    "band": 0.01,         # banda alrededor de soporte / resistencia para los "test"
+}
+
+
+def _shift(x: np.ndarray, k: int) -> np.ndarray:
+    """x desplazado k filas hacia abajo (fila t = x[t-k]), con NaN arriba."""
+    out = np.full_like(x, np.nan)
+    if k < len(x):
+        out[k:] = x[:len(x) - k]
+    return out
+
+
+def candlestick_patterns(o, h, l, c, trend: int = 5) -> Dict[str, np.ndarray]:
+    """
+    Velas sobre paneles de Open/High/Low/Close. Martillo, hombre colgado,
+    martillo invertido y estrella fugaz tienen la misma forma de a pares y
+    se distinguen por la tendencia de las `trend` barras previas.
+
+    Retorna:
+    - {patrón: panel bool}
+    """
+    with np.errstate(invalid="ignore"):
+        body = np.abs(c - o)
+        rng = h - l
+        upper = h - np.maximum(o, c)
+        lower = np.minimum(o, c) - l
+        bull, bear = c > o, c < o
+        prev_c = _shift(c, 1)
+        down = prev_c < _shift(c, trend + 1)
+        up = prev_c > _shift(c, trend + 1)
+
+        long_lower = (lower >= 2 * body) & (upper <= 0.25 * body + 0.1 * rng) & (rng > 0)
+        long_upper = (upper >= 2 * body) & (lower <= 0.25 * body + 0.1 * rng) & (rng > 0)
+
+        o1, c1 = _shift(o, 1), prev_c
+        body1 = np.abs(c1 - o1)
+        bull1, bear1 = c1 > o1, c1 < o1
+        o2, c2 = _shift(o, 2), _shift(c, 2)
+        body2 = np.abs(c2 - o2)
+        bull2, bear2 = c2 > o2, c2 < o2
+        mid2 = (o2 + c2) / 2
+        small1 = body1 <= 0.3 * body2
+
+        return {
+            "doji": (body <= 0.1 * rng) & (rng > 0),
+            "hammer": long_lower & down,
+            "hanging_man": long_lower & up,
+            "inverted_hammer": long_upper & down,
+            "shooting_star": long_upper & up,
+            "bullish_engulfing": bear1 & bull & (o <= c1) & (c >= o1) & (body > body1),
+            "bearish_engulfing": bull1 & bear & (o >= c1) & (c <= o1) & (body > body1),
+            "morning_star": bear2 & small1 & bull & (c > mid2) & (np.maximum(o1, c1) < c2),
+            "evening_star": bull2 & small1 & bear & (c < mid2) & (np.minimum(o1, c1) > c2),
+            "three_white_soldiers": bull & bull1 & bull2 & (c > c1) & (c1 > c2)
+                                    & (o > o1) & (o < c1) & (o1 > o2) & (o1 < c2),
+            "three_black_crows": bear & bear1 & bear2 & (c < c1) & (c1 < c2)
+                                 & (o < o1) & (o > c1) & (o1 < o2) & (o1 > c2),
+        }
+
+
+def confirmed_pivots(x: np.ndarray, order: int, kind: str = "high") -> np.ndarray:
+    """
+    Marca, en la fila t, si la barra t-order fue un pivote: el máximo
+    ("high") o mínimo ("low") de las `order` barras a cada lado (el primero,
+    si hay empates). Es la fila en la que el pivote se puede conocer.
+    """
+    T = x.shape[0]
+    out = np.zeros(x.shape, dtype=bool)
+    if T < 2 * order + 1:
+        return out
+    # windows[i, :, j] = x[i + j]: se compara el centro con cada posición de la ventana
+    windows = sliding_window_view(x, 2 * order + 1, axis=0)
+    center = windows[..., order]
+    beats = np.greater if kind == "high" else np.less
+    ties = np.greater_equal if kind == "high" else np.less_equal
+    with np.errstate(invalid="ignore"):
+        ok = ~np.isnan(center)
+        for j in range(2 * order + 1):
+            if j != order:
+                # Estricto contra las anteriores (ante empates vale la primera); NaN nunca pasa
+                ok &= (beats if j < order else ties)(center, windows[..., j])
+    out[2 * order:] = ok
+    return out
+
+
+def _last_pivot(confirmed: np.ndarray, order: int) -> np.ndarray:
+    """Fila (centro) del último pivote confirmado hasta cada fila, -1 si no hubo."""
+    rows = np.arange(confirmed.shape[0])[:, None] - order
+    return np.maximum.accumulate(np.where(confirmed, rows, -1), axis=0)
+
+
+def _at(x: np.ndarray, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """x[rows, cols], NaN (o -1 si x es entero) donde rows < 0."""
+    values = x[np.maximum(rows, 0), cols]
+    return np.where(rows >= 0, values, -1 if x.dtype.kind == "i" else np.nan)
+
+
+def chart_patterns(h, l, c, order: int = 5, tolerance: float = 0.03, depth: float = 0.03,
+                   max_bars: int = 120, band: float = 0.01) -> Dict[str, np.ndarray]:
+    """
+    Patrones de gráfico a partir de los pivotes de High (techos) y Low
+    (pisos); ver `DEFAULT_PARAMS`. Los de pivotes sólo pueden aparecer en
+    una barra que confirma un pivote, así que se evalúan sólo en esas.
+
+    Retorna:
+    - {patrón: panel bool}
+    """
+    conf_high = confirmed_pivots(h, order, "high")
+    conf_low = confirmed_pivots(l, order, "low")
+    last_high = _last_pivot(conf_high, order)
+    last_low = _last_pivot(conf_low, order)
+
+    def pivots(conf, last, x, other_last):
+        # En cada barra que confirma un pivote: los últimos tres (del más
+        # nuevo al más viejo), sus valores y el último pivote del otro lado
+        t, n = np.nonzero(conf)
+        p1 = t - order
+        # El anterior a un pivote p es el último confirmado en la fila p + order - 1
+        p2 = _at(last, p1 + order - 1, n)
+        p3 = _at(last, np.where(p2 >= 0, p2 + order - 1, -1), n)
+        between = _at(other_last, p1 + order - 1, n)
+        return t, n, (p1, p2, p3), (_at(x, p1, n), _at(x, p2, n), _at(x, p3, n)), between
+
+    def panel(t, n, mask):
+        out = np.zeros(h.shape, dtype=bool)
+        out[t[mask], n[mask]] = True
+        return out
+
+    th, nh, (h1, h2, h3), (vh1, vh2, vh3), low_between = pivots(conf_high, last_high, h, last_low)
+    tl, nl, (l1, l2, l3), (vl1, vl2, vl3), high_between = pivots(conf_low, last_low, l, last_high)
+
+    with np.errstate(invalid="ignore"):
+        hs = ((h3 >= 0) & (h1 - h3 <= max_bars) & (vh2 > vh1) & (vh2 > vh3)
+              & (np.abs(vh1 - vh3) <= tolerance * vh2))
+        ihs = ((l3 >= 0) & (l1 - l3 <= max_bars) & (vl2 < vl1) & (vl2 < vl3)
+               & (np.abs(vl1 - vl3) <= tolerance * np.abs(vl2)))
+        double_top = ((h2 >= 0) & (h1 - h2 <= max_bars) & (low_between > h2)
+                      & (np.abs(vh1 - vh2) <= tolerance * np.fmax(vh1, vh2))
+                      & (_at(l, low_between, nh) <= np.fmin(vh1, vh2) * (1 - depth)))
+        double_bottom = ((l2 >= 0) & (l1 - l2 <= max_bars) & (high_between > l2)
+                         & (np.abs(vl1 - vl2) <= tolerance * np.fmax(vl1, vl2))
+                         & (_at(h, high_between, nl) >= np.fmax(vl1, vl2) * (1 + depth)))
+
+        # Niveles conocidos antes de la barra (los de la fila anterior)
+        cols = np.arange(h.shape[1])
+        support = _shift(_at(l, last_low, cols), 1)
+        resistance = _shift(_at(h, last_high, cols), 1)
+        prev_c = _shift(c, 1)
+        return {
+            "head_and_shoulders": panel(th, nh, hs),
+            "inverse_head_and_shoulders": panel(tl, nl, ihs),
+            "double_top": panel(th, nh, double_top),
+            "double_bottom": panel(tl, nl, double_bottom),
+            "support_test": (l <= support * (1 + band)) & (c > support),
+            "resistance_test": (h >= resistance * (1 - band)) & (c < resistance),
+            "support_break": (c < support) & (prev_c >= support),
+            "resistance_break": (c > resistance) & (prev_c <= resistance),
+        }
+
+
+def detect_patterns(o, h, l, c, names: Optional[List[str]] = None, **params) -> Dict[str, np.ndarray]:
+    """
+    Patrones `names` (por defecto PATTERN_COLUMNS) sobre paneles de
+    Open/High/Low/Close (barras × tickers, NaN en el relleno).
+
+    Retorna:
+    - {patrón: panel bool}
+    """
+    names = PATTERN_COLUMNS if names is None else list(names)
+    unknown = set(names) - set(PATTERN_COLUMNS)
+    if unknown:
+        raise ValueError(f"Patrones desconocidos: {sorted(unknown)}")
+    p = {**DEFAULT_PARAMS, **params}
+    out = {}
+    if set(names) & set(CANDLESTICK_PATTERNS):
+        out.update(candlestick_patterns(o, h, l, c, trend=p["trend"]))
+    if set(names) & set(CHART_PATTERNS):
+        out.update(chart_patterns(h, l, c, **{k: p[k] for k in DEFAULT_PARAMS if k != "trend"}))
+    return {name: out[name] for name in names}
+
+
+def _layout(df: pd.DataFrame):
+    """
+    Posición de cada fila de `df` en el panel, en orden (Ticker, Date):
+    (order, rows, cols, offsets, tickers, dates). `order` son las filas de
+    `df` en ese orden (None si `df` ya viene ordenado).
+    """
+    codes, tickers = pd.factorize(df["Ticker"], sort=True)
+    dates = df["Date"].to_numpy(dtype="datetime64[ns]")
+    step = np.diff(codes)
+    order = None
+    if not np.all((step > 0) | ((step == 0) & (dates[1:] >= dates[:-1]))):
+        order = np.lexsort((dates, codes))
+        codes, dates = codes[order], dates[order]
+    offsets = np.searchsorted(codes, np.arange(len(tickers) + 1))
+    rows = np.arange(len(df)) - offsets[codes]
+    return order, rows, codes, offsets, tickers, dates
+
+
+def _scan(df: pd.DataFrame, layout, names, block: int, params):
+    """
+    Recorre los tickers de a `block` columnas. Genera (patrón, posiciones
+    con la marca en el orden (Ticker, Date) de `layout`) por bloque.
+    """
+    order, rows, cols, offsets, tickers, _ = layout
+    values = {}
+    for col in ("Open", "High", "Low", "Close"):
+        x = df[col].to_numpy(dtype=float)
+        values[col] = x if order is None else x[order]
+    for first in range(0, len(tickers), block):
+        last = min(first + block, len(tickers))
+        lo, hi = offsets[first], offsets[last]
+        sizes = np.diff(offsets[first:last + 1])
+        shape = (int(sizes.max()) if len(sizes) else 0, last - first)
+        r, cc = rows[lo:hi], cols[lo:hi] - first
+        panels = []
+        for col in ("Open", "High", "Low", "Close"):
+            panel = np.full(shape, np.nan)
+            panel[r, cc] = values[col][lo:hi]
+            panels.append(panel)
+        hits = detect_patterns(*panels, names=names, **params)
+        for name in names:
+            t, n = np.nonzero(hits[name])
+            yield name, offsets[first + n] + t
+
+
+def pattern_events(df: pd.DataFrame, names: Optional[List[str]] = None, block: int = 1000,
+                   **params) -> pd.DataFrame:
+    """
+    Retorna:
+    - pd.DataFrame con una fila por marca: Ticker, Date y pattern (categóricas
+      las dos), ordenado por (Ticker, Date, pattern).
+    """
+    names = PATTERN_COLUMNS if names is None else list(names)
+    layout = _layout(df)
+    cols, tickers, dates = layout[2], layout[4], layout[5]
+    found = list(_scan(df, layout, names, block, params))
+    positions = np.concatenate([pos for _, pos in found]) if found else np.zeros(0, dtype=int)
+    pattern = np.repeat(np.array([names.index(name) for name, _ in found], dtype=np.int16),
+                        [len(pos) for _, pos in found])
+    # Las posiciones ya siguen el orden (Ticker, Date): una sola clave entera
+    order = np.argsort(positions * len(names) + pattern)
+    positions = positions[order]
+    return pd.DataFrame({
+        "Ticker": pd.Categorical.from_codes(cols[positions], categories=tickers),
+        "Date": dates[positions],
+        "pattern": pd.Categorical.from_codes(pattern[order], categories=names),
+    })
+
+
+def pattern_features(df: pd.DataFrame, names: Optional[List[str]] = None, block: int = 1000,
+                     **params) -> pd.DataFrame:
+    """
+    Marcas de cada patrón como columnas ralas (Sparse int32, 1 = patrón en
+    esa barra) con el índice de `df`, listas para unir al frame de
+    `FeatureEngineer` (sólo ocupan memoria las marcas). Las reducciones
+    ralas conservan el tipo, por eso int32 y no int8: `.sum()` cuenta las
+    marcas sin desbordar.
+    """
+    names = PATTERN_COLUMNS if names is None else list(names)
+    layout = _layout(df)
+    order = layout[0]
+    found = {name: [] for name in names}
+    for name, pos in _scan(df, layout, names, block, params):
+        found[name].append(pos if order is None else order[pos])
+    # Matriz CSC armada directamente: por columna, las filas de df con marca (ordenadas)
+    indices = [np.sort(np.concatenate(found[name])) if found[name] else np.zeros(0, dtype=int)
+               for name in names]
+    indptr = np.concatenate([[0], np.cumsum([len(i) for i in indices])])
+    indices = np.concatenate(indices) if indices else np.zeros(0, dtype=int)
+    matrix = sparse.csc_matrix((np.ones(len(indices), dtype=np.int32), indices, indptr),
+                               shape=(len(df), len(names)))
+    return pd.DataFrame.sparse.from_spmatrix(matrix, index=df.index, columns=names)
+
+
+def add_pattern_features(df: pd.DataFrame, names: Optional[List[str]] = None, **params) -> pd.DataFrame:
+    """`df` con las columnas de `pattern_features`."""
+    return df.join(pattern_features(df, names, **params))
+
+
+if __name__ == "__main__":
+    bars = pd.read_csv(sys.argv[1], parse_dates=["Date"])
+    t0 = time.perf_counter()
+    events = pattern_events(bars)
+    print(f"{len(bars)} barras, {bars['Ticker'].nunique()} tickers: "
+          f"{len(events)} marcas en {time.perf_counter() - t0:.2f}s")
+    print(events["pattern"].value_counts())
+    print(events.tail(20))
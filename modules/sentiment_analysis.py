@@ -0,0 +1,374 @@
+"""
+Sentimiento de noticias por ticker y por día, para sumar a los indicadores.
+
+    pipeline = SentimentPipeline(cache=SentimentCache("data/cache/sentiment"))
+    scored = pipeline.run(news)                      # una fila por (artículo, ticker)
+    df = add_sentiment_features(df_indicadores, scored)
+
+`news` es {ticker: DataFrame de `process_news`} o un DataFrame largo con
+columna 'ticker' (p.ej. `SnapshotStore.read("news")`). Acepta los dos
+formatos de noticias de yfinance (uuid/title/providerPublishTime o
+id/content). La misma noticia aparece en varios tickers y en varias
+descargas: se puntúa una sola vez por id, de a lotes, y el puntaje queda
+en la caché, así que en la próxima corrida sólo se puntúan las nuevas.
+
+El puntaje (de -1 a 1) lo da un scorer intercambiable: cualquier objeto
+con `name` y `score(textos) -> array`. Por defecto, `LexiconScorer`, un
+léxico financiero local que no necesita red ni modelos (decenas de miles
+de titulares por segundo). Un modelo propio se enchufa con
+`CallableScorer(fn, name)`; `name` separa sus puntajes en la caché.
+
+    python modules/sentiment_analysis.py [carpeta de snapshots]
+"""
+import ast
+import hashlib
+import math
+import os
+import re
+import sys
+import time
+from typing import Callable, Dict, Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+# Léxico por defecto: palabra -> peso (titulares financieros en inglés)
+DEFAULT_LEXICON = {
+    **dict.fromkeys([
+        "beat", "beats", "surge", "surges", "soar", "soars", "jump", "jumps", "rally",
+        "rallies", "gain", "gains", "rise", "rises", "climb", "climbs", "record", "upgrade",
+        "upgrades", "upgraded", "outperform", "outperforms", "bullish", "boost", "boosts",
+        "growth", "profit", "profits", "profitable", "strong", "stronger", "raise", "raises",
+        "raised", "buy", "win", "wins", "approval", "approved", "expands", "expansion",
+        "rebound", "rebounds", "tops", "optimistic", "dividend", "buyback", "breakthrough",
+    ], 1.0),
+    **dict.fromkeys([
+        "miss", "misses", "missed", "plunge", "plunges", "fall", "falls", "drop", "drops",
+        "slump", "slumps", "sink", "sinks", "tumble", "tumbles", "decline", "declines",
+        "downgrade", "downgrades", "downgraded", "underperform", "bearish", "loss", "losses",
+        "weak", "weaker", "cut", "cuts", "lawsuit", "sued", "probe", "investigation", "recall",
+        "fraud", "bankruptcy", "default", "layoffs", "warning", "warns", "sell", "selloff",
+        "slowdown", "fine", "fined", "crash", "crashes", "halt", "halts", "risk", "concerns",
+    ], -1.0),
+    # Más fuertes
+    "soaring": 1.5, "skyrocket": 1.5, "skyrockets": 1.5, "blowout": 1.5,
+    "collapse": -1.5, "collapses": -1.5, "scandal": -1.5, "bankrupt": -1.5,
+}
+
+# Palabras que invierten la siguiente con peso (si está a 3 palabras o menos)
+NEGATIONS = {"not", "no", "never", "without", "fails", "failed", "don't", "doesn't", "won't", "isn't"}
+
+_TOKEN = re.compile(r"[a-z][a-z']*")
+
+
+class LexiconScorer:
+    """
+    Puntaje por léxico: suma los pesos de las palabras del texto (una
+    negación invierte la siguiente con peso, si está a 3 palabras o menos)
+    y la normaliza a (-1, 1) con s / sqrt(s² + alpha), como VADER.
+
+    Parámetros:
+    - lexicon (dict): {palabra: peso}; por defecto DEFAULT_LEXICON.
+    - alpha (float): Suavizado de la normalización.
+    """
+    def __init__(self, lexicon: Optional[Dict[str, float]] = None, alpha: float = 4.0):
+        self.lexicon = dict(DEFAULT_LEXICON if lexicon is None else lexicon)
+        self.alpha = alpha
+        # Si cambia el léxico, cambia el nombre: la caché no mezcla puntajes
+        digest = hashlib.sha1(repr((sorted(self.lexicon.items()), alpha)).encode()).hexdigest()
+        self.name = f"lexicon-{digest[:10]}"
+
+    @classmethod
+    def from_csv(cls, path: str, **kwargs) -> "LexiconScorer":
+        """Léxico desde un CSV con columnas word, weight."""
+        df = pd.read_csv(path)
+        return cls(dict(zip(df["word"].str.lower(), df["weight"].astype(float))), **kwargs)
+
+    def score(self, texts: Iterable[str]) -> np.ndarray:
+        lexicon, alpha, findall = self.lexicon, self.alpha, _TOKEN.findall
+        out = []
+        for text in texts:
+            total, flip = 0.0, 0
+            for word in findall(text.lower()) if isinstance(text, str) else ():
+                weight = lexicon.get(word)
+                if weight is not None:
+                    total += -weight if flip else weight
+                    flip = 0
+                elif word in NEGATIONS:
+                    flip = 3
+                elif flip:
+                    flip -= 1
+            out.append(total / math.sqrt(total * total + alpha) if total else 0.0)
+        return np.array(out, dtype=float)
+
+
+class CallableScorer:
+    """
+    Adapta una función por lotes (lista de textos -> puntajes de -1 a 1),
+    p.ej. un modelo de HuggingFace, a la interfaz de scorer.
+
+    Parámetros:
+    - func (Callable): Función que puntúa una lista de textos.
+    - name (str): Nombre del scorer (separa sus puntajes en la caché).
+    """
+    def __init__(self, func: Callable[[list], Iterable[float]], name: str):
+        self.func = func
+        self.name = name
+
+    def score(self, texts: Iterable[str]) -> np.ndarray:
+        return np.asarray(self.func(list(texts)), dtype=float)
+
+
+class SentimentCache:
+    """
+    Puntajes ya calculados, por scorer y por id de artículo:
+
+        {folder}/{scorer}/part-{seq}.parquet   (article_id, score)
+
+    Cada `put` agrega un archivo (escritura atómica); al abrir un scorer se
+    leen todas sus partes una vez. `compact` las junta en una.
+
+    Parámetros:
+    - folder (str): Carpeta de la caché.
+    """
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._scores: Dict[str, Dict[str, float]] = {}
+
+    def _dir(self, scorer: str) -> str:
+        return os.path.join(self.folder, scorer)
+
+    def _parts(self, scorer: str) -> list:
+        folder = self._dir(scorer)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(".parquet"))
+
+    def scores(self, scorer: str) -> Dict[str, float]:
+        """{article_id: puntaje} del scorer."""
+        if scorer not in self._scores:
+            known = {}
+            for path in self._parts(scorer):
+                df = pd.read_parquet(path)
+                known.update(zip(df["article_id"], df["score"]))
+            self._scores[scorer] = known
+        return self._scores[scorer]
+
+    def put(self, scorer: str, scores: pd.Series) -> None:
+        """Guarda {article_id: puntaje} (Series indexada por article_id)."""
+        if scores.empty:
+            return
+        os.makedirs(self._dir(scorer), exist_ok=True)
+        path = os.path.join(self._dir(scorer), f"part-{time.time_ns()}.parquet")
+        df = pd.DataFrame({"article_id": scores.index.astype(str), "score": scores.to_numpy(dtype=float)})
+        df.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        self.scores(scorer).update(zip(df["article_id"], df["score"]))
+
+    def compact(self, scorer: str) -> None:
+        parts = self._parts(scorer)
+        if len(parts) < 2:
+            return
+        known = self.scores(scorer)
+        self._scores.pop(scorer)
+        self.put(scorer, pd.Series(known, dtype=float))
+        for path in parts:
+            os.remove(path)
+
+
+def _content(value) -> dict:
+    """El campo 'content' de yfinance (dict, o su repr si pasó por el SnapshotStore)."""
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, str) and value.startswith("{"):
+        try:
+            parsed = ast.literal_eval(value)
+            return parsed if isinstance(parsed, dict) else {}
+        except (ValueError, SyntaxError):
+            return {}
+    return {}
+
+
+def _column(df: pd.DataFrame, name: str) -> pd.Series:
+    return df[name] if name in df.columns else pd.Series(np.nan, index=df.index, dtype=object)
+
+
+ARTICLE_COLUMNS = {"Ticker": object, "article_id": object, "published": "datetime64[ns]", "title": object}
+
+
+def news_articles(news: Union[Dict[str, pd.DataFrame], pd.DataFrame]) -> pd.DataFrame:
+    """
+    Normaliza las noticias a una fila por (artículo, ticker).
+
+    Parámetros:
+    - news: {ticker: DataFrame de `process_news`} o DataFrame con columna 'ticker'.
+
+    Retorna:
+    - pd.DataFrame con columnas Ticker, article_id, published (UTC, sin zona) y title,
+      sin repetir (article_id, Ticker).
+    """
+    if isinstance(news, dict):
+        frames = [df.assign(ticker=t) for t, df in news.items() if df is not None and not df.empty]
+        news = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["ticker"])
+    if news.empty:
+        # Vacío pero con los tipos de siempre (published datetime, para `.dt`)
+        return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in ARTICLE_COLUMNS.items()})
+
+    content = _column(news, "content").map(_content)
+    title = _column(news, "title").where(_column(news, "title").notna(),
+                                         content.map(lambda c: c.get("title")))
+    # Formato viejo: providerPublishTime (epoch); nuevo: content.pubDate (ISO)
+    epoch = pd.to_datetime(pd.to_numeric(_column(news, "providerPublishTime"), errors="coerce"),
+                           unit="s", utc=True)
+    iso = pd.to_datetime(content.map(lambda c: c.get("pubDate")), utc=True, errors="coerce")
+    published = epoch.fillna(iso).dt.tz_localize(None)
+    if "Date" in news.columns:
+        # Sin fecha de publicación: la de la descarga
+        published = published.fillna(pd.to_datetime(news["Date"]))
+
+    article_id = _column(news, "uuid").fillna(_column(news, "id"))
+    # Sin id: hash del título y la fecha
+    missing = article_id.isna()
+    if missing.any():
+        article_id[missing] = [hashlib.sha1(f"{t}|{p}".encode()).hexdigest()
+                               for t, p in zip(title[missing], published[missing])]
+    df = pd.DataFrame({"Ticker": news["ticker"].astype(str), "article_id": article_id.astype(str),
+                       "published": published, "title": title.fillna("").astype(str)})
+    return df.drop_duplicates(["article_id", "Ticker"]).reset_index(drop=True)
+
+
+class SentimentPipeline:
+    """
+    Puntúa cada artículo una sola vez (por id, entre todos los tickers) con
+    `scorer`, de a `batch_size` titulares, salteando los que ya están en
+    `cache`.
+
+    Parámetros:
+    - scorer: Objeto con `name` y `score(textos)`; por defecto LexiconScorer().
+    - cache (SentimentCache): Caché persistente de puntajes (opcional).
+    - batch_size (int): Titulares por llamada al scorer.
+    """
+    def __init__(self, scorer=None, cache: Optional[SentimentCache] = None, batch_size: int = 1024):
+        self.scorer = scorer if scorer is not None else LexiconScorer()
+        self.cache = cache
+        self.batch_size = batch_size
+
+    def score_articles(self, articles: pd.DataFrame) -> pd.Series:
+        """
+        Puntaje de cada artículo distinto de `articles` (article_id, title).
+
+        Retorna:
+        - pd.Series indexada por article_id.
+        """
+        unique = articles.drop_duplicates("article_id").set_index("article_id")["title"]
+        known = self.cache.scores(self.scorer.name) if self.cache is not None else {}
+        is_known = np.fromiter((i in known for i in unique.index), dtype=bool, count=len(unique))
+        pending = unique[~is_known]
+
+        fresh = []
+        t0 = time.perf_counter()
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending.iloc[start:start + self.batch_size]
+            fresh.append(pd.Series(self.scorer.score(batch.tolist()), index=batch.index))
+        fresh = pd.concat(fresh) if fresh else pd.Series(dtype=float)
+        if len(pending):
+            elapsed = time.perf_counter() - t0
+            print(f"[INFO] Sentimiento: {len(pending)} titulares nuevos con '{self.scorer.name}' "
+                  f"en {elapsed:.2f}s ({len(unique) - len(pending)} de la caché)")
+        if self.cache is not None:
+            self.cache.put(self.scorer.name, fresh)
+
+        cached = pd.Series([known[i] for i in unique.index[is_known]], index=unique.index[is_known],
+                           dtype=float)
+        return pd.concat([cached, fresh]).reindex(unique.index)
+
+    def run(self, news: Union[Dict[str, pd.DataFrame], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Retorna:
+        - pd.DataFrame de `news_articles` con la columna 'sentiment'.
+        """
+        articles = news_articles(news)
+        scores = self.score_articles(articles)
+        return articles.assign(sentiment=articles["article_id"].map(scores).to_numpy(dtype=float))
+
+
+SENTIMENT_COLUMNS = ["sentiment_mean", "sentiment_sum", "sentiment_count"]
+
+
+def _session_dates(published: pd.Series, cutoff_hour: Optional[int]) -> pd.Series:
+    """Día al que cuenta cada noticia: las de después del cierre, al siguiente."""
+    if cutoff_hour is not None:
+        published = published + pd.Timedelta(hours=24 - cutoff_hour)
+    return published.dt.normalize()
+
+
+def daily_sentiment(scored: pd.DataFrame, calendar: Optional[pd.DataFrame] = None,
+                    cutoff_hour: Optional[int] = 20) -> pd.DataFrame:
+    """
+    Agrega los puntajes por (Ticker, Date): media, suma y cantidad de noticias.
+
+    Parámetros:
+    - scored (pd.DataFrame): Salida de `SentimentPipeline.run`.
+    - calendar (pd.DataFrame): Barras (Ticker, Date) de cada ticker; si se pasa,
+      cada noticia cuenta para la primera barra de su ticker en o después de su
+      día (las de fin de semana, para el lunes).
+    - cutoff_hour (int): Hora UTC de cierre; las noticias publicadas desde esa hora
+      cuentan para el día siguiente (None = día calendario).
+
+    Retorna:
+    - pd.DataFrame con Ticker, Date y SENTIMENT_COLUMNS.
+    """
+    df = scored.dropna(subset=["sentiment", "published"])
+    if df.empty:
+        # Sin noticias puntuadas: nada que agregar (y add_sentiment_features deja 0)
+        return pd.DataFrame({"Ticker": pd.Series(dtype=object), "Date": pd.Series(dtype="datetime64[ns]"),
+                             "sentiment_mean": pd.Series(dtype=float), "sentiment_sum": pd.Series(dtype=float),
+                             "sentiment_count": pd.Series(dtype="int64")})
+    df = df.assign(Date=_session_dates(df["published"], cutoff_hour))
+    if calendar is not None:
+        bars = calendar[["Ticker", "Date"]].assign(Ticker=calendar["Ticker"].astype(str))
+        bars = bars.assign(Date=pd.to_datetime(bars["Date"]).dt.normalize())
+        sessions = bars.drop_duplicates().sort_values("Date")
+        df = pd.merge_asof(df.sort_values("Date"), sessions.rename(columns={"Date": "session"}),
+                           left_on="Date", right_on="session", by="Ticker", direction="forward")
+        df = df.dropna(subset=["session"]).assign(Date=lambda d: d["session"])
+    grouped = df.groupby(["Ticker", "Date"])["sentiment"]
+    out = pd.DataFrame({"sentiment_mean": grouped.mean(), "sentiment_sum": grouped.sum(),
+                        "sentiment_count": grouped.size()})
+    return out.reset_index()
+
+
+def add_sentiment_features(df: pd.DataFrame, scored: pd.DataFrame,
+                           cutoff_hour: Optional[int] = 20) -> pd.DataFrame:
+    """
+    Suma SENTIMENT_COLUMNS a un frame de indicadores (Ticker, Date); los días
+    sin noticias quedan con 0.
+
+    Parámetros:
+    - df (pd.DataFrame): Frame de indicadores en formato largo.
+    - scored (pd.DataFrame): Salida de `SentimentPipeline.run`.
+    - cutoff_hour (int): Ver `daily_sentiment`.
+    """
+    daily = daily_sentiment(scored, calendar=df, cutoff_hour=cutoff_hour)
+    keys = pd.DataFrame({"Ticker": df["Ticker"].astype(str).to_numpy(),
+                         "Date": pd.to_datetime(df["Date"]).dt.normalize().to_numpy()})
+    features = keys.merge(daily, on=["Ticker", "Date"], how="left")[SENTIMENT_COLUMNS]
+    out = df.copy()
+    for col in SENTIMENT_COLUMNS:
+        out[col] = features[col].fillna(0).to_numpy()
+    out["sentiment_count"] = out["sentiment_count"].astype(int)
+    return out
+
+
+if __name__ == "__main__":
+    # Noticias guardadas por fetch_data en el SnapshotStore
+    base_path = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.join(base_path, "..", "old-script"))
+    from snapshot_store import SnapshotStore  # noqa: E402
+
+    root = sys.argv[1] if len(sys.argv) > 1 else os.path.join(base_path, "..", "data", "snapshots")
+    news = SnapshotStore(root).read("news")
+    pipeline = SentimentPipeline(cache=SentimentCache(os.path.join(base_path, "..", "data", "cache",
+                                                                   "sentiment")))
+    scored = pipeline.run(news)
+    print(daily_sentiment(scored).tail(20))
@@ -1,5 +1,11 @@
+import os
+import sys
+
 import pandas as pd
-import ta
+
+# El registro de indicadores vive en el Technical Agent
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Technical Agent"))
+from indicator_registry import REGISTRY  # noqa: E402
 
 df = pd.DataFrame({
     "Open": [1, 2, 3, 4, 5],
@@ -9,5 +15,14 @@ df = pd.DataFrame({
     "Volume": [100, 200, 300, 400, 500]
 })
 
-df = ta.add_all_ta_features(df, "Open", "High", "Low", "Close", "Volume", fillna=True)
-print(df.head())
\ No newline at end of file
+# Sólo se calculan los indicadores pedidos (y sus intermedios, una sola vez),
+# en lugar de los ~90 de ta.add_all_ta_features
+features = [
+    ("rsi", {"window": 3}),
+    ("macd", {"window_slow": 4, "window_fast": 2}),
+    ("macd_signal", {"window_slow": 4, "window_fast": 2, "window_sign": 2}),
+    ("atr", {"window": 3}),
+    ("stoch_k", {"window": 3}),
+]
+df = REGISTRY.compute_frame(df, features, by=None)
+print(df.head())
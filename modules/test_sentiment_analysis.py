@@ -0,0 +1,22 @@
+"""
+Sin noticias, `SentimentPipeline.run` devuelve un frame vacío con los
+tipos de siempre y `add_sentiment_features` deja las features en 0.
+
+    python -m pytest modules/test_sentiment_analysis.py
+"""
+import pandas as pd
+
+from sentiment_analysis import SENTIMENT_COLUMNS, SentimentPipeline, add_sentiment_features, daily_sentiment
+
+
+def test_no_news_gives_zero_features():
+    bars = pd.DataFrame({"Ticker": ["AAA", "AAA", "BBB"], "rsi": [40.0, 55.0, 60.0],
+                         "Date": pd.to_datetime(["2024-01-02", "2024-01-03", "2024-01-02"])})
+    for news in ({}, {"AAA": pd.DataFrame()}, pd.DataFrame(columns=["ticker"])):
+        scored = SentimentPipeline().run(news)
+        assert scored.empty and scored["published"].dtype == "datetime64[ns]"
+        assert daily_sentiment(scored, calendar=bars).empty
+
+        out = add_sentiment_features(bars, scored)
+        assert (out[SENTIMENT_COLUMNS] == 0).all().all()
+        assert out["sentiment_count"].dtype.kind == "i"
@@ -1,8 +1,13 @@
 import os
+import pickle
+import threading
+import time
 import datetime as dt
 import pandas as pd
-import yfinance as yf
-from typing import Optional, Union
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Optional, Union
+
+from snapshot_store import SnapshotStore
 
 def process_analysis(data: dict) -> pd.DataFrame:
     """
@@ -103,98 +108,325 @@ def save_data_to_csv(df: pd.DataFrame, ticker: str, filename: str) -> None:
     except Exception as e:
         print(f"[ERROR] Al guardar datos para {ticker}: {e}")
 
+# Endpoints de yf.Ticker que se descargan además del histórico:
+# nombre -> (método, sufijo del CSV, TTL por defecto)
+ENDPOINTS = {
+    "actions": ("get_actions", "dividends", dt.timedelta(days=1)),
+    "analyst_price_targets": ("get_analyst_price_targets", "analysis", dt.timedelta(days=1)),
+    "balance_sheet": ("get_balance_sheet", "balance", dt.timedelta(days=90)),
+    "calendar": ("get_calendar", "calendar", dt.timedelta(days=1)),
+    "cashflow": ("get_cashflow", "cashflow", dt.timedelta(days=90)),
+    "info": ("get_info", "info", dt.timedelta(days=1)),
+    "institutional_holders": ("get_institutional_holders", "holders", dt.timedelta(days=90)),
+    "news": ("get_news", "news", dt.timedelta(hours=1)),
+    "recommendations": ("get_recommendations", "recs", dt.timedelta(days=7)),
+    "sustainability": ("get_sustainability", "sustain", dt.timedelta(days=90)),
+}
+
+# Procesamiento de los endpoints que no devuelven un DataFrame
+PROCESSORS = {
+    "analyst_price_targets": process_analysis,
+    "calendar": process_calendar,
+    "info": process_info,
+    "news": process_news,
+}
+
+
+def yf_ticker(ticker: str):
+    """
+    Fábrica por defecto de objetos `yf.Ticker` (yfinance se importa recién
+    acá, así el módulo se puede usar con un reemplazo local sin tenerlo).
+    """
+    import yfinance as yf
+
+    return yf.Ticker(ticker)
+
+
+class EndpointCache:
+    """
+    Caché en disco de los endpoints de cada ticker, con un TTL por endpoint:
+
+        {folder}/{ticker}/{endpoint}.pkl  ->  {"fetched_at": ..., "value": ...}
+
+    Un endpoint se vuelve a pedir sólo cuando su copia venció (p.ej. news
+    cada hora, balance cada trimestre). Es thread-safe: cada entrada es un
+    archivo propio y se escribe con un reemplazo atómico.
+
+    Parámetros:
+    - folder (str): Carpeta de la caché.
+    - ttl (dict): TTL por endpoint ({nombre: timedelta}); pisa a los de ENDPOINTS.
+    """
+    def __init__(self, folder: str, ttl: Optional[Dict[str, dt.timedelta]] = None):
+        self.folder = folder
+        self.ttl = {name: spec[2] for name, spec in ENDPOINTS.items()}
+        self.ttl.update(ttl or {})
+
+    def _path(self, ticker: str, endpoint: str) -> str:
+        return os.path.join(self.folder, ticker, f"{endpoint}.pkl")
+
+    def entry(self, ticker: str, endpoint: str) -> Optional[dict]:
+        """Entrada guardada ({"fetched_at", "value"}) o None."""
+        path = self._path(ticker, endpoint)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def is_fresh(self, entry: Optional[dict], endpoint: str, now: Optional[dt.datetime] = None) -> bool:
+        now = now or dt.datetime.now()
+        return entry is not None and now - entry["fetched_at"] < self.ttl[endpoint]
+
+    def put(self, ticker: str, endpoint: str, value, now: Optional[dt.datetime] = None) -> None:
+        path = self._path(ticker, endpoint)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"fetched_at": now or dt.datetime.now(), "value": value}, f)
+        os.replace(tmp_path, path)
+
+
+class LocalTicker:
+    """
+    Reemplazo local de `yf.Ticker` para pruebas y corridas offline.
+
+    Recibe {endpoint: valor} (los nombres de ENDPOINTS, más "history" con un
+    DataFrame indexado por fecha) y registra cada llamada en `calls`
+    (lista compartida si se pasa una). `latency` simula la red.
+
+    Uso: fetch_many([...], ..., ticker_factory=lambda t: LocalTicker(t, datos[t]))
+    """
+    def __init__(self, ticker: str, data: dict, latency: float = 0.0, calls: Optional[list] = None):
+        self.ticker = ticker
+        self.data = data
+        self.latency = latency
+        self.calls = calls if calls is not None else []
+
+    def _call(self, endpoint: str):
+        self.calls.append((self.ticker, endpoint))
+        if self.latency:
+            time.sleep(self.latency)
+        value = self.data.get(endpoint)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def history(self, start=None, end=None, interval: str = "1d") -> pd.DataFrame:
+        df = self._call("history")
+        if df is None:
+            return pd.DataFrame()
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        if getattr(df.index, "tz", None) is not None:
+            start, end = start.tz_localize(df.index.tz), end.tz_localize(df.index.tz)
+        mask = (df.index >= start) & (df.index < end)
+        return df.loc[mask].copy()
+
+    def __getattr__(self, name: str):
+        for endpoint, (method, _, _) in ENDPOINTS.items():
+            if method == name:
+                return lambda: self._call(endpoint)
+        raise AttributeError(name)
+
+
+def _fetch_endpoint(ticker_factory: Callable, ticker: str, endpoint: str, cache: Optional[EndpointCache]):
+    """
+    Devuelve (valor, momento de la descarga, descargado ahora) del
+    endpoint: de la caché si está vigente, si no lo descarga. Si la
+    descarga falla y hay una copia vencida, usa esa.
+
+    El objeto del ticker se crea acá, uno por llamada: `yf.Ticker` guarda
+    estado sin locks (caché de requests, cookies) y no se comparte entre
+    hilos.
+    """
+    entry = cache.entry(ticker, endpoint) if cache is not None else None
+    if cache is not None and cache.is_fresh(entry, endpoint):
+        return entry["value"], entry["fetched_at"], False
+    now = dt.datetime.now()
+    try:
+        value = getattr(ticker_factory(ticker), ENDPOINTS[endpoint][0])()
+    except Exception as e:
+        if entry is not None:
+            print(f"[WARNING] Falló '{endpoint}' de {ticker} ({e}); se usa la copia de "
+                  f"{entry['fetched_at']:%Y-%m-%d %H:%M}")
+            return entry["value"], entry["fetched_at"], False
+        print(f"[ERROR] Al descargar '{endpoint}' de {ticker}: {e}")
+        return None, now, True
+    if cache is not None:
+        cache.put(ticker, endpoint, value, now)
+    return value, now, True
+
+
+def _process_endpoint(ticker: str, endpoint: str, value) -> pd.DataFrame:
+    if endpoint not in PROCESSORS:
+        return value if value is not None else pd.DataFrame()
+    try:
+        return PROCESSORS[endpoint](value) if value else pd.DataFrame()
+    except ValueError as ve:
+        print(f"[ERROR] Al procesar '{endpoint}' de {ticker}: {ve}")
+        return pd.DataFrame()
+
+
+def _naive_dates(values) -> pd.Series:
+    """Fechas sin zona horaria (en UTC si venían con zona)."""
+    dates = pd.to_datetime(pd.Series(values))
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_convert("UTC").dt.tz_localize(None)
+    return dates
+
+
+def snapshot_frame(ticker: str, endpoint: str, value, fetched_at: dt.datetime) -> pd.DataFrame:
+    """
+    Lleva el valor de un endpoint a una tabla con columna 'Date' para el
+    `SnapshotStore`:
+    - acciones (dividendos/splits): la fecha de cada evento;
+    - estados contables (columnas = períodos): formato largo
+      (item, period, value) con la fecha de la descarga;
+    - el resto: tal cual lo procesa `fetch_data`, con la fecha de la descarga.
+    """
+    df = _process_endpoint(ticker, endpoint, value)
+    if df is None or df.empty:
+        return pd.DataFrame()
+    if endpoint == "actions":
+        df = df.rename_axis("Date").reset_index()
+        df["Date"] = _naive_dates(df["Date"]).to_numpy()
+        return df
+    if any(not isinstance(c, str) for c in df.columns):
+        df = df.rename_axis("item").reset_index().melt(id_vars="item", var_name="period")
+        df["period"] = df["period"].astype(str)
+    elif not isinstance(df.index, pd.RangeIndex):
+        df = df.rename_axis("item").reset_index()
+    df["Date"] = pd.Timestamp(fetched_at).normalize()
+    return df
+
+
+def _save_ticker(ticker: str, store: SnapshotStore, df_history: pd.DataFrame, values: dict) -> None:
+    # Un dataset por endpoint ("history" + ENDPOINTS), particionado por ticker
+    history = df_history.copy()
+    history["Date"] = _naive_dates(history["Date"]).to_numpy()
+    store.append("history", ticker, history)
+    for endpoint in ENDPOINTS:
+        value, fetched_at, downloaded = values[endpoint]
+        if not downloaded and store.has(endpoint, ticker):
+            # Copia de la caché: ya se guardó cuando se descargó
+            continue
+        store.append(endpoint, ticker, snapshot_frame(ticker, endpoint, value, fetched_at))
+
+
+def default_cache() -> EndpointCache:
+    """Caché en la carpeta 'data/cache/fundamentals' (ruta relativa al script)."""
+    base_path = os.path.dirname(os.path.abspath(__file__))
+    return EndpointCache(os.path.join(base_path, "..", "data", "cache", "fundamentals"))
+
+
+def default_store() -> SnapshotStore:
+    """Almacén en la carpeta 'data/snapshots' (ruta relativa al script)."""
+    base_path = os.path.dirname(os.path.abspath(__file__))
+    return SnapshotStore(os.path.join(base_path, "..", "data", "snapshots"))
+
+
+def fetch_many(
+    tickers: Iterable[str],
+    start_date: dt.datetime,
+    end_date: dt.datetime,
+    interval: str = '1d',
+    max_workers: int = 16,
+    cache: Optional[EndpointCache] = None,
+    ticker_factory: Optional[Callable] = None,
+    store: Optional[SnapshotStore] = None,
+    save: bool = True,
+) -> Dict[str, Optional[pd.DataFrame]]:
+    """
+    Como `fetch_data` para varios tickers: los históricos de todos los
+    tickers se piden a la vez en un solo pool de hilos (sin esperas
+    anidadas) y, a medida que llega un histórico con datos, se encolan los
+    endpoints de ese ticker; cada endpoint vigente se lee de la caché. Un
+    ticker sin histórico no pide ningún endpoint.
+
+    Parámetros:
+    - tickers: Símbolos (ej. ['AAPL', 'MSFT']).
+    - start_date / end_date / interval: Rango e intervalo del histórico.
+    - max_workers (int): Llamadas simultáneas.
+    - cache (EndpointCache): Caché por endpoint (por defecto `default_cache()`).
+    - ticker_factory: Crea el objeto de cada ticker (por defecto `yf.Ticker`;
+      para pruebas, `LocalTicker`). Se llama una vez por descarga, así cada
+      hilo usa su propio objeto.
+    - store (SnapshotStore): Dónde se guarda todo (por defecto `default_store()`).
+    - save (bool): Guardar los datos en `store`.
+
+    Retorna:
+    - dict {ticker: DataFrame del histórico o None si no hubo datos}.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    cache = cache if cache is not None else default_cache()
+    store = store if store is not None else (default_store() if save else None)
+    ticker_factory = ticker_factory or yf_ticker
+
+    def _history(t):
+        try:
+            return ticker_factory(t).history(start=start_date, end=end_date, interval=interval)
+        except Exception as e:
+            print(f"[ERROR] Al obtener datos para {t}: {e}")
+            return None
+
+    histories, values = {}, {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {pool.submit(_history, t): t for t in tickers}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                t = pending.pop(future)
+                histories[t] = future.result()
+                # Si no hay datos, no se piden los endpoints de ese ticker
+                if histories[t] is not None and not histories[t].empty:
+                    for e in ENDPOINTS:
+                        values[(t, e)] = pool.submit(_fetch_endpoint, ticker_factory, t, e, cache)
+
+    results = {}
+    for t in tickers:
+        df_history = histories[t]
+        # Si no hay datos, no se guarda nada de ese ticker
+        if df_history is None or df_history.empty:
+            print(f"[WARNING] No se encontraron datos para {t} en el rango proporcionado.")
+            results[t] = None
+            continue
+        # Resetea el índice para que la columna 'Date' sea parte del DataFrame
+        df_history = df_history.reset_index()
+        if save:
+            _save_ticker(t, store, df_history, {e: values[(t, e)].result() for e in ENDPOINTS})
+        results[t] = df_history
+    return results
+
+
 def fetch_data(
     ticker: str,
     start_date: dt.datetime,
     end_date: dt.datetime,
-    interval: str = '1d'
+    interval: str = '1d',
+    cache: Optional[EndpointCache] = None,
+    ticker_factory: Optional[Callable] = None,
+    store: Optional[SnapshotStore] = None,
 ) -> Optional[pd.DataFrame]:
     """
     Descarga datos históricos y otra información relevante de un ticker usando yfinance,
-    los procesa y los guarda en archivos CSV.
+    los procesa y los guarda en el `SnapshotStore` (un dataset Parquet por endpoint,
+    particionado por ticker). Los endpoints se piden en paralelo y sólo los que
+    vencieron en la caché (ver `EndpointCache` y `fetch_many`).
 
     Parámetros:
     - ticker (str): Símbolo del ticker (ej. 'AAPL').
     - start_date (dt.datetime): Fecha de inicio.
     - end_date (dt.datetime): Fecha de fin.
     - interval (str): Intervalo de datos (ej. '1d', '1wk', '1mo').
+    - cache / ticker_factory / store: Ver `fetch_many`.
 
     Retorna:
     - pd.DataFrame o None: DataFrame con datos históricos OHCL, o None si hay algún error.
     """
     try:
-        # Formateamos fechas para usarlas en los nombres de archivo
-        start_str = start_date.strftime("%Y%m%d")
-        end_str = end_date.strftime("%Y%m%d")
-
-        # Instancia del objeto de yfinance
-        stock = yf.Ticker(ticker)
-
-        # Descarga de datos históricos
-        df_history = stock.history(start=start_date, end=end_date, interval=interval)
-
-        # Si no hay datos, se interrumpe la ejecución
-        if df_history.empty:
-            print(f"[WARNING] No se encontraron datos para {ticker} en el rango proporcionado.")
-            return None
-
-        # Resetea el índice para que la columna 'Date' sea parte del DataFrame
-        df_history.reset_index(inplace=True)
-
-        # Descarga y procesa datos adicionales
-        # Nota: cada método de yfinance puede retornar distintos tipos de datos
-        dividends = stock.get_actions()          # Incluye dividendos y splits
-        analysis = stock.get_analyst_price_targets()
-        balance = stock.get_balance_sheet()
-        calendar = stock.get_calendar()
-        cashflow = stock.get_cashflow()
-        info = stock.get_info()
-        inst_holders = stock.get_institutional_holders()
-        news = stock.get_news()
-        recommendations = stock.get_recommendations()
-        sustainability = stock.get_sustainability()
-
-        # Procesa cada dataset si no está vacío y es el tipo esperado
-        try:
-            df_analysis = process_analysis(analysis) if analysis else pd.DataFrame()
-        except ValueError as ve:
-            print(f"[ERROR] Al procesar 'analysis' de {ticker}: {ve}")
-            df_analysis = pd.DataFrame()
-
-        try:
-            df_calendar = process_calendar(calendar) if calendar else pd.DataFrame()
-        except ValueError as ve:
-            print(f"[ERROR] Al procesar 'calendar' de {ticker}: {ve}")
-            df_calendar = pd.DataFrame()
-
-        try:
-            df_info = process_info(info) if info else pd.DataFrame()
-        except ValueError as ve:
-            print(f"[ERROR] Al procesar 'info' de {ticker}: {ve}")
-            df_info = pd.DataFrame()
-
-        try:
-            df_news = process_news(news) if news else pd.DataFrame()
-        except ValueError as ve:
-            print(f"[ERROR] Al procesar 'news' de {ticker}: {ve}")
-            df_news = pd.DataFrame()
-
-        # Guarda los DataFrames resultantes en CSV
-        # El sufijo indica la "categoría" de datos
-        save_data_to_csv(df_history, ticker, f"{ticker}_{start_str}_{end_str}_history")
-        save_data_to_csv(dividends, ticker, f"{ticker}_{start_str}_{end_str}_dividends")
-        save_data_to_csv(df_analysis, ticker, f"{ticker}_{start_str}_{end_str}_analysis")
-        save_data_to_csv(balance, ticker, f"{ticker}_{start_str}_{end_str}_balance")
-        save_data_to_csv(df_calendar, ticker, f"{ticker}_{start_str}_{end_str}_calendar")
-        save_data_to_csv(cashflow, ticker, f"{ticker}_{start_str}_{end_str}_cashflow")
-        save_data_to_csv(df_info, ticker, f"{ticker}_{start_str}_{end_str}_info")
-        save_data_to_csv(inst_holders, ticker, f"{ticker}_{start_str}_{end_str}_holders")
-        save_data_to_csv(df_news, ticker, f"{ticker}_{start_str}_{end_str}_news")
-        save_data_to_csv(recommendations, ticker, f"{ticker}_{start_str}_{end_str}_recs")
-        save_data_to_csv(sustainability, ticker, f"{ticker}_{start_str}_{end_str}_sustain")
-
-        return df_history
-
+        return fetch_many([ticker], start_date, end_date, interval, cache=cache,
+                          ticker_factory=ticker_factory, store=store)[ticker]
     except Exception as e:
         print(f"[ERROR] Al obtener datos para {ticker}: {e}")
         return None
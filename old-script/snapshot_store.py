@@ -0,0 +1,237 @@
+import os
+import time
+from typing import Iterable, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+def _arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Columnas de texto con valores de tipos mezclados (p.ej. en 'info') a
+    str, para que Arrow pueda escribirlas.
+    """
+    df = df.copy()
+    df.columns = [str(c) for c in df.columns]
+    for col in df.columns[df.dtypes == object]:
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            df[col] = df[col].map(lambda v: v if v is None else str(v))
+    return df
+
+
+def _unify_schemas(schemas: List[pa.Schema]) -> pa.Schema:
+    """
+    Une los esquemas de las partes; un campo con tipos que Arrow no puede
+    promover (p.ej. int en una foto y texto en otra) queda como texto.
+    """
+    try:
+        return pa.unify_schemas(schemas, promote_options="permissive")
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    fields = {}
+    for schema in schemas:
+        for field in schema:
+            prev = fields.get(field.name)
+            if prev is None or prev.type == field.type:
+                fields[field.name] = field
+                continue
+            try:
+                fields[field.name] = pa.unify_schemas(
+                    [pa.schema([prev]), pa.schema([field])], promote_options="permissive"
+                ).field(0)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                fields[field.name] = pa.field(field.name, pa.string())
+    return pa.schema(list(fields.values()))
+
+
+def _same_rows(new: pd.DataFrame, stored: pd.DataFrame) -> bool:
+    """
+    True si `new` tiene exactamente las filas de `stored` (mismas columnas,
+    valores y orden), comparando después de pasar `new` por Arrow igual que
+    al escribirlo.
+    """
+    new = pa.Table.from_pandas(_arrow_safe(new), preserve_index=False).to_pandas()
+    if len(new) != len(stored) or set(new.columns) != set(stored.columns):
+        return False
+    stored = stored[list(new.columns)].reset_index(drop=True)
+    return all(new[c].astype(object).equals(stored[c].astype(object)) for c in new.columns)
+
+
+class SnapshotStore:
+    """
+    Almacén columnar (Parquet) de los datos de `fetch_data`: un dataset por
+    endpoint, particionado por ticker, en el que sólo se agregan archivos:
+
+        {root}/{endpoint}/ticker={ticker}/part-{seq}.parquet
+
+    Cada fila tiene una columna 'Date' (la fecha de la barra o del evento, o
+    el día en que se tomó la foto para endpoints como info o balance) y
+    `_seq` (el momento de la escritura). Para cada (ticker, Date) vale la
+    última escritura: volver a bajar el mismo día reemplaza esa foto, y
+    `append` descarta las filas de fechas ya guardadas (salvo la última,
+    que puede estar incompleta), así los rangos solapados no duplican el
+    histórico.
+
+    Los archivos se escriben ordenados por fecha y en row groups de
+    `row_group_size` filas: `read` filtra por partición (ticker) y por las
+    estadísticas de Date de cada row group, así que cinco años de un
+    ticker o un día de todos los tickers leen sólo los row groups que
+    corresponden. `compact` junta las partes de cada partición en una.
+
+    Volver a agregar la misma foto no escribe nada: si lo único nuevo son
+    filas de la última fecha y coinciden con las guardadas, `append` no
+    crea otra parte. Cuando una partición pasa de `max_parts` partes se
+    compacta sola, así la cantidad de archivos (y lo que lee cada `append`
+    para descartar fechas repetidas) no crece con las corridas.
+
+    Parámetros:
+    - root (str): Carpeta raíz del almacén.
+    - row_group_size (int): Filas por row group al escribir.
+    - max_parts (int): Partes por partición a partir de las cuales se compacta.
+    """
+    def __init__(self, root: str, row_group_size: int = 50_000, max_parts: int = 32):
+        self.root = root
+        self.row_group_size = row_group_size
+        self.max_parts = max_parts
+
+    def _partition(self, endpoint: str, ticker: str) -> str:
+        return os.path.join(self.root, endpoint, f"ticker={ticker}")
+
+    def _dataset(self, endpoint: str, tickers: Optional[Iterable[str]] = None) -> Optional[ds.Dataset]:
+        folder = os.path.join(self.root, endpoint)
+        if tickers is not None:
+            # Poda de particiones antes de abrir los archivos
+            paths = [p for t in tickers for p in self._parts(endpoint, t)]
+            if not paths:
+                return None
+            files = paths
+        else:
+            if not os.path.isdir(folder):
+                return None
+            files = [os.path.join(dirpath, f) for dirpath, _, names in os.walk(folder)
+                     for f in names if f.endswith(".parquet")]
+            if not files:
+                return None
+        schemas = [pq.read_schema(f) for f in files]
+        # Esquema común a todas las partes (pueden tener columnas distintas) + la partición
+        schema = _unify_schemas(schemas).append(pa.field("ticker", pa.string()))
+        return ds.dataset(files, schema=schema, format="parquet",
+                          partitioning=ds.partitioning(pa.schema([("ticker", pa.string())]),
+                                                       flavor="hive"),
+                          partition_base_dir=folder)
+
+    def _parts(self, endpoint: str, ticker: str) -> List[str]:
+        folder = self._partition(endpoint, ticker)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(".parquet"))
+
+    def tickers(self, endpoint: str) -> List[str]:
+        folder = os.path.join(self.root, endpoint)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(d.split("=", 1)[1] for d in os.listdir(folder) if d.startswith("ticker="))
+
+    def has(self, endpoint: str, ticker: str) -> bool:
+        """True si ya hay datos del ticker en ese endpoint."""
+        return bool(self._parts(endpoint, ticker))
+
+    def _write(self, endpoint: str, ticker: str, df: pd.DataFrame, seq: int) -> None:
+        folder = self._partition(endpoint, ticker)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"part-{seq}.parquet")
+        table = pa.Table.from_pandas(_arrow_safe(df), preserve_index=False)
+        pq.write_table(table, path + ".tmp", row_group_size=self.row_group_size)
+        os.replace(path + ".tmp", path)
+
+    def append(self, endpoint: str, ticker: str, df: pd.DataFrame) -> int:
+        """
+        Agrega las filas de `df` (con columna 'Date') a la partición del
+        ticker. Devuelve la cantidad de filas escritas (0 si no había nada
+        nuevo).
+        """
+        if df is None or df.empty:
+            return 0
+        if "Date" not in df.columns:
+            raise ValueError(f"'{endpoint}' de {ticker}: falta la columna 'Date'")
+        df = df.copy()
+        df["Date"] = pd.to_datetime(df["Date"]).astype("datetime64[ns]")
+
+        stored = self.read(endpoint, [ticker], columns=["Date"])
+        if not stored.empty:
+            # Las fechas ya guardadas no se repiten; la última puede reemplazarse
+            last = stored["Date"].max()
+            known = set(stored["Date"])
+            df = df.loc[(df["Date"] >= last) | ~df["Date"].isin(known)]
+            if df.empty:
+                return 0
+            # Sólo la última fecha y sin cambios (p.ej. la misma foto de la caché): no se escribe
+            if (df["Date"] == last).all():
+                current = self.read(endpoint, [ticker], start=last).drop(columns="ticker")
+                if _same_rows(df.sort_values("Date", kind="mergesort"), current):
+                    return 0
+
+        df["_seq"] = time.time_ns()
+        self._write(endpoint, ticker, df.sort_values("Date", kind="mergesort"), int(df["_seq"].iat[0]))
+        if len(self._parts(endpoint, ticker)) > self.max_parts:
+            self.compact(endpoint, [ticker])
+        return len(df)
+
+    def read(
+        self,
+        endpoint: str,
+        tickers: Optional[Iterable[str]] = None,
+        start=None,
+        end=None,
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Lee un endpoint con Date en [start, end) para `tickers` (None = todos),
+        quedándose con la última escritura de cada (ticker, Date).
+
+        Retorna:
+        - pd.DataFrame con la columna 'ticker' y las pedidas (todas si columns=None).
+        """
+        tickers = list(tickers) if tickers is not None else None
+        dataset = self._dataset(endpoint, tickers)
+        if dataset is None:
+            return pd.DataFrame(columns=["ticker"] + list(columns or []))
+        flt = None
+        if tickers is not None:
+            flt = ds.field("ticker").isin(tickers)
+        if start is not None:
+            cond = ds.field("Date") >= pd.Timestamp(start)
+            flt = cond if flt is None else flt & cond
+        if end is not None:
+            cond = ds.field("Date") < pd.Timestamp(end)
+            flt = cond if flt is None else flt & cond
+        wanted = None
+        if columns is not None:
+            wanted = list(dict.fromkeys(["ticker", "Date", "_seq"] + list(columns)))
+        df = dataset.to_table(columns=wanted, filter=flt).to_pandas()
+        if df.empty:
+            return df.drop(columns="_seq", errors="ignore")
+
+        # Por cada (ticker, Date) sólo la última escritura
+        latest = df.groupby(["ticker", "Date"])["_seq"].transform("max")
+        df = df.loc[df["_seq"] == latest].drop(columns="_seq")
+        df = df.sort_values(["ticker", "Date"], kind="mergesort").reset_index(drop=True)
+        if columns is not None:
+            df = df[list(dict.fromkeys(["ticker"] + list(columns)))]
+        return df
+
+    def compact(self, endpoint: str, tickers: Optional[Iterable[str]] = None) -> None:
+        """Junta las partes de cada partición en un solo archivo ya deduplicado."""
+        for ticker in (tickers if tickers is not None else self.tickers(endpoint)):
+            parts = self._parts(endpoint, ticker)
+            if len(parts) < 2:
+                continue
+            df = self.read(endpoint, [ticker]).drop(columns="ticker")
+            df["_seq"] = time.time_ns()
+            self._write(endpoint, ticker, df, int(df["_seq"].iat[0]))
+            for path in parts:
+                os.remove(path)
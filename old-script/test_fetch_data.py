@@ -0,0 +1,74 @@
+"""
+`fetch_many` contra `LocalTicker`: los endpoints vigentes se leen de la
+caché, los vencidos (según el TTL de cada uno) se vuelven a pedir, un
+ticker sin histórico no pide endpoints y cada descarga usa su propio
+objeto de ticker.
+
+    python -m pytest old-script/test_fetch_data.py
+"""
+import datetime as dt
+
+import pandas as pd
+
+from fetch_data import ENDPOINTS, EndpointCache, LocalTicker, fetch_many
+
+START, END = dt.datetime(2024, 1, 1), dt.datetime(2024, 3, 1)
+
+
+def _data():
+    dates = pd.bdate_range(START, END, inclusive="left", name="Date")
+    history = pd.DataFrame({"Open": 1.0, "High": 1.0, "Low": 1.0, "Close": 1.0, "Volume": 100.0},
+                           index=dates)
+    data = {endpoint: pd.DataFrame({"value": [1.0]}) for endpoint in ENDPOINTS}
+    data.update({"history": history, "info": {"sector": "Tech"}, "news": [{"title": "x"}]})
+    return {"AAA": data, "EMPTY": {"history": history.iloc[:0]}}
+
+
+def _fetch(cache, tickers=("AAA",)):
+    calls, created = [], []
+
+    def factory(ticker):
+        created.append(LocalTicker(ticker, _data()[ticker]))
+        return created[-1]
+
+    fetch_many(tickers, START, END, max_workers=4, cache=cache, ticker_factory=factory, save=False)
+    for stock in created:
+        calls.extend(stock.calls)
+    return sorted(calls), created
+
+
+def test_fresh_endpoints_are_read_from_cache(tmp_path):
+    cache = EndpointCache(str(tmp_path))
+    calls, _ = _fetch(cache)
+    assert calls == sorted([("AAA", "history")] + [("AAA", e) for e in ENDPOINTS])
+
+    calls, _ = _fetch(cache)
+    assert calls == [("AAA", "history")]
+
+
+def test_only_expired_endpoints_are_fetched_again(tmp_path):
+    cache = EndpointCache(str(tmp_path))
+    _fetch(cache)
+    # Dos horas después: sólo vence news (TTL de una hora)
+    for endpoint in ENDPOINTS:
+        entry = cache.entry("AAA", endpoint)
+        cache.put("AAA", endpoint, entry["value"], now=entry["fetched_at"] - dt.timedelta(hours=2))
+
+    calls, _ = _fetch(cache)
+    assert calls == [("AAA", "history"), ("AAA", "news")]
+
+    # Con un TTL propio más corto, también vence info
+    cache = EndpointCache(str(tmp_path), ttl={"info": dt.timedelta(minutes=30)})
+    for endpoint in ("info", "news"):
+        entry = cache.entry("AAA", endpoint)
+        cache.put("AAA", endpoint, entry["value"], now=entry["fetched_at"] - dt.timedelta(hours=2))
+    calls, _ = _fetch(cache)
+    assert calls == [("AAA", "history"), ("AAA", "info"), ("AAA", "news")]
+
+
+def test_endpoints_only_after_history_and_one_object_per_call(tmp_path):
+    calls, created = _fetch(EndpointCache(str(tmp_path)), tickers=["AAA", "EMPTY"])
+
+    assert [c for c in calls if c[0] == "EMPTY"] == [("EMPTY", "history")]
+    assert all(len(stock.calls) == 1 for stock in created)
+    assert len(created) == 2 + len(ENDPOINTS)